@@ -1,48 +1,72 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
-from flask_login import LoginManager, login_user, login_required, logout_user, current_user
-from werkzeug.utils import secure_filename
-import qrcode
-import csv
-import io
+from flask import (
+    Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash,
+    Response, stream_with_context, jsonify, abort, send_file
+)
+from flask_login import login_user, login_required, logout_user, current_user
 from datetime import datetime
-from extensions import app, db
-from models import Сотрудник, Документ, ПрочтениеДокумента, Отдел, Организация
-import asyncio
-from telegram.ext import Application
+from extensions import db, migrate, login_manager
+from models import (
+    Сотрудник, Документ, ДокументОтдела, ПрочтениеДокумента, Отдел, Организация, Уведомление,
+    НапоминаниеОСроке, АрхивныйДокумент
+)
+from queries import (
+    документы_query, документы_с_прогрессом, статистика_query, страница_статистики,
+    страница_сотрудников, применить_фильтры_статистики, адресовано_отделу,
+    СОРТИРОВКИ_ДОКУМЕНТОВ, СОРТИРОВКИ_СТАТИСТИКИ, СОРТИРОВКИ_СОТРУДНИКОВ
+)
+from pagination import get_page_args, page_url
+from counters import (
+    учесть_новый_документ, учесть_удаление_документа, учесть_снятие_адресата,
+    учесть_нового_сотрудника, учесть_перевод, rebuild_counters_command
+)
+from qr_service import рендер_qr, etag_qr, удалить_старый_qr, MIMETYPES
+from qr_sheets import документы_для_листов, ячейки, sheet_stream, qr_sheets_command
+from index_check import check_indexes_command
+from query_check import check_query_counts_command
+from downloads import отдать_документ
+from chunked_upload import (
+    начать_загрузку, получить_загрузку, дописать, завершить, отменить,
+    ОшибкаЗагрузки, clean_uploads_command
+)
+from storage import сохранить_файл, освободить_файл, удалить_с_диска, путь_объекта
+from search import найти_документы, обновить_поисковые_векторы, СОРТИРОВКИ_ПОИСКА
+from text_extraction import extract_text_command
+from previews import превью_документа, ключ_превью, фрагменты_документов, preview_url, FORMATS, MISS_MAX_AGE
 from config import Config
-from bot import notify_new_document
+from webhook import секрет_верен, поставить_обновление
+from notifications import уведомить_о_документе
+import metrics
+from reference_cache import (
+    отделы as все_отделы, типы_документов as все_типы_документов, пользователь,
+    отметить_изменение, ОТДЕЛЫ, ТИПЫ_ДОКУМЕНТОВ, СОТРУДНИКИ
+)
+from employee_import import запустить_импорт, отчёт_импорта, ОшибкаИмпорта, import_employees_command
+from archive import (
+    страница_архива, фильтры_архива, типы_архива, открыть_файл, строки_прочтений, archive_documents_command,
+    СОРТИРОВКИ_АРХИВА, ЗАГОЛОВКИ_ПРОЧТЕНИЙ
+)
+from read_partitions import read_partitions_command
 from werkzeug.security import generate_password_hash, check_password_hash
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+from exports import (
+    csv_stream, xlsx_file, file_stream, удалить_временный_файл, строки_статистики, строки_по_сотрудникам,
+    по_сотрудникам_query, ЗАГОЛОВКИ_СТАТИСТИКИ, ЗАГОЛОВКИ_ПО_СОТРУДНИКАМ,
+    CSV_MIMETYPE, XLSX_MIMETYPE
+)
 
-# Инициализация Flask-Login
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+bp = Blueprint('main', __name__)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return Сотрудник.query.get(int(user_id))
+    # Роль, отдел и ФИО вошедшего сотрудника - из кэша процесса, без запроса на каждой странице
+    return пользователь(int(user_id))
 
-# Глобальная переменная для бота
-bot_app = None
-
-async def setup_bot():
-    """Инициализация бота при запуске приложения"""
-    global bot_app
-    if not bot_app:
-        bot_app = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
-        await bot_app.initialize()
-        await bot_app.start()
-    return bot_app
-
-@app.route('/')
+@bp.route('/')
 @login_required
 def index():
-    return redirect(url_for('documents'))
+    return redirect(url_for('main.documents'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -51,18 +75,18 @@ def login():
         user = Сотрудник.query.filter_by(email=email).first()
         if user and check_password_hash(user.пароль, password):
             login_user(user)
-            return redirect(url_for('documents'))
+            return redirect(url_for('main.documents'))
         
         flash('Неверный email или пароль')
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/documents')
+@bp.route('/documents')
 @login_required
 def documents():
     # Получаем параметры фильтрации
@@ -71,23 +95,18 @@ def documents():
     статус_telegram = request.args.get('статус_telegram')
     
     # Базовый запрос для документов
-    query = Документ.query
+    query = документы_query()
     
     # Если пользователь не администратор, показываем только документы его отдела
     if current_user.роль != 'администратор':
-        query = query.filter(Документ.отдел_id == current_user.отдел_id)
+        query = query.filter(ДокументОтдела.отдел_id == current_user.отдел_id)
     elif отдел_id:  # Для администратора применяем фильтр по отделу
-        query = query.filter(Документ.отдел_id == отдел_id)
+        query = query.filter(ДокументОтдела.отдел_id == отдел_id)
     
-    документы = query.all()
-    
-    # Для каждого документа подсчитываем статистику ознакомления
-    for док in документы:
-        total_employees = Сотрудник.query.filter_by(отдел_id=док.отдел_id).count()
-        read_count = ПрочтениеДокумента.query.filter_by(документ_id=док.id).count()
-        док.progress = int((read_count / total_employees * 100) if total_employees > 0 else 0)
-        док.read_count = read_count
-        док.total_count = total_employees
+    # Страница документов вместе со статистикой ознакомления одним запросом
+    документы = документы_с_прогрессом(
+        query, current_user.id, **get_page_args(СОРТИРОВКИ_ДОКУМЕНТОВ, 'created')
+    )
     
     # Получаем список сотрудников с фильтрацией
     сотрудники_query = Сотрудник.query
@@ -103,184 +122,301 @@ def documents():
                 (Сотрудник.статус_регистрации == False) | (Сотрудник.telegram_id == None)
             )
     
-    сотрудники = сотрудники_query.all()
+    сотрудники = страница_сотрудников(
+        сотрудники_query, **get_page_args(СОРТИРОВКИ_СОТРУДНИКОВ, 'surname', prefix='emp_')
+    )
     
     # Получаем список всех отделов для фильтра
-    отделы = Отдел.query.all()
+    отделы = все_отделы()
+    
+    # Начало текста файлов только для документов страницы
+    фрагменты = фрагменты_документов([строка['документ'].id for строка in документы])
     
     return render_template('documents.html', 
                          документы=документы,
+                         фрагменты=фрагменты,
                          сотрудники=сотрудники,
                          отделы=отделы,
+                         сортировки_документов=СОРТИРОВКИ_ДОКУМЕНТОВ,
+                         сортировки_сотрудников=СОРТИРОВКИ_СОТРУДНИКОВ,
                          current_filter={
                              'отдел_id': отдел_id,
                              'отдел_сотрудников_id': отдел_сотрудников_id,
                              'статус_telegram': статус_telegram
                          })
 
-@app.route('/upload', methods=['GET'])
+@bp.route('/search')
+@login_required
+def search():
+    q = request.args.get('q', '').strip()
+    результаты = None
+    if q:
+        результаты = найти_документы(q, current_user, **get_page_args(СОРТИРОВКИ_ПОИСКА, 'rank'))
+    return render_template('search.html', q=q, результаты=результаты, сортировки=СОРТИРОВКИ_ПОИСКА)
+
+@bp.route('/telegram/webhook', methods=['POST'])
+def telegram_webhook():
+    """Приём обновлений Telegram; обрабатывают их процессы бота из очереди"""
+    if not current_app.config['TELEGRAM_WEBHOOK_SECRET']:
+        abort(404)
+    if not секрет_верен(request.headers.get('X-Telegram-Bot-Api-Secret-Token')):
+        abort(403)
+    if поставить_обновление(request.get_json(silent=True)):
+        db.session.commit()
+    return '', 200
+
+@bp.route('/upload', methods=['GET'])
 @login_required
 def upload_document_form():
     if current_user.роль != 'администратор':
         flash('Недостаточно прав для загрузки документов')
-        return redirect(url_for('documents'))
+        return redirect(url_for('main.documents'))
     
     # Получаем список всех отделов
-    отделы = Отдел.query.all()
+    отделы = все_отделы()
     return render_template('upload.html', отделы=отделы)
 
-@app.route('/upload', methods=['POST'])
+def поля_документа_заполнены(form):
+    return all(form.get(поле) for поле in ('title', 'type', 'deadline', 'department'))
+
+def поля_документа(form):
+    """Проверенные поля формы загрузки; ValueError, если срок или отдел неверны.
+
+    Проверка идёт до того, как файл попадёт в хранилище.
+    """
+    try:
+        срок = datetime.strptime(form.get('deadline'), '%Y-%m-%d')
+    except ValueError:
+        raise ValueError('Неверная дата срока ознакомления')
+    отдел_id = form.get('department')  # ID отдела или 'all'
+    # Один документ на все выбранные отделы
+    if отдел_id == 'all':
+        отделы_ids = [id for id, in db.session.query(Отдел.id)]
+    elif отдел_id.isdigit() and db.session.get(Отдел, int(отдел_id)):
+        отделы_ids = [int(отдел_id)]
+    else:
+        raise ValueError('Отдел не найден')
+    return {'название': form.get('title'), 'тип_документа': form.get('type'),
+            'срок_ознакомления': срок, 'отделы_ids': отделы_ids}
+
+def создать_документ(поля, файл, имя_файла):
+    """Документ из полей поля_документа() для файла, уже помещённого в хранилище"""
+    документ = Документ(
+        название=поля['название'],
+        тип_документа=поля['тип_документа'],
+        срок_ознакомления=поля['срок_ознакомления'],
+        файл=файл,
+        путь_к_файлу=путь_объекта(файл.sha256),
+        имя_файла=os.path.basename(имя_файла),
+        дата_создания=datetime.utcnow()
+    )
+    for id in поля['отделы_ids']:
+        документ.адресаты.append(ДокументОтдела(отдел_id=id))
+    db.session.add(документ)
+    db.session.flush()  # Получаем ID документа
+    учесть_новый_документ(документ)
+    if документ.тип_документа not in все_типы_документов():
+        отметить_изменение(ТИПЫ_ДОКУМЕНТОВ)
+    # Текст нового файла добавит в вектор flask extract-text, уже извлечённый - попадёт сразу
+    обновить_поисковые_векторы(Документ.id == документ.id)
+
+    # QR-код строится при первом запросе, см. get_qr_code
+
+    # Уведомления уйдут из очереди после коммита
+    уведомить_о_документе(документ)
+    return документ
+
+@bp.route('/upload', methods=['POST'])
 @login_required
 def upload_document():
     if current_user.роль != 'администратор':
         flash('Недостаточно прав для загрузки документов')
-        return redirect(url_for('documents'))
+        return redirect(url_for('main.documents'))
         
     try:
-        # Получение данных формы
-        название = request.form.get('title')
-        тип_документа = request.form.get('type')
-        срок_ознакомления = datetime.strptime(request.form.get('deadline'), '%Y-%m-%d')
         file = request.files.get('file')
-        отдел_id = request.form.get('department')  # Получаем ID отдела из формы
-        
-        if not all([название, тип_документа, срок_ознакомления, file]):
+        if not file or not поля_документа_заполнены(request.form):
             flash('Пожалуйста, заполните все поля')
-            return redirect(url_for('upload_document_form'))
-            
-        # Создание директории для загрузок, если её нет
-        upload_dir = app.config['UPLOAD_FOLDER']
-        if not os.path.exists(upload_dir):
-            os.makedirs(upload_dir, exist_ok=True)
-            
-        # Сохранение файла
-        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secure_filename(file.filename)}"
-        file_path = os.path.join(upload_dir, filename)
-        file.save(file_path)
-
-        # Создание директории для QR-кодов
-        qr_dir = os.path.join('static', 'qr_codes')
-        os.makedirs(qr_dir, exist_ok=True)
-
-        if отдел_id == 'all':
-            # Если выбраны все отделы, создаем документ для каждого отдела
-            отделы = Отдел.query.all()
-            for отдел in отделы:
-                документ = Документ(
-                    название=название,
-                    тип_документа=тип_документа,
-                    срок_ознакомления=срок_ознакомления,
-                    путь_к_файлу=filename,
-                    дата_создания=datetime.now(),
-                    отдел_id=отдел.id
-                )
-                db.session.add(документ)
-                db.session.flush()  # Получаем ID документа
-                
-                # Генерация QR-кода
-                qr = qrcode.QRCode(version=1, box_size=10, border=5)
-                qr.add_data(str(документ.id))
-                qr.make(fit=True)
-                
-                # Сохранение QR-кода
-                qr_filename = f'document_{документ.id}.png'
-                qr_path = os.path.join(qr_dir, qr_filename)
-                qr.make_image(fill_color="black", back_color="white").save(qr_path)
-                
-                # Обновляем запись в базе данных с путем к QR-коду
-                документ.qr_код = qr_filename
-                
-                # После создания документа отправляем уведомление
-                asyncio.run(notify_new_document(документ.id))
-        else:
-            # Создание записи в базе данных для одного отдела
-            документ = Документ(
-                название=название,
-                тип_документа=тип_документа,
-                срок_ознакомления=срок_ознакомления,
-                путь_к_файлу=filename,
-                дата_создания=datetime.now(),
-                отдел_id=int(отдел_id)
-            )
-            db.session.add(документ)
-            db.session.flush()  # Получаем ID документа
-            
-            # Генерация QR-кода
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(str(документ.id))
-            qr.make(fit=True)
-            
-            # Сохранение QR-кода
-            qr_filename = f'document_{документ.id}.png'
-            qr_path = os.path.join(qr_dir, qr_filename)
-            qr.make_image(fill_color="black", back_color="white").save(qr_path)
-            
-            # Обновляем запись в базе данных с путем к QR-коду
-            документ.qr_код = qr_filename
-            
-            # После создания документа отправляем уведомление
-            asyncio.run(notify_new_document(документ.id))
+            return redirect(url_for('main.upload_document_form'))
+        поля = поля_документа(request.form)
             
+        # Сохранение файла в хранилище; одинаковое содержимое хранится один раз
+        файл = сохранить_файл(file)
+        создать_документ(поля, файл, file.filename)
         db.session.commit()
         flash('Документ успешно загружен')
         
     except Exception as e:
         db.session.rollback()
         flash(f'Ошибка при загрузке документа: {str(e)}')
-        return redirect(url_for('upload_document_form'))
+        return redirect(url_for('main.upload_document_form'))
         
-    return redirect(url_for('documents'))
+    return redirect(url_for('main.documents'))
+
+# Загрузка по частям: POST /uploads, PUT /uploads/<id> с заголовком Upload-Offset,
+# GET /uploads/<id> для докачки, POST /uploads/<id>/complete, DELETE /uploads/<id>
+
+@bp.errorhandler(ОшибкаЗагрузки)
+def upload_error(e):
+    db.session.rollback()
+    ответ = {'error': str(e)}
+    if e.offset is not None:
+        ответ['offset'] = e.offset
+    return jsonify(ответ), e.status
+
+def загрузка_json(загрузка):
+    return {
+        'id': загрузка.id,
+        'offset': загрузка.получено,
+        'size': загрузка.размер,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+    }
+
+@bp.route('/uploads', methods=['POST'])
+@login_required
+def upload_init():
+    if current_user.роль != 'администратор':
+        return jsonify({'error': 'Недостаточно прав для загрузки документов'}), 403
+    data = request.get_json(silent=True) or request.form
+    загрузка = начать_загрузку(current_user.id, data.get('filename'), data.get('size'))
+    db.session.commit()
+    return jsonify(загрузка_json(загрузка)), 201
 
-@app.route('/get_qr_code/<int:document_id>')
+@bp.route('/uploads/<загрузка_id>', methods=['GET'])
 @login_required
-def get_qr_code(document_id):
+def upload_status(загрузка_id):
+    return jsonify(загрузка_json(получить_загрузку(загрузка_id, current_user.id)))
+
+@bp.route('/uploads/<загрузка_id>', methods=['PUT'])
+@login_required
+def upload_append(загрузка_id):
+    смещение = request.headers.get('Upload-Offset', type=int)
+    if смещение is None:
+        raise ОшибкаЗагрузки('Не указан заголовок Upload-Offset')
+    загрузка = получить_загрузку(загрузка_id, current_user.id, блокировать=True)
+    дописать(загрузка, смещение, request.stream)
+    db.session.commit()
+    return jsonify(загрузка_json(загрузка))
+
+@bp.route('/uploads/<загрузка_id>/complete', methods=['POST'])
+@login_required
+def upload_complete(загрузка_id):
+    if not поля_документа_заполнены(request.form):
+        raise ОшибкаЗагрузки('Пожалуйста, заполните все поля')
+    # Форма проверяется до переноса файла: после него ошибка оставила бы загрузку без файла
     try:
-        документ = Документ.query.get_or_404(document_id)
-        if not документ.qr_код:
-            # Если QR-код еще не создан, создаем его
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(str(документ.id))
-            qr.make(fit=True)
-            
-            # Создаем директорию для QR-кодов, если её нет
-            qr_dir = os.path.join('static', 'qr_codes')
-            os.makedirs(qr_dir, exist_ok=True)
-            
-            # Сохраняем QR-код
-            qr_filename = f'document_{документ.id}.png'
-            qr_path = os.path.join(qr_dir, qr_filename)
-            qr.make_image(fill_color="black", back_color="white").save(qr_path)
-            
-            # Обновляем запись в базе данных
-            документ.qr_код = qr_filename
-            db.session.commit()
-        
-        return send_file(
-            os.path.join('static', 'qr_codes', документ.qr_код),
-            mimetype='image/png'
-        )
-    except Exception as e:
-        flash(f'Ошибка при генерации QR-кода: {str(e)}')
-        return redirect(url_for('documents'))
+        поля = поля_документа(request.form)
+    except ValueError as e:
+        raise ОшибкаЗагрузки(str(e))
+    загрузка = получить_загрузку(загрузка_id, current_user.id, блокировать=True)
+    файл = завершить(загрузка, request.form.get('sha256'))
+    документ = создать_документ(поля, файл, загрузка.имя_файла)
+    db.session.commit()
+    flash('Документ успешно загружен')
+    return jsonify({'document_id': документ.id, 'redirect': url_for('main.documents')})
+
+@bp.route('/uploads/<загрузка_id>', methods=['DELETE'])
+@login_required
+def upload_cancel(загрузка_id):
+    отменить(получить_загрузку(загрузка_id, current_user.id, блокировать=True))
+    db.session.commit()
+    return '', 204
+
+@bp.route('/get_qr_code/<int:document_id>')
+@login_required
+def get_qr_code(document_id):
+    fmt = 'svg' if request.args.get('format') == 'svg' else 'png'
+    etag = etag_qr(document_id, fmt)
+    
+    # Изображение не меняется, поэтому браузеру достаточно ответа 304
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        Документ.query.get_or_404(document_id)
+        response = Response(рендер_qr(document_id, fmt), mimetype=MIMETYPES[fmt])
+    
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['QR_CACHE_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+def документ_доступен(документ):
+    """Файл документа открывает тот, кому документ виден в /documents: администратор - любой"""
+    return current_user.роль == 'администратор' or адресовано_отделу(документ.id, current_user.отдел_id)
+
+@bp.route('/preview/<int:document_id>/<key>.<fmt>')
+@login_required
+def document_preview(document_id, key, fmt):
+    """Превью документа; ключ в URL меняется вместе с содержимым файла"""
+    if fmt not in FORMATS:
+        abort(404)
+    документ = Документ.query.get_or_404(document_id)
+    if not документ.путь_к_файлу:
+        abort(404)
+    if not документ_доступен(документ):
+        return 'Доступ запрещен', 403
+
+    текущий = ключ_превью(документ.путь_к_файлу, current_app.config['PREVIEW_WIDTH'])
+    if key != текущий:
+        return redirect(url_for('main.document_preview', document_id=документ.id, key=текущий, fmt=fmt))
+
+    etag = f'{key}-{fmt}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        data = превью_документа(документ, fmt)
+        if data is None:
+            # Превью нарисует extract-text; браузер спросит снова после перезагрузки страницы
+            response = Response('', status=404)
+            response.cache_control.private = True
+            response.cache_control.max_age = MISS_MAX_AGE
+            return response
+        response = Response(data, mimetype=FORMATS[fmt][1])
+
+    response.set_etag(etag)
+    # private: превью показывает содержимое документа, общим кэшам его хранить нельзя
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config['PREVIEW_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+@bp.route('/qr_sheets')
+@login_required
+def qr_sheets():
+    """Лист QR-кодов для печати по фильтрам статистики"""
+    if current_user.роль != 'администратор':
+        flash('Недостаточно прав для печати QR-кодов')
+        return redirect(url_for('main.statistics'))
+
+    pages = ячейки(документы_для_листов(request.args))
+    if not pages:
+        flash('Нет документов под выбранные фильтры')
+        return redirect(url_for('main.statistics', **request.args))
+
+    fmt = 'png' if request.args.get('format') == 'png' else 'pdf'
+    mimetype, filename = ('application/zip', 'qr_codes.zip') if fmt == 'png' else ('application/pdf', 'qr_codes.pdf')
+    return Response(
+        stream_with_context(sheet_stream(pages, fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
-@app.route('/download/<int:document_id>')
+@bp.route('/download/<int:document_id>')
 @login_required
 def download_document(document_id):
     документ = Документ.query.get_or_404(document_id)
-    if документ.отдел_id != current_user.отдел_id:
+    if not документ_доступен(документ):
         return 'Доступ запрещен', 403
     
-    file_path = os.path.join(app.root_path, 'uploads', документ.путь_к_файлу)
-    return send_file(file_path, 
-                    as_attachment=True,
-                    download_name=документ.путь_к_файлу.split('_', 2)[-1])
+    return отдать_документ(документ)
 
-@app.route('/statistics')
+@bp.route('/statistics')
 @login_required
 def statistics():
     if current_user.роль not in ['администратор', 'руководитель']:
         flash('Недостаточно прав для просмотра статистики')
-        return redirect(url_for('documents'))
+        return redirect(url_for('main.documents'))
 
     # Получаем параметры фильтрации
     start_date = request.args.get('start_date')
@@ -288,57 +424,25 @@ def statistics():
     document_type = request.args.get('document_type')
     department_id = request.args.get('department_id')
     
-    # Базовый запрос
-    query = db.session.query(
-        Документ,
-        Отдел.название.label('отдел_название'),
-        db.func.count(Сотрудник.id).label('всего_сотрудников'),
-        db.func.count(ПрочтениеДокумента.id).label('ознакомились')
-    ).join(
-        Отдел, Документ.отдел_id == Отдел.id
-    ).outerjoin(
-        Сотрудник, Сотрудник.отдел_id == Отдел.id
-    ).outerjoin(
-        ПрочтениеДокумента, 
-        db.and_(
-            ПрочтениеДокумента.документ_id == Документ.id,
-            ПрочтениеДокумента.сотрудник_id == Сотрудник.id
-        )
-    )
-    
-    # Применяем фильтры
-    if start_date:
-        query = query.filter(Документ.дата_создания >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date:
-        query = query.filter(Документ.дата_создания <= datetime.strptime(end_date, '%Y-%m-%d'))
-    if document_type:
-        query = query.filter(Документ.тип_документа == document_type)
-    if department_id:
-        query = query.filter(Отдел.id == department_id)
-    
-    # Группировка
-    stats = query.group_by(Документ.id, Отдел.id).all()
+    # Базовый запрос с фильтрами
+    query, sort_exprs = статистика_query()
+    query = применить_фильтры_статистики(query, request.args)
     
-    # Преобразуем результаты
-    статистика = []
-    for док, отдел_название, всего, ознакомились in stats:
-        статистика.append({
-            'документ': док,
-            'отдел': отдел_название,
-            'всего_сотрудников': всего,
-            'ознакомились': ознакомились,
-            'процент': round((ознакомились / всего * 100) if всего > 0 else 0, 2)
-        })
+    # Страница статистики
+    статистика = страница_статистики(
+        query, sort_exprs, **get_page_args(СОРТИРОВКИ_СТАТИСТИКИ, 'created')
+    )
     
     # Получаем данные для фильтров
-    отделы = Отдел.query.all()
-    типы_документов = db.session.query(Документ.тип_документа).distinct().all()
+    отделы = все_отделы()
+    типы_документов = все_типы_документов()
     
     return render_template(
         'statistics.html',
         статистика=статистика,
         отделы=отделы,
         типы_документов=типы_документов,
+        сортировки=СОРТИРОВКИ_СТАТИСТИКИ,
         current_filters={
             'start_date': start_date,
             'end_date': end_date,
@@ -347,130 +451,75 @@ def statistics():
         }
     )
 
-@app.route('/export_statistics')
+@bp.route('/export_statistics')
 @login_required
 def export_statistics():
-    """Экспорт статистики в Excel"""
+    """Экспорт статистики в Excel или CSV"""
     if current_user.роль != 'администратор':
         flash('Недостаточно прав для экспорта статистики')
-        return redirect(url_for('statistics'))
+        return redirect(url_for('main.statistics'))
 
-    try:
-        # Получаем параметры фильтрации
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        document_type = request.args.get('document_type')
-        department_id = request.args.get('department_id')
-        if department_id:
-            department_id = int(department_id)
-
-        # Базовый запрос
-        query = db.session.query(
-            Документ,
-            Отдел.название.label('отдел'),
-            db.func.count(Сотрудник.id).label('всего_сотрудников'),
-            db.func.count(ПрочтениеДокумента.id).label('прочитали')
-        ).join(
-            Отдел, Документ.отдел_id == Отдел.id
-        ).outerjoin(
-            Сотрудник, Сотрудник.отдел_id == Отдел.id
-        ).outerjoin(
-            ПрочтениеДокумента,
-            db.and_(
-                ПрочтениеДокумента.документ_id == Документ.id,
-                ПрочтениеДокумента.сотрудник_id == Сотрудник.id
-            )
-        )
+    def строки():
+        # Фильтры разбирают даты из запроса: ошибка в них обрабатывается в export_response
+        query, _ = статистика_query()
+        query = применить_фильтры_статистики(query, request.args)
+        return строки_статистики(query.order_by(Документ.дата_создания.desc(), Документ.id.desc()))
 
-        # Применяем фильтры
-        if start_date:
-            query = query.filter(Документ.дата_создания >= datetime.strptime(start_date, '%Y-%m-%d'))
-        if end_date:
-            query = query.filter(Документ.дата_создания <= datetime.strptime(end_date, '%Y-%m-%d'))
-        if document_type:
-            query = query.filter(Документ.тип_документа == document_type)
-        if department_id:
-            query = query.filter(Отдел.id == department_id)
-
-        # Группировка
-        stats = query.group_by(Документ.id, Отдел.id).all()
-
-        # Создаем новую книгу Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Статистика"
-
-        # Стили для заголовков
-        header_font = Font(bold=True)
-        header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        # Заголовки
-        headers = [
-            "Название документа", "Тип документа", "Отдел",
-            "Дата создания", "Срок ознакомления",
-            "Всего сотрудников", "Прочитали", "Процент ознакомления"
-        ]
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center')
-
-        # Заполняем данные
-        for row, (док, отдел, всего, прочитали) in enumerate(stats, 2):
-            ws.cell(row=row, column=1, value=док.название)
-            ws.cell(row=row, column=2, value=док.тип_документа)
-            ws.cell(row=row, column=3, value=отдел)
-            ws.cell(row=row, column=4, value=док.дата_создания.strftime('%d.%m.%Y'))
-            ws.cell(row=row, column=5, value=док.срок_ознакомления.strftime('%d.%m.%Y'))
-            ws.cell(row=row, column=6, value=всего)
-            ws.cell(row=row, column=7, value=прочитали)
-            процент = round((прочитали / всего * 100) if всего > 0 else 0, 2)
-            ws.cell(row=row, column=8, value=f"{процент}%")
-
-        # Автоматическая ширина столбцов
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            ws.column_dimensions[column].width = adjusted_width
-
-        # Сохраняем в буфер
-        excel_file = io.BytesIO()
-        wb.save(excel_file)
-        excel_file.seek(0)
-
-        return send_file(
-            excel_file,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name='statistics.xlsx'
-        )
+    return export_response(ЗАГОЛОВКИ_СТАТИСТИКИ, строки, 'statistics', 'Статистика')
+
+@bp.route('/export_statistics/employees')
+@login_required
+def export_statistics_employees():
+    """Экспорт отметок об ознакомлении по каждому сотруднику"""
+    if current_user.роль != 'администратор':
+        flash('Недостаточно прав для экспорта статистики')
+        return redirect(url_for('main.statistics'))
+
+    def строки():
+        query = по_сотрудникам_query(request.args.get('status'))
+        return строки_по_сотрудникам(применить_фильтры_статистики(query, request.args))
+
+    return export_response(ЗАГОЛОВКИ_ПО_СОТРУДНИКАМ, строки, 'statistics_employees', 'По сотрудникам')
+
+def export_response(headers, rows, name, title):
+    """Потоковый ответ с выгрузкой в формате из параметра format (xlsx или csv).
 
+    rows() строит запрос и возвращает строки; его ошибки, в том числе в
+    параметрах фильтров, показываются сообщением на странице статистики.
+    """
+    path = None
+    try:
+        if request.args.get('format') == 'csv':
+            body, mimetype, filename = csv_stream(headers, rows()), CSV_MIMETYPE, f'{name}.csv'
+        else:
+            path = xlsx_file(headers, rows(), title)
+            body, mimetype, filename = file_stream(path), XLSX_MIMETYPE, f'{name}.xlsx'
     except Exception as e:
         flash(f'Ошибка при экспорте статистики: {str(e)}')
-        return redirect(url_for('statistics'))
+        return redirect(url_for('main.statistics'))
+
+    response = Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+    if path:
+        # Сервер закрывает ответ и тогда, когда клиент ушёл до первого фрагмента
+        response.call_on_close(lambda: удалить_временный_файл(path))
+    return response
 
-@app.route('/add_department', methods=['GET', 'POST'])
+@bp.route('/add_department', methods=['GET', 'POST'])
 @login_required
 def add_department():
     if current_user.роль != 'администратор':
         flash('Недостаточно прав для добавления отделов')
-        return redirect(url_for('departments'))
+        return redirect(url_for('main.departments'))
         
     if request.method == 'POST':
         название = request.form.get('name')
         if not название:
             flash('Название отдела не может быть пустым')
-            return redirect(url_for('add_department'))
+            return redirect(url_for('main.add_department'))
             
         организация = Организация.query.first()
         if not организация:
@@ -481,19 +530,20 @@ def add_department():
         
         отдел = Отдел(название=название, организация_id=организация.id)
         db.session.add(отдел)
+        отметить_изменение(ОТДЕЛЫ)
         db.session.commit()
         
         flash('Отдел успешно добавлен')
-        return redirect(url_for('departments'))
+        return redirect(url_for('main.departments'))
         
     return render_template('add_department.html')
 
-@app.route('/add_employee', methods=['GET', 'POST'])
+@bp.route('/add_employee', methods=['GET', 'POST'])
 @login_required
 def add_employee():
     if current_user.роль != 'администратор':
         flash('Недостаточно прав для добавления сотрудников')
-        return redirect(url_for('users'))
+        return redirect(url_for('main.users'))
         
     if request.method == 'POST':
         new_employee = Сотрудник(
@@ -510,82 +560,126 @@ def add_employee():
         
         try:
             db.session.add(new_employee)
+            db.session.flush()
+            учесть_нового_сотрудника(new_employee)
             db.session.commit()
             flash('Сотрудник успешно добавлен')
-            return redirect(url_for('users'))
+            return redirect(url_for('main.users'))
         except Exception as e:
             db.session.rollback()
             flash(f'Ошибка при добавлении сотрудника: {str(e)}')
             
-    отделы = Отдел.query.all()
+    отделы = все_отделы()
     return render_template('add_employee.html', отделы=отделы)
 
-@app.route('/delete_document/<int:id>', methods=['POST'])
+@bp.route('/import_employees', methods=['GET', 'POST'])
+@login_required
+def import_employees():
+    if current_user.роль != 'администратор':
+        flash('Недостаточно прав для добавления сотрудников')
+        return redirect(url_for('main.users'))
+
+    if request.method == 'POST':
+        файл = request.files.get('file')
+        if not файл or not файл.filename:
+            flash('Выберите файл для импорта')
+            return redirect(url_for('main.import_employees'))
+        try:
+            import_id = запустить_импорт(файл, skip_invalid=bool(request.form.get('skip_invalid')))
+        except ОшибкаИмпорта as e:
+            flash(str(e))
+            return redirect(url_for('main.import_employees'))
+        return redirect(url_for('main.import_employees_report', import_id=import_id))
+
+    return render_template('import_employees.html')
+
+@bp.route('/import_employees/<uuid:import_id>')
+@login_required
+def import_employees_report(import_id):
+    if current_user.роль != 'администратор':
+        flash('Недостаточно прав для добавления сотрудников')
+        return redirect(url_for('main.users'))
+
+    # Пока отчёта нет, страница обновляется сама
+    return render_template('import_employees.html', import_id=import_id, отчёт=отчёт_импорта(import_id))
+
+@bp.route('/delete_document/<int:id>', methods=['POST'])
 @login_required
 def delete_document(id):
     if current_user.роль != 'администратор':
         flash('Недостаточно прав для удаления документов')
-        return redirect(url_for('documents'))
+        return redirect(url_for('main.documents'))
 
     документ = Документ.query.get_or_404(id)
     
-    # Удаляем связанные записи
-    ПрочтениеДокумента.query.filter_by(документ_id=id).delete()
+    # Документ нескольких отделов: снимаем только выбранный отдел
+    отдел_id = request.form.get('отдел_id', type=int)
+    if отдел_id and len(документ.адресаты) > 1:
+        адресат = ДокументОтдела.query.filter_by(документ_id=id, отдел_id=отдел_id).first_or_404()
+        учесть_снятие_адресата(id, отдел_id)
+        db.session.delete(адресат)
+        db.session.commit()
+        flash('Документ снят с отдела')
+        return redirect(url_for('main.documents'))
     
-    # Удаляем файл документа
-    if документ.путь_к_файлу:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], документ.путь_к_файлу)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    # Обновляем счётчики и удаляем связанные записи
+    учесть_удаление_документа(документ)
+    ПрочтениеДокумента.query.filter_by(документ_id=id).delete()
+    Уведомление.query.filter_by(документ_id=id).delete()
+    НапоминаниеОСроке.query.filter_by(документ_id=id).delete()
+    # Тип мог остаться без документов
+    отметить_изменение(ТИПЫ_ДОКУМЕНТОВ)
     
-    # Удаляем QR-код
-    if документ.qr_код:
-        qr_path = os.path.join('static', 'qr_codes', документ.qr_код)
-        if os.path.exists(qr_path):
-            os.remove(qr_path)
+    # Снимаем ссылку на файл; сам файл удаляется, когда ссылок не осталось
+    file_path = освободить_файл(документ)
     
     db.session.delete(документ)
     db.session.commit()
+    удалить_с_диска(file_path)
+    
+    # Удаляем QR-код, если он был сохранён на диск
+    удалить_старый_qr(документ.qr_код)
     
     flash('Документ успешно удален')
-    return redirect(url_for('documents'))
+    return redirect(url_for('main.documents'))
 
-@app.route('/edit_department/<int:id>', methods=['GET', 'POST'])
+@bp.route('/edit_department/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_department(id):
     if current_user.роль != 'администратор':
         flash('Недостаточно прав для редактирования отделов')
-        return redirect(url_for('departments'))
+        return redirect(url_for('main.departments'))
 
     отдел = Отдел.query.get_or_404(id)
     
     if request.method == 'POST':
         отдел.название = request.form['name']
+        отметить_изменение(ОТДЕЛЫ)
         db.session.commit()
         flash('Отдел успешно обновлен')
-        return redirect(url_for('departments'))
+        return redirect(url_for('main.departments'))
         
     return render_template('edit_department.html', отдел=отдел)
 
-@app.route('/departments')
+@bp.route('/departments')
 @login_required
 def departments():
     if current_user.роль != 'администратор':
         flash('Недостаточно прав для просмотра отделов')
-        return redirect(url_for('documents'))
+        return redirect(url_for('main.documents'))
         
-    отделы = Отдел.query.all()
+    отделы = все_отделы()
     return render_template('departments.html', отделы=отделы)
 
-@app.route('/edit_position/<int:user_id>', methods=['GET', 'POST'])
+@bp.route('/edit_position/<int:user_id>', methods=['GET', 'POST'])
 @login_required
 def edit_position(user_id):
     if current_user.роль != 'администратор':
         flash('Недостаточно прав для редактирования данных сотрудника')
-        return redirect(url_for('users'))
+        return redirect(url_for('main.users'))
 
     сотрудник = Сотрудник.query.get_or_404(user_id)
-    отделы = Отдел.query.all()
+    отделы = все_отделы()
     
     if request.method == 'POST':
         try:
@@ -597,12 +691,15 @@ def edit_position(user_id):
             сотрудник.email = request.form['email']
             сотрудник.должность = request.form['должность']
             сотрудник.рабочий_телефон = request.form['рабочий_телефон']
+            старый_отдел_id = сотрудник.отдел_id
             сотрудник.отдел_id = int(request.form['отдел_id'])
             сотрудник.роль = request.form['роль']
+            учесть_перевод(сотрудник, старый_отдел_id)
+            отметить_изменение(СОТРУДНИКИ)
             
             db.session.commit()
             flash('Данные сотрудника успешно обновлены')
-            return redirect(url_for('users'))
+            return redirect(url_for('main.users'))
         except Exception as e:
             db.session.rollback()
             flash(f'Ошибка при обновлении данных: {str(e)}')
@@ -610,17 +707,81 @@ def edit_position(user_id):
         
     return render_template('edit_position.html', сотрудник=сотрудник, отделы=отделы)
 
-@app.route('/users')
+@bp.route('/archive')
+@login_required
+def archive():
+    """Документы, перенесённые в архив (см. archive.py)"""
+    if current_user.роль not in ['администратор', 'руководитель']:
+        flash('Недостаточно прав для просмотра архива')
+        return redirect(url_for('main.documents'))
+
+    query = фильтры_архива(АрхивныйДокумент.query, request.args)
+    документы = страница_архива(query, **get_page_args(СОРТИРОВКИ_АРХИВА, 'created'))
+    return render_template(
+        'archive.html',
+        документы=документы,
+        типы_документов=типы_архива(),
+        сортировки=СОРТИРОВКИ_АРХИВА,
+        current_filters=request.args
+    )
+
+@bp.route('/archive/<int:id>/download')
+@login_required
+def download_archived_document(id):
+    if current_user.роль not in ['администратор', 'руководитель']:
+        return 'Доступ запрещен', 403
+    документ = АрхивныйДокумент.query.get_or_404(id)
+    файл = открыть_файл(документ)
+    if файл is None:
+        abort(404)
+    return send_file(файл, as_attachment=True, download_name=документ.имя_файла or f'document_{id}')
+
+@bp.route('/archive/<int:id>/reads')
+@login_required
+def export_archived_reads(id):
+    """Выгрузка прочтений архивного документа из его пакета"""
+    if current_user.роль not in ['администратор', 'руководитель']:
+        return 'Доступ запрещен', 403
+    документ = АрхивныйДокумент.query.get_or_404(id)
+    return export_response(
+        ЗАГОЛОВКИ_ПРОЧТЕНИЙ, lambda: строки_прочтений(документ), f'archive_{id}_reads', 'Прочтения'
+    )
+
+@bp.route('/users')
 @login_required
 def users():
     if current_user.роль != 'администратор':
         flash('Недостаточно прав для просмотра пользователей')
-        return redirect(url_for('documents'))
+        return redirect(url_for('main.documents'))
         
-    сотрудники = Сотрудник.query.all()
-    return render_template('users.html', сотрудники=сотрудники)
+    сотрудники = страница_сотрудников(
+        Сотрудник.query, **get_page_args(СОРТИРОВКИ_СОТРУДНИКОВ, 'surname')
+    )
+    return render_template('users.html', сотрудники=сотрудники, сортировки=СОРТИРОВКИ_СОТРУДНИКОВ)
+
+def create_app(config=Config):
+    """Фабрика веб-приложения.
+
+    Бот и тяжёлые библиотеки (qrcode, openpyxl, Pillow) здесь не импортируются:
+    они загружаются в тех обработчиках, которым нужны.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+    login_manager.init_app(app)
+    login_manager.login_view = 'main.login'
+
+    app.register_blueprint(bp)
+    metrics.init_app(app)
+    app.add_template_global(page_url)
+    app.add_template_global(preview_url)
+    for command in (rebuild_counters_command, qr_sheets_command, check_indexes_command,
+                    check_query_counts_command, clean_uploads_command, extract_text_command,
+                    import_employees_command, read_partitions_command, archive_documents_command):
+        app.cli.add_command(command)
+    return app
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    app.run(debug=True)
+    create_app().run(debug=True)
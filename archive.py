@@ -0,0 +1,303 @@
+"""Архив документов с истёкшим сроком хранения.
+
+`flask archive-documents` переносит в холодное хранилище ARCHIVE_FOLDER
+документы, созданные больше ARCHIVE_AFTER_DAYS дней назад, срок
+ознакомления которых прошёл. Каждые ARCHIVE_BATCH_SIZE документов
+образуют пакет - ZIP со сжатием:
+
+    documents.jsonl   описание документов и адресатов
+    reads.csv         прочтения с ФИО и табельным номером на момент архивации
+    files/<sha256>    файлы документов
+    qr/<имя>          QR-коды, сохранённые на диск старыми версиями
+
+Пакет записывается на диск до коммита, который удаляет документы из
+рабочих таблиц, поэтому сбой не теряет данных. Если пакет не удалось
+записать или удалить, его документы архивируются по одному; документ,
+который не проходит и один, пропускается до следующего запуска, а ошибка
+пишется в журнал. Описание документа
+остаётся в таблице архив_документов: архив ищется на странице /archive,
+а файл и прочтения документа читаются из пакета отдельным членом ZIP,
+без распаковки всего пакета.
+"""
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from extensions import db
+from models import (
+    Документ, ДокументОтдела, ПрочтениеДокумента, Отдел, Сотрудник, Уведомление, НапоминаниеОСроке,
+    АрхивныйДокумент
+)
+from counters import учесть_удаление_документа
+from pagination import paginate_keyset
+from qr_service import LEGACY_QR_DIR, удалить_старый_qr
+from reference_cache import отметить_изменение, ТИПЫ_ДОКУМЕНТОВ
+from storage import полный_путь, освободить_файл, удалить_с_диска, CHUNK_SIZE
+
+СОРТИРОВКИ_АРХИВА = {
+    'created': ('Дата создания', True),
+    'title': ('Название', False),
+}
+
+ЗАГОЛОВКИ_ПРОЧТЕНИЙ = ['Табельный номер', 'ФИО', 'Отдел', 'Дата прочтения']
+
+# Размер пачки строк, читаемых из серверного курсора
+BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(CHUNK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def путь_пакета(пакет):
+    return os.path.join(current_app.config['ARCHIVE_FOLDER'], пакет)
+
+
+def кандидаты(граница, limit, кроме=()):
+    """Документы, созданные раньше границы, срок ознакомления которых прошёл"""
+    query = Документ.query.options(db.joinedload(Документ.файл)).filter(
+        Документ.дата_создания < граница,
+        db.or_(Документ.срок_ознакомления == None, Документ.срок_ознакомления < datetime.utcnow().date())
+    )
+    if кроме:
+        query = query.filter(Документ.id.notin_(кроме))
+    return query.order_by(Документ.id).limit(limit).with_for_update(of=Документ, skip_locked=True).all()
+
+
+def _адресаты(ids):
+    """{документ_id: [{отдел, всего, прочитали}]} по счётчикам"""
+    результат = {}
+    for документ_id, отдел, всего, прочитали in db.session.execute(
+        db.select(ДокументОтдела.документ_id, Отдел.название, Отдел.число_сотрудников,
+                  ДокументОтдела.число_прочтений).join(
+            Отдел, Отдел.id == ДокументОтдела.отдел_id
+        ).where(ДокументОтдела.документ_id.in_(ids)).order_by(Отдел.название)
+    ):
+        результат.setdefault(документ_id, []).append({'отдел': отдел, 'всего': всего, 'прочитали': прочитали})
+    return результат
+
+
+def _записать_прочтения(zf, ids):
+    """reads.csv пакета; возвращает {документ_id: число прочтений}"""
+    прочтений = Counter()
+    query = db.session.query(
+        ПрочтениеДокумента.документ_id, Сотрудник.табельный_номер,
+        Сотрудник.фамилия, Сотрудник.имя, Сотрудник.отчество, Отдел.название,
+        ПрочтениеДокумента.дата_прочтения
+    ).join(
+        Сотрудник, Сотрудник.id == ПрочтениеДокумента.сотрудник_id
+    ).join(
+        Отдел, Отдел.id == Сотрудник.отдел_id
+    ).filter(
+        ПрочтениеДокумента.документ_id.in_(ids)
+    ).order_by(ПрочтениеДокумента.документ_id, ПрочтениеДокумента.дата_прочтения)
+
+    with zf.open('reads.csv', 'w') as raw, io.TextIOWrapper(raw, encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['документ_id', 'табельный_номер', 'фио', 'отдел', 'дата_прочтения'])
+        for документ_id, табельный_номер, фамилия, имя, отчество, отдел, дата in query.yield_per(BATCH_SIZE):
+            фио = ' '.join(part for part in (фамилия, имя, отчество) if part)
+            writer.writerow([документ_id, табельный_номер, фио, отдел, дата.isoformat(sep=' ')])
+            прочтений[документ_id] += 1
+    return прочтений
+
+
+def записать_пакет(документы, path):
+    """Записать документы с файлами, QR-кодами и прочтениями в ZIP; возвращает строки архив_документов"""
+    ids = [документ.id for документ in документы]
+    адресаты = _адресаты(ids)
+    строки = []
+    tmp_path = path + '.tmp'
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            записаны = set()
+            for документ in документы:
+                sha256 = размер = None
+                file_path = полный_путь(документ.путь_к_файлу) if документ.путь_к_файлу else None
+                if file_path and os.path.exists(file_path):
+                    # У файлов, загруженных до появления хранилища, хеша в базе нет
+                    sha256 = документ.файл.sha256 if документ.файл else _sha256(file_path)
+                    размер = os.path.getsize(file_path)
+                    if sha256 not in записаны:
+                        zf.write(file_path, f'files/{sha256}')
+                        записаны.add(sha256)
+                qr_код = None
+                if документ.qr_код and os.path.exists(os.path.join(LEGACY_QR_DIR, документ.qr_код)):
+                    qr_код = документ.qr_код
+                    zf.write(os.path.join(LEGACY_QR_DIR, qr_код), f'qr/{qr_код}')
+                строки.append(АрхивныйДокумент(
+                    id=документ.id, название=документ.название, тип_документа=документ.тип_документа,
+                    дата_создания=документ.дата_создания, срок_ознакомления=документ.срок_ознакомления,
+                    имя_файла=документ.имя_для_скачивания if документ.путь_к_файлу else None,
+                    sha256=sha256, размер=размер, qr_код=qr_код, пакет=os.path.basename(path),
+                    адресаты=адресаты.get(документ.id, []), прочтений=0
+                ))
+
+            прочтений = _записать_прочтения(zf, ids)
+            for строка in строки:
+                строка.прочтений = прочтений[строка.id]
+            zf.writestr('documents.jsonl', ''.join(
+                json.dumps({
+                    'id': строка.id, 'название': строка.название, 'тип_документа': строка.тип_документа,
+                    'дата_создания': строка.дата_создания.isoformat(),
+                    'срок_ознакомления': строка.срок_ознакомления and строка.срок_ознакомления.isoformat(),
+                    'имя_файла': строка.имя_файла, 'sha256': строка.sha256, 'размер': строка.размер,
+                    'qr_код': строка.qr_код, 'адресаты': строка.адресаты, 'прочтений': строка.прочтений,
+                }, ensure_ascii=False) + '\n'
+                for строка in строки
+            ))
+        # Пакет должен оказаться на диске раньше, чем документы удалятся из базы
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return строки
+
+
+def удалить_из_рабочих_таблиц(документы):
+    """Удалить документы как delete_document; возвращает пути файлов для удаления после коммита"""
+    ids = [документ.id for документ in документы]
+    пути = []
+    for документ in документы:
+        учесть_удаление_документа(документ)
+        пути.append(освободить_файл(документ))
+    ПрочтениеДокумента.query.filter(ПрочтениеДокумента.документ_id.in_(ids)).delete(synchronize_session=False)
+    Уведомление.query.filter(Уведомление.документ_id.in_(ids)).delete(synchronize_session=False)
+    НапоминаниеОСроке.query.filter(НапоминаниеОСроке.документ_id.in_(ids)).delete(synchronize_session=False)
+    for документ in документы:
+        db.session.delete(документ)
+    отметить_изменение(ТИПЫ_ДОКУМЕНТОВ)
+    return пути
+
+
+def заархивировать(граница=None, batch_size=None, limit=None):
+    """Перенести документы старше границы в архив пакетами; возвращает отчёт"""
+    started = time.perf_counter()
+    граница = граница or datetime.utcnow() - timedelta(days=current_app.config['ARCHIVE_AFTER_DAYS'])
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    os.makedirs(current_app.config['ARCHIVE_FOLDER'], exist_ok=True)
+    отчёт = {'документов': 0, 'пакетов': [], 'байт': 0, 'пропущено': []}
+    # Сколько следующих пакетов собирать по одному документу после сбоя пакета
+    по_одному = 0
+
+    while limit is None or отчёт['документов'] < limit:
+        размер = 1 if по_одному else batch_size
+        документы = кандидаты(граница, размер if limit is None else min(размер, limit - отчёт['документов']),
+                              отчёт['пропущено'])
+        if not документы:
+            break
+        ids = [документ.id for документ in документы]
+        path = путь_пакета(f'{datetime.utcnow():%Y%m%d-%H%M%S}-{ids[0]}.zip')
+        try:
+            db.session.add_all(записать_пакет(документы, path))
+            пути = удалить_из_рабочих_таблиц(документы)
+            qr_коды = [документ.qr_код for документ in документы]
+            db.session.commit()
+        except BaseException as e:
+            db.session.rollback()
+            if os.path.exists(path):
+                os.remove(path)
+            if not isinstance(e, Exception):
+                raise
+            if len(ids) > 1:
+                logger.exception(f'Пакет документов {ids[0]}-{ids[-1]} не заархивирован, повтор по одному')
+                по_одному = len(ids)
+            else:
+                logger.exception(f'Документ {ids[0]} не заархивирован и пропущен')
+                отчёт['пропущено'].append(ids[0])
+                по_одному = max(по_одному - 1, 0)
+            continue
+        по_одному = max(по_одному - 1, 0)
+        for file_path in пути:
+            удалить_с_диска(file_path)
+        for qr_код in qr_коды:
+            удалить_старый_qr(qr_код)
+        отчёт['документов'] += len(документы)
+        отчёт['пакетов'].append(os.path.basename(path))
+        отчёт['байт'] += os.path.getsize(path)
+    отчёт['секунд'] = round(time.perf_counter() - started, 1)
+    return отчёт
+
+
+def страница_архива(query, sort='created', cursor=None, direction='next', per_page=None):
+    sort_expr = {
+        'created': АрхивныйДокумент.дата_создания,
+        'title': АрхивныйДокумент.название,
+    }[sort]
+    return paginate_keyset(query, sort, sort_expr, АрхивныйДокумент.id,
+                           СОРТИРОВКИ_АРХИВА[sort][1], cursor, direction, per_page)
+
+
+def фильтры_архива(query, args):
+    """Фильтры страницы архива: название, тип документа и год создания"""
+    if args.get('q'):
+        query = query.filter(АрхивныйДокумент.название.ilike(f"%{args['q']}%"))
+    if args.get('document_type'):
+        query = query.filter(АрхивныйДокумент.тип_документа == args['document_type'])
+    year = args.get('year', type=int)
+    if year:
+        query = query.filter(
+            АрхивныйДокумент.дата_создания >= datetime(year, 1, 1),
+            АрхивныйДокумент.дата_создания < datetime(year + 1, 1, 1)
+        )
+    return query
+
+
+def типы_архива():
+    return db.session.scalars(
+        db.select(АрхивныйДокумент.тип_документа).where(
+            АрхивныйДокумент.тип_документа != None
+        ).distinct().order_by(АрхивныйДокумент.тип_документа)
+    ).all()
+
+
+def открыть_файл(документ):
+    """Файл архивного документа из пакета (файловый объект) или None"""
+    if not документ.sha256:
+        return None
+    with zipfile.ZipFile(путь_пакета(документ.пакет)) as zf:
+        # Член ZIP держит файл пакета открытым и после закрытия ZipFile
+        return zf.open(f'files/{документ.sha256}')
+
+
+def строки_прочтений(документ):
+    """Строки выгрузки прочтений архивного документа из reads.csv пакета"""
+    with zipfile.ZipFile(путь_пакета(документ.пакет)) as zf, zf.open('reads.csv') as raw:
+        reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8', newline=''), delimiter=';')
+        next(reader)
+        for документ_id, табельный_номер, фио, отдел, дата in reader:
+            if int(документ_id) == документ.id:
+                yield [табельный_номер, фио, отдел, datetime.fromisoformat(дата).strftime('%d.%m.%Y %H:%M')]
+
+
+@click.command('archive-documents')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Граница даты создания (по умолчанию ARCHIVE_AFTER_DAYS дней назад)')
+@click.option('--batch-size', type=int, default=None, help='Документов в пакете')
+@click.option('--limit', type=int, default=None, help='Не больше стольких документов за запуск')
+@with_appcontext
+def archive_documents_command(before, batch_size, limit):
+    """Перенести старые документы с файлами и прочтениями в архив"""
+    отчёт = заархивировать(граница=before, batch_size=batch_size, limit=limit)
+    click.echo(f"Заархивировано документов: {отчёт['документов']}, пакетов: {len(отчёт['пакетов'])}, "
+               f"{отчёт['байт'] / 1024 ** 2:.1f} МБ за {отчёт['секунд']} с")
+    if отчёт['пропущено']:
+        click.echo(f"Пропущены из-за ошибок (см. журнал): {', '.join(map(str, отчёт['пропущено']))}")
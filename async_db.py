@@ -0,0 +1,48 @@
+"""Асинхронный доступ бота к базе данных.
+
+Бот работает через AsyncSession с драйвером asyncpg и собственным пулом
+соединений, поэтому ожидание базы не блокирует обработку других обновлений.
+Запросы описаны один раз в repository.py как обычные функции от сессии
+и выполняются здесь через AsyncSession.run_sync.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from config import Config
+
+
+def async_url(url):
+    """Адрес базы с асинхронным драйвером вместо psycopg2"""
+    url = make_url(url)
+    if url.drivername in ('postgresql', 'postgresql+psycopg2'):
+        url = url.set(drivername='postgresql+asyncpg')
+    return url
+
+
+engine = create_async_engine(
+    async_url(Config.SQLALCHEMY_DATABASE_URI),
+    pool_size=Config.BOT_DB_POOL_SIZE,
+    max_overflow=Config.BOT_DB_MAX_OVERFLOW,
+    pool_timeout=Config.BOT_DB_POOL_TIMEOUT,
+    pool_recycle=Config.BOT_DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+
+# expire_on_commit=False: объекты остаются читаемыми после закрытия сессии
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def выполнить(fn, *args, **kwargs):
+    """Выполнить функцию репозитория fn(session, ...) в отдельной транзакции"""
+    async with Session() as session:
+        async with session.begin():
+            return await session.run_sync(fn, *args, **kwargs)
+
+
+async def проверить_подключение():
+    async with engine.connect() as conn:
+        await conn.execute(text('SELECT 1'))
+
+
+async def закрыть():
+    await engine.dispose()
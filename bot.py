@@ -1,18 +1,29 @@
+import asyncio
 import logging
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
+import signal
+import sys
+from zoneinfo import ZoneInfo
+from telegram import (
+    Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
+)
 from telegram.ext import (
-    Application, CommandHandler, MessageHandler, filters,
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters,
     ContextTypes, ConversationHandler, CallbackContext
 )
+from conversations import Диалог
 from config import Config
-from extensions import app, db
-from models import Сотрудник, Документ, ПрочтениеДокумента, Отдел
-from datetime import datetime
-from PIL import Image
-from pyzbar.pyzbar import decode
-import io
+import async_db
+import metrics
+import repository
+import reminders
+from async_db import выполнить
+from dispatcher import Dispatcher
+from unread_cache import UnreadCache
+from qr_decode import QRDecoder
+from update_queue import UpdateQueue
+from webhook import ALLOWED_UPDATES
+from datetime import datetime, time
 import traceback
-from sqlalchemy import text
 
 # Настройка логирования
 logging.basicConfig(
@@ -28,17 +39,6 @@ logger = logging.getLogger(__name__)
 # Состояния разговора для регистрации
 ТАБЕЛЬНЫЙ_НОМЕР, ПОДРАЗДЕЛЕНИЕ, ТЕЛЕФОН = range(3)
 
-def check_database_connection():
-    """Проверка подключения к базе данных"""
-    try:
-        with app.app_context():
-            # Пробуем выполнить простой запрос
-            db.session.execute(text('SELECT 1'))
-            return True
-    except Exception as e:
-        logger.error(f"Ошибка подключения к базе данных: {e}")
-        return False
-
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     try:
@@ -46,36 +46,38 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"Пользователь {user.id} запустил команду /start")
         
         # Проверяем подключение к базе данных
-        if not check_database_connection():
+        try:
+            await async_db.проверить_подключение()
+        except Exception as e:
+            logger.error(f"Ошибка подключения к базе данных: {e}")
             await update.message.reply_text(
                 "Извините, но сейчас есть проблемы с подключением к базе данных. "
                 "Пожалуйста, попробуйте позже."
             )
             return ConversationHandler.END
         
-        with app.app_context():
-            сотрудник = Сотрудник.query.filter_by(telegram_id=user.id).first()
-            logger.info(f"Результат поиска сотрудника: {сотрудник}")
-            
-            if not сотрудник:
-                await update.message.reply_text(
-                    "Здравствуйте! Для начала работы необходимо зарегистрироваться.\n"
-                    "Пожалуйста, введите ваш табельный номер:"
-                )
-                return ТАБЕЛЬНЫЙ_НОМЕР
-            
-            if not сотрудник.статус_регистрации:
-                await update.message.reply_text(
-                    "Для завершения регистрации необходимо указать дополнительную информацию.\n"
-                    "Пожалуйста, введите ваш табельный номер:"
-                )
-                return ТАБЕЛЬНЫЙ_НОМЕР
-            
+        сотрудник = await выполнить(repository.сотрудник_по_telegram, user.id)
+        logger.info(f"Результат поиска сотрудника: {сотрудник}")
+        
+        if not сотрудник:
             await update.message.reply_text(
-                f"Здравствуйте, {сотрудник.полное_имя}!\n"
-                "Отправьте мне QR-код документа для подтверждения ознакомления."
+                "Здравствуйте! Для начала работы необходимо зарегистрироваться.\n"
+                "Пожалуйста, введите ваш табельный номер:"
             )
-            return ConversationHandler.END
+            return ТАБЕЛЬНЫЙ_НОМЕР
+        
+        if not сотрудник.статус_регистрации:
+            await update.message.reply_text(
+                "Для завершения регистрации необходимо указать дополнительную информацию.\n"
+                "Пожалуйста, введите ваш табельный номер:"
+            )
+            return ТАБЕЛЬНЫЙ_НОМЕР
+        
+        await update.message.reply_text(
+            f"Здравствуйте, {сотрудник.полное_имя}!\n"
+            "Отправьте мне QR-код документа для подтверждения ознакомления."
+        )
+        return ConversationHandler.END
     except Exception as e:
         error_text = f"Ошибка в команде start: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_text)
@@ -92,29 +94,28 @@ async def register_employee_number(update: Update, context: ContextTypes.DEFAULT
         табельный_номер = update.message.text.strip()
         logger.info(f"Получен табельный номер: {табельный_номер}")
         
-        with app.app_context():
-            # Поиск сотрудника по табельному номеру
-            сотрудник = Сотрудник.query.filter_by(табельный_номер=табельный_номер).first()
-            
-            if not сотрудник:
-                await update.message.reply_text(
-                    "Сотрудник с таким табельным номером не найден.\n"
-                    "Пожалуйста, проверьте номер и попробуйте снова:"
-                )
-                return ТАБЕЛЬНЫЙ_НОМЕР
-            
-            context.user_data['employee_id'] = сотрудник.id
-            
-            # Получаем список всех отделов
-            отделы = Отдел.query.all()
-            keyboard = [[отдел.название] for отдел in отделы]
-            reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
-            
+        # Поиск сотрудника по табельному номеру
+        сотрудник = await выполнить(repository.сотрудник_по_табельному_номеру, табельный_номер)
+        
+        if not сотрудник:
             await update.message.reply_text(
-                "Выберите ваше структурное подразделение:",
-                reply_markup=reply_markup
+                "Сотрудник с таким табельным номером не найден.\n"
+                "Пожалуйста, проверьте номер и попробуйте снова:"
             )
-            return ПОДРАЗДЕЛЕНИЕ
+            return ТАБЕЛЬНЫЙ_НОМЕР
+        
+        context.user_data['employee_id'] = сотрудник.id
+        
+        # Получаем список всех отделов
+        отделы = await выполнить(repository.названия_отделов)
+        keyboard = [[название] for название in отделы]
+        reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True)
+        
+        await update.message.reply_text(
+            "Выберите ваше структурное подразделение:",
+            reply_markup=reply_markup
+        )
+        return ПОДРАЗДЕЛЕНИЕ
     except Exception as e:
         error_text = f"Ошибка при обработке табельного номера: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_text)
@@ -131,24 +132,21 @@ async def register_department(update: Update, context: ContextTypes.DEFAULT_TYPE
         название_отдела = update.message.text
         logger.info(f"Выбрано подразделение: {название_отдела}")
         
-        with app.app_context():
-            отдел = Отдел.query.filter_by(название=название_отдела).first()
-            
-            if not отдел:
-                await update.message.reply_text(
-                    "Подразделение не найдено. Пожалуйста, выберите из списка:"
-                )
-                return ПОДРАЗДЕЛЕНИЕ
-            
-            сотрудник = Сотрудник.query.get(context.user_data['employee_id'])
-            сотрудник.отдел_id = отдел.id
-            db.session.commit()
-            
+        найден = await выполнить(
+            repository.перевести_в_отдел, context.user_data['employee_id'], название_отдела
+        )
+        
+        if not найден:
             await update.message.reply_text(
-                "Введите ваш рабочий телефон:",
-                reply_markup=ReplyKeyboardRemove()
+                "Подразделение не найдено. Пожалуйста, выберите из списка:"
             )
-            return ТЕЛЕФОН
+            return ПОДРАЗДЕЛЕНИЕ
+        
+        await update.message.reply_text(
+            "Введите ваш рабочий телефон:",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        return ТЕЛЕФОН
     except Exception as e:
         error_text = f"Ошибка при выборе подразделения: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_text)
@@ -165,24 +163,21 @@ async def register_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
         телефон = update.message.text.strip()
         logger.info(f"Получен телефон: {телефон}")
         
-        with app.app_context():
-            сотрудник = Сотрудник.query.get(context.user_data['employee_id'])
-            
-            сотрудник.рабочий_телефон = телефон
-            сотрудник.telegram_id = update.effective_user.id
-            сотрудник.статус_регистрации = True
-            db.session.commit()
-            
-            await update.message.reply_text(
-                f"Регистрация завершена!\n\n"
-                f"Ваши данные:\n"
-                f"ФИО: {сотрудник.полное_имя}\n"
-                f"Подразделение: {сотрудник.отдел.название}\n"
-                f"Табельный номер: {сотрудник.табельный_номер}\n"
-                f"Рабочий телефон: {сотрудник.рабочий_телефон}\n\n"
-                f"Теперь вы можете отправлять мне QR-коды документов для подтверждения ознакомления."
-            )
-            return ConversationHandler.END
+        данные = await выполнить(
+            repository.завершить_регистрацию,
+            context.user_data['employee_id'], update.effective_user.id, телефон
+        )
+        
+        await update.message.reply_text(
+            f"Регистрация завершена!\n\n"
+            f"Ваши данные:\n"
+            f"ФИО: {данные['полное_имя']}\n"
+            f"Подразделение: {данные['отдел']}\n"
+            f"Табельный номер: {данные['табельный_номер']}\n"
+            f"Рабочий телефон: {данные['рабочий_телефон']}\n\n"
+            f"Теперь вы можете отправлять мне QR-коды документов для подтверждения ознакомления."
+        )
+        return ConversationHandler.END
     except Exception as e:
         error_text = f"Ошибка при сохранении телефона: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_text)
@@ -208,58 +203,37 @@ async def process_qr(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         logger.info(f"Обработка QR-кода от пользователя {user.id}")
         
-        with app.app_context():
-            сотрудник = Сотрудник.query.filter_by(telegram_id=user.id).first()
-            
-            if not сотрудник or not сотрудник.статус_регистрации:
-                await update.message.reply_text(
-                    "Необходимо сначала завершить регистрацию. Используйте команду /start"
-                )
-                return
-            
-            # Получение фото
-            photo = await update.message.photo[-1].get_file()
-            photo_bytes = await photo.download_as_bytearray()
-            
-            # Открываем изображение с помощью Pillow
-            image = Image.open(io.BytesIO(photo_bytes))
-            
-            # Декодирование QR-кода
-            decoded_objects = decode(image)
-            
-            if not decoded_objects:
-                await update.message.reply_text("QR-код не обнаружен. Попробуйте еще раз.")
-                return
-            
-            document_id = int(decoded_objects[0].data.decode('utf-8'))
-            документ = Документ.query.get(document_id)
-            
-            if not документ:
-                await update.message.reply_text("Документ не найден в системе.")
-                return
-            
-            # Проверяем, не было ли уже подтверждения
-            existing = ПрочтениеДокумента.query.filter_by(
-                сотрудник_id=сотрудник.id,
-                документ_id=документ.id
-            ).first()
-            
-            if existing:
-                await update.message.reply_text(
-                    f"Вы уже подтвердили ознакомление с документом '{документ.название}' "
-                    f"({existing.дата_прочтения.strftime('%d.%m.%Y %H:%M')})"
-                )
-                return
-            
-            # Регистрация прочтения
-            прочтение = ПрочтениеДокумента(
-                сотрудник_id=сотрудник.id,
-                документ_id=документ.id,
-                подтверждено=True
+        сотрудник = await выполнить(repository.сотрудник_по_telegram, user.id)
+        
+        if not сотрудник or not сотрудник.статус_регистрации:
+            await update.message.reply_text(
+                "Необходимо сначала завершить регистрацию. Используйте команду /start"
+            )
+            return
+        
+        # Скачивание и декодирование в пуле, без блокировки других чатов
+        decoder = context.bot_data['qr_decoder']
+        data = await decoder.decode_photo(update.message.photo)
+        
+        if data is None:
+            await update.message.reply_text("QR-код не обнаружен. Попробуйте еще раз.")
+            return
+        
+        document_id = int(data)
+        
+        документ, подтверждено_ранее = await выполнить(
+            repository.подтвердить_прочтение, сотрудник, document_id
+        )
+        
+        if not документ:
+            await update.message.reply_text("Документ не найден в системе.")
+        elif подтверждено_ранее:
+            await update.message.reply_text(
+                f"Вы уже подтвердили ознакомление с документом '{документ.название}' "
+                f"({подтверждено_ранее.strftime('%d.%m.%Y %H:%M')})"
             )
-            db.session.add(прочтение)
-            db.session.commit()
-            
+        else:
+            context.bot_data['unread_cache'].invalidate(user.id)
             await update.message.reply_text(
                 f"✅ Ознакомление с документом '{документ.название}' подтверждено."
             )
@@ -290,122 +264,226 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # Глобальная переменная для бота
 application = None
 
-def get_bot():
-    """Получить экземпляр бота"""
-    global application
-    return application
+async def on_startup(application):
+    """Запуск фоновых служб бота: рассылки уведомлений и пула распознавания QR"""
+    # Проверяем подключение к базе данных; при ошибке бот не запустится
+    await async_db.проверить_подключение()
+    metrics.подключить_sql()
+    metrics.запустить_сервер_бота()
+    application.bot_data['qr_decoder'] = QRDecoder()
+    application.bot_data['unread_cache'] = UnreadCache()
+    dispatcher = Dispatcher(application.bot)
+    application.bot_data['dispatcher'] = dispatcher
+    application.bot_data['dispatcher_task'] = asyncio.create_task(dispatcher.run())
+
+async def on_shutdown(application):
+    """Остановка фоновых служб бота"""
+    dispatcher = application.bot_data.get('dispatcher')
+    if dispatcher:
+        dispatcher.stop()
+        await application.bot_data['dispatcher_task']
+    decoder = application.bot_data.get('qr_decoder')
+    if decoder:
+        decoder.shutdown()
+    await async_db.закрыть()
 
-async def notify_new_document(document_id):
-    """Отправка уведомления о новом документе"""
+async def напомнить_о_сроках(context: CallbackContext):
+    """Поставить в очередь дайджесты о приближающихся сроках ознакомления"""
     try:
-        with app.app_context():
-            документ = Документ.query.get(document_id)
-            if not документ:
-                logger.error(f"Документ {document_id} не найден")
-                return
-            
-            # Получаем всех сотрудников отдела
-            сотрудники = Сотрудник.query.filter_by(
-                отдел_id=документ.отдел_id,
-                статус_регистрации=True
-            ).all()
-            
-            bot = get_bot()
-            if not bot:
-                logger.error("Бот не инициализирован")
-                return
-            
-            for сотрудник in сотрудники:
-                if сотрудник.telegram_id:
-                    try:
-                        await bot.bot.send_message(
-                            chat_id=сотрудник.telegram_id,
-                            text=(
-                                f"📄 Опубликован новый документ!\n\n"
-                                f"Название: {документ.название}\n"
-                                f"Тип: {документ.тип_документа}\n"
-                                f"Срок ознакомления: {документ.срок_ознакомления.strftime('%d.%m.%Y')}\n\n"
-                                f"Пожалуйста, ознакомьтесь с документом в системе и подтвердите ознакомление, отсканировав QR-код."
-                            )
-                        )
-                        logger.info(f"Уведомление отправлено пользователю {сотрудник.id}")
-                    except Exception as e:
-                        logger.error(f"Ошибка отправки уведомления пользователю {сотрудник.id}: {str(e)}")
+        сегодня = datetime.now(ZoneInfo(Config.REMINDER_TIMEZONE)).date()
+        сотрудников, документов = await выполнить(
+            reminders.поставить_напоминания, Config.REMINDER_DAYS, сегодня
+        )
+        logger.info(f"Напоминания о сроках: сотрудников {сотрудников}, документов {документов}")
     except Exception as e:
-        logger.error(f"Ошибка в notify_new_document: {str(e)}")
+        logger.error(f"Ошибка при постановке напоминаний: {str(e)}")
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать статистику по документам"""
     try:
-        with app.app_context():
-            сотрудник = Сотрудник.query.filter_by(telegram_id=update.effective_user.id).first()
-            if not сотрудник or not сотрудник.статус_регистрации:
-                await update.message.reply_text("Пожалуйста, сначала завершите регистрацию.")
-                return
-
-            # Получаем все документы отдела
-            документы = Документ.query.filter_by(отдел_id=сотрудник.отдел_id).all()
-            
-            total_docs = len(документы)
-            if total_docs == 0:
-                await update.message.reply_text("В вашем отделе пока нет документов для ознакомления.")
-                return
+        сотрудник = await выполнить(repository.сотрудник_по_telegram, update.effective_user.id)
+        if not сотрудник or not сотрудник.статус_регистрации:
+            await update.message.reply_text("Пожалуйста, сначала завершите регистрацию.")
+            return
 
-            # Подсчитываем статистику
-            read_docs = sum(1 for док in документы if any(
-                прочтение.сотрудник_id == сотрудник.id for прочтение in док.прочтения
-            ))
-            
-            # Формируем сообщение
-            message = f"📊 Ваша статистика:\n\n"
-            message += f"Всего документов: {total_docs}\n"
-            message += f"Прочитано: {read_docs}\n"
-            message += f"Осталось прочитать: {total_docs - read_docs}\n"
-            message += f"Процент выполнения: {int(read_docs/total_docs*100)}%"
+        total_docs, read_docs = await выполнить(repository.статистика_сотрудника, сотрудник)
+        if total_docs == 0:
+            await update.message.reply_text("В вашем отделе пока нет документов для ознакомления.")
+            return
+        
+        # Формируем сообщение
+        message = f"📊 Ваша статистика:\n\n"
+        message += f"Всего документов: {total_docs}\n"
+        message += f"Прочитано: {read_docs}\n"
+        message += f"Осталось прочитать: {total_docs - read_docs}\n"
+        message += f"Процент выполнения: {int(read_docs/total_docs*100)}%"
 
-            await update.message.reply_text(message)
+        await update.message.reply_text(message)
 
     except Exception as e:
         logger.error(f"Ошибка в команде stats: {str(e)}")
         await update.message.reply_text("Произошла ошибка при получении статистики.")
 
+async def непрочитанные_сотрудника(context, telegram_id):
+    """Список непрочитанных из кэша; None, если сотрудник не зарегистрирован"""
+    cache = context.bot_data['unread_cache']
+    документы = cache.get(telegram_id)
+    if документы is None:
+        сотрудник = await выполнить(repository.сотрудник_по_telegram, telegram_id)
+        if not сотрудник or not сотрудник.статус_регистрации:
+            return None
+        документы = await выполнить(repository.непрочитанные_документы, сотрудник)
+        cache.put(telegram_id, документы)
+    return документы
+
+def страница_непрочитанных(документы, page):
+    """Текст и кнопки листания одной страницы /unread"""
+    per_page = Config.UNREAD_PAGE_SIZE
+    pages = (len(документы) + per_page - 1) // per_page
+    page = max(0, min(page, pages - 1))
+    start = page * per_page
+
+    message = f"📝 Непрочитанные документы ({len(документы)}):\n\n"
+    for i, (_, название, тип, срок) in enumerate(документы[start:start + per_page], start + 1):
+        message += f"{i}. {название}\n"
+        message += f"   Тип: {тип}\n"
+        message += f"   Срок: {срок.strftime('%d.%m.%Y')}\n\n"
+
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"unread:{page - 1}"))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton("Далее ▶️", callback_data=f"unread:{page + 1}"))
+    if pages > 1:
+        message += f"Страница {page + 1} из {pages}"
+    return message, InlineKeyboardMarkup([buttons]) if buttons else None
+
 async def unread_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать список непрочитанных документов"""
     try:
-        with app.app_context():
-            сотрудник = Сотрудник.query.filter_by(telegram_id=update.effective_user.id).first()
-            if not сотрудник or not сотрудник.статус_регистрации:
-                await update.message.reply_text("Пожалуйста, сначала завершите регистрацию.")
-                return
-
-            # Получаем все документы отдела
-            все_документы = Документ.query.filter_by(отдел_id=сотрудник.отдел_id).all()
-            
-            # Фильтруем непрочитанные
-            непрочитанные = [
-                док for док in все_документы 
-                if not any(прочтение.сотрудник_id == сотрудник.id for прочтение in док.прочтения)
-            ]
-
-            if not непрочитанные:
-                await update.message.reply_text("У вас нет непрочитанных документов! 🎉")
-                return
+        непрочитанные = await непрочитанные_сотрудника(context, update.effective_user.id)
+        if непрочитанные is None:
+            await update.message.reply_text("Пожалуйста, сначала завершите регистрацию.")
+            return
 
-            message = "📝 Непрочитанные документы:\n\n"
-            for i, док in enumerate(непрочитанные, 1):
-                срок = док.срок_ознакомления.strftime('%d.%m.%Y')
-                message += f"{i}. {док.название}\n"
-                message += f"   Тип: {док.тип_документа}\n"
-                message += f"   Срок: {срок}\n\n"
+        if not непрочитанные:
+            await update.message.reply_text("У вас нет непрочитанных документов! 🎉")
+            return
 
-            await update.message.reply_text(message)
+        message, reply_markup = страница_непрочитанных(непрочитанные, 0)
+        await update.message.reply_text(message, reply_markup=reply_markup)
 
     except Exception as e:
         logger.error(f"Ошибка в команде unread: {str(e)}")
         await update.message.reply_text("Произошла ошибка при получении списка непрочитанных документов.")
 
+async def unread_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листание списка непрочитанных документов"""
+    query = update.callback_query
+    try:
+        await query.answer()
+        непрочитанные = await непрочитанные_сотрудника(context, query.from_user.id)
+        if not непрочитанные:
+            await query.edit_message_text("У вас нет непрочитанных документов! 🎉")
+            return
+
+        page = int(query.data.split(':')[1])
+        message, reply_markup = страница_непрочитанных(непрочитанные, page)
+        await query.edit_message_text(message, reply_markup=reply_markup)
+
+    except Exception as e:
+        logger.error(f"Ошибка при листании непрочитанных: {str(e)}")
+
+def build_application():
+    """Приложение бота с обработчиками и заданиями"""
+    builder = (
+        Application.builder()
+        .token(Config.TELEGRAM_BOT_TOKEN)
+        .base_url(Config.TELEGRAM_API_URL)
+        .base_file_url(Config.TELEGRAM_FILE_URL)
+        .concurrent_updates(Config.BOT_CONCURRENT_UPDATES)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if Config.BOT_MODE == 'webhook':
+        # Обновления приходят из очереди в базе, а не от Telegram напрямую
+        builder = builder.updater(None)
+    application = builder.build()
+    
+    # Обработчик регистрации; шаг хранится в базе, поэтому диалог может
+    # продолжить любой процесс бота
+    # Каждый обработчик обёрнут metrics.обработчик: время и SQL-запросы по обработчикам
+    замер = metrics.обработчик
+    регистрация = Диалог(
+        'регистрация',
+        entry_points={'start': замер(start)},
+        states={
+            ТАБЕЛЬНЫЙ_НОМЕР: замер(register_employee_number),
+            ПОДРАЗДЕЛЕНИЕ: замер(register_department),
+            ТЕЛЕФОН: замер(register_phone),
+        },
+        fallbacks={'cancel': замер(cancel)}
+    )
+    
+    # Регистрация обработчиков
+    application.add_handlers(регистрация.handlers())
+    application.add_handler(CommandHandler("help", замер(help_command)))
+    application.add_handler(MessageHandler(filters.PHOTO, замер(process_qr)))
+    application.add_handler(CommandHandler('stats', замер(stats_command)))
+    application.add_handler(CommandHandler('unread', замер(unread_command)))
+    application.add_handler(CallbackQueryHandler(замер(unread_page), pattern=r'^unread:\d+$'))
+    
+    # Напоминания о сроках: ежедневно и вскоре после запуска, если бот был остановлен
+    # во время плановой рассылки (уже отправленные напоминания не повторяются)
+    часы, минуты = map(int, Config.REMINDER_TIME.split(':'))
+    application.job_queue.run_daily(
+        напомнить_о_сроках, time(часы, минуты, tzinfo=ZoneInfo(Config.REMINDER_TIMEZONE)),
+        name='напоминания'
+    )
+    application.job_queue.run_once(напомнить_о_сроках, 60, name='напоминания_при_запуске')
+    return application
+
+async def run_webhook_worker(application):
+    """Обработчик очереди обновлений; таких процессов может быть несколько"""
+    queue = UpdateQueue(application)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, queue.stop)
+    
+    await application.initialize()
+    await on_startup(application)
+    await application.start()
+    try:
+        await queue.run()
+    finally:
+        await application.stop()
+        await application.shutdown()
+        await on_shutdown(application)
+
+async def set_webhook(application):
+    """Зарегистрировать webhook в Telegram"""
+    async with application.bot:
+        await application.bot.set_webhook(
+            Config.TELEGRAM_WEBHOOK_URL,
+            secret_token=Config.TELEGRAM_WEBHOOK_SECRET,
+            allowed_updates=ALLOWED_UPDATES,
+            max_connections=Config.BOT_CONCURRENT_UPDATES
+        )
+    logger.info(f"Webhook установлен: {Config.TELEGRAM_WEBHOOK_URL}")
+
+async def delete_webhook(application):
+    """Отключить webhook, чтобы вернуться к режиму polling"""
+    async with application.bot:
+        await application.bot.delete_webhook()
+    logger.info("Webhook удалён")
+
 def main():
-    """Запуск бота"""
+    """Запуск бота.
+
+    python bot.py                 - обработка обновлений в режиме BOT_MODE
+    python bot.py set-webhook     - зарегистрировать webhook в Telegram
+    python bot.py delete-webhook  - отключить webhook
+    """
     try:
         logger.info("Запуск бота...")
         
@@ -414,34 +492,26 @@ def main():
             logger.error("Токен бота не установлен в конфигурации")
             return
         
-        # Проверяем подключение к базе данных
-        if not check_database_connection():
-            logger.error("Нет подключения к базе данных")
-            return
-            
         global application
-        application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
+        application = build_application()
         
-        # Обработчик регистрации
-        conv_handler = ConversationHandler(
-            entry_points=[CommandHandler('start', start)],
-            states={
-                ТАБЕЛЬНЫЙ_НОМЕР: [MessageHandler(filters.TEXT & ~filters.COMMAND, register_employee_number)],
-                ПОДРАЗДЕЛЕНИЕ: [MessageHandler(filters.TEXT & ~filters.COMMAND, register_department)],
-                ТЕЛЕФОН: [MessageHandler(filters.TEXT & ~filters.COMMAND, register_phone)],
-            },
-            fallbacks=[CommandHandler('cancel', cancel)]
-        )
-        
-        # Регистрация обработчиков
-        application.add_handler(conv_handler)
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(MessageHandler(filters.PHOTO, process_qr))
-        application.add_handler(CommandHandler('stats', stats_command))
-        application.add_handler(CommandHandler('unread', unread_command))
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+        if command == 'set-webhook':
+            if not Config.TELEGRAM_WEBHOOK_URL or not Config.TELEGRAM_WEBHOOK_SECRET:
+                logger.error("Для webhook нужны TELEGRAM_WEBHOOK_URL и TELEGRAM_WEBHOOK_SECRET")
+                return
+            asyncio.run(set_webhook(application))
+            return
+        if command == 'delete-webhook':
+            asyncio.run(delete_webhook(application))
+            return
         
-        logger.info("Бот успешно настроен и запускается...")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        if Config.BOT_MODE == 'webhook':
+            logger.info("Бот успешно настроен, обработка очереди обновлений webhook...")
+            asyncio.run(run_webhook_worker(application))
+        else:
+            logger.info("Бот успешно настроен и запускается...")
+            application.run_polling(allowed_updates=ALLOWED_UPDATES)
     except Exception as e:
         error_text = f"Ошибка при запуске бота: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_text)
@@ -0,0 +1,180 @@
+"""Загрузка больших файлов по частям с докачкой.
+
+Клиент создаёт загрузку, отправляет части строго подряд, указывая смещение,
+и завершает её. Части пишутся прямо во временный файл UPLOAD_FOLDER/tmp,
+поэтому память воркера не зависит от размера файла. После обрыва клиент
+запрашивает подтверждённое смещение и продолжает с него; данные после
+этого смещения, записанные до обрыва, перезаписываются.
+
+SHA-256 считается по ходу записи. Состояние хеша живёт в памяти воркера:
+если очередную часть принял другой воркер, хеш один раз досчитывается
+по файлу при завершении.
+"""
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from extensions import db
+from models import Загрузка
+from storage import CHUNK_SIZE, поместить_в_хранилище, удалить_потерянные_объекты
+
+# Сколько незавершённых хешей держать в памяти воркера
+MAX_HASHES = 256
+
+# id загрузки -> (смещение, объект sha256)
+_хеши = OrderedDict()
+
+
+class ОшибкаЗагрузки(Exception):
+    """Ошибка загрузки по частям; status - HTTP-код ответа"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def путь_загрузки(загрузка_id):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'tmp', f'upload-{загрузка_id}')
+
+
+def _запомнить_хеш(загрузка_id, смещение, sha):
+    _хеши[загрузка_id] = (смещение, sha)
+    _хеши.move_to_end(загрузка_id)
+    while len(_хеши) > MAX_HASHES:
+        _хеши.popitem(last=False)
+
+
+def начать_загрузку(сотрудник_id, имя_файла, размер):
+    """Создать загрузку и пустой временный файл"""
+    имя_файла = os.path.basename(имя_файла or '')
+    if not имя_файла:
+        raise ОшибкаЗагрузки('Не указано имя файла')
+    try:
+        размер = int(размер)
+    except (TypeError, ValueError):
+        raise ОшибкаЗагрузки('Не указан размер файла')
+    if размер <= 0:
+        raise ОшибкаЗагрузки('Пустой файл')
+    if размер > current_app.config['MAX_UPLOAD_SIZE']:
+        raise ОшибкаЗагрузки('Файл больше допустимого размера', status=413)
+
+    загрузка = Загрузка(id=uuid.uuid4().hex, сотрудник_id=сотрудник_id,
+                        имя_файла=имя_файла, размер=размер, получено=0)
+    path = путь_загрузки(загрузка.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    db.session.add(загрузка)
+    _запомнить_хеш(загрузка.id, 0, hashlib.sha256())
+    return загрузка
+
+
+def получить_загрузку(загрузка_id, сотрудник_id, блокировать=False):
+    """Загрузка сотрудника; с блокировать=True строка блокируется до конца транзакции"""
+    query = Загрузка.query.filter_by(id=загрузка_id, сотрудник_id=сотрудник_id)
+    if блокировать:
+        query = query.with_for_update()
+    загрузка = query.first()
+    if загрузка is None:
+        raise ОшибкаЗагрузки('Загрузка не найдена', status=404)
+    return загрузка
+
+
+def дописать(загрузка, смещение, stream):
+    """Записать часть, начинающуюся со смещения; возвращает новое смещение.
+
+    Строка загрузки должна быть заблокирована (получить_загрузку с блокировать=True),
+    чтобы две части одной загрузки не писались одновременно.
+    """
+    if смещение != загрузка.получено:
+        raise ОшибкаЗагрузки('Неверное смещение части', status=409, offset=загрузка.получено)
+
+    сохранённый = _хеши.pop(загрузка.id, None)
+    sha = сохранённый[1] if сохранённый and сохранённый[0] == смещение else None
+
+    позиция = смещение
+    with open(путь_загрузки(загрузка.id), 'r+b') as f:
+        # Хвост от оборванной части не был подтверждён - пишем поверх
+        f.truncate(смещение)
+        f.seek(смещение)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            позиция += len(chunk)
+            if позиция > загрузка.размер:
+                raise ОшибкаЗагрузки('Получено больше заявленного размера', status=413,
+                                     offset=загрузка.получено)
+            if sha is not None:
+                sha.update(chunk)
+            f.write(chunk)
+        f.flush()
+        # Смещение подтверждается клиенту только для данных, записанных на диск
+        os.fsync(f.fileno())
+
+    загрузка.получено = позиция
+    загрузка.дата_изменения = datetime.utcnow()
+    if sha is not None:
+        _запомнить_хеш(загрузка.id, позиция, sha)
+    return позиция
+
+
+def _sha256_файла(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha
+
+
+def завершить(загрузка, ожидаемый_sha256=None):
+    """Перенести полностью полученный файл в хранилище; возвращает Файл.
+
+    Строку загрузки нужно заблокировать; она удаляется в той же транзакции,
+    в которой создаётся документ.
+    """
+    if загрузка.получено != загрузка.размер:
+        raise ОшибкаЗагрузки('Файл получен не полностью', status=409, offset=загрузка.получено)
+
+    path = путь_загрузки(загрузка.id)
+    сохранённый = _хеши.pop(загрузка.id, None)
+    if сохранённый and сохранённый[0] == загрузка.размер:
+        sha256 = сохранённый[1].hexdigest()
+    else:
+        sha256 = _sha256_файла(path).hexdigest()
+
+    if ожидаемый_sha256 and ожидаемый_sha256.lower() != sha256:
+        raise ОшибкаЗагрузки('Контрольная сумма не совпадает', status=422)
+
+    файл = поместить_в_хранилище(path, sha256, загрузка.размер)
+    db.session.delete(загрузка)
+    return файл
+
+
+def отменить(загрузка):
+    _хеши.pop(загрузка.id, None)
+    db.session.delete(загрузка)
+    path = путь_загрузки(загрузка.id)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+@click.command('clean-uploads')
+@with_appcontext
+def clean_uploads_command():
+    """Удалить незавершённые загрузки и потерянные файлы хранилища старше UPLOAD_EXPIRE_HOURS"""
+    граница = datetime.utcnow() - timedelta(hours=current_app.config['UPLOAD_EXPIRE_HOURS'])
+    загрузки = Загрузка.query.filter(Загрузка.дата_изменения < граница).all()
+    for загрузка in загрузки:
+        отменить(загрузка)
+    db.session.commit()
+    click.echo(f'Удалено незавершённых загрузок: {len(загрузки)}')
+    потеряно = удалить_потерянные_объекты(current_app.config['UPLOAD_EXPIRE_HOURS'] * 3600)
+    click.echo(f'Удалено файлов хранилища без ссылок: {потеряно}')
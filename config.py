@@ -14,10 +14,103 @@ class Config:
     
     # Настройки загрузки файлов
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # Максимальный размер файла (16MB)
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # Максимальный размер запроса (16MB); большие файлы - по частям
+    MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 2 * 1024 ** 3))  # Предел файла при загрузке по частям (2GB)
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Рекомендуемый клиенту размер части
+    UPLOAD_EXPIRE_HOURS = 24  # Незавершённые загрузки старше удаляет flask clean-uploads
+    
+    # Отдача файлов веб-сервером: '' - через приложение, 'nginx' - X-Accel-Redirect,
+    # 'sendfile' - X-Sendfile (Apache mod_xsendfile, lighttpd)
+    DOWNLOAD_OFFLOAD = os.getenv('DOWNLOAD_OFFLOAD', '')
+    DOWNLOAD_ACCEL_PREFIX = os.getenv('DOWNLOAD_ACCEL_PREFIX', '/protected_uploads/')  # internal location nginx
+    
+    # Настройки постраничного вывода
+    PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))  # Строк на странице по умолчанию
+    MAX_PAGE_SIZE = 200  # Максимально допустимый размер страницы
+    
+    # Кэш справочников в процессе (см. reference_cache.py)
+    REFERENCE_CHECK_INTERVAL = float(os.getenv('REFERENCE_CHECK_INTERVAL', 5))  # Как часто сверять версии с базой, секунд
+    REFERENCE_CACHE_SIZE = 10000  # Записей в кэше (в основном - вошедшие пользователи)
+    
+    # Настройки QR-кодов
+    QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', 2048))  # Изображений в LRU-кэше процесса
+    QR_CACHE_MAX_AGE = 365 * 24 * 3600  # Срок кэширования в браузере и nginx, секунд
+    QR_SHEET_WORKERS = int(os.getenv('QR_SHEET_WORKERS', 0))  # Процессов для листов QR (0 - по числу CPU)
+    QR_SHEET_FONT = os.getenv('QR_SHEET_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+    
+    # Превью документов (см. previews.py)
+    PREVIEW_CACHE_DIR = os.getenv('PREVIEW_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'previews'))
+    PREVIEW_CACHE_SIZE = int(os.getenv('PREVIEW_CACHE_SIZE', 512 * 1024 * 1024))  # Предел кэша превью на диске, байт
+    PREVIEW_WIDTH = 160  # Ширина превью, пикс. (в списке показывается вдвое меньше для чёткости на HiDPI)
+    PREVIEW_MAX_AGE = 365 * 24 * 3600  # Срок кэширования превью в браузере, секунд
+    PREVIEW_SNIPPET_CHARS = 300  # Длина текстового фрагмента в списке документов
+    
+    # Извлечение текста для полнотекстового поиска (flask extract-text)
+    EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', 0))  # Процессов извлечения (0 - по числу CPU)
+    EXTRACT_BATCH_SIZE = 20  # Файлов, забираемых за раз
+    EXTRACT_TIMEOUT = int(os.getenv('EXTRACT_TIMEOUT', 60))  # Предел разбора одного файла, секунд
+    EXTRACT_POLL_INTERVAL = int(os.getenv('EXTRACT_POLL_INTERVAL', 10))  # Пауза, когда новых файлов нет, секунд
+    
+    # Массовый импорт сотрудников (flask import-employees, /import_employees)
+    IMPORT_HASH_WORKERS = int(os.getenv('IMPORT_HASH_WORKERS', 0))  # Процессов хеширования паролей (0 - по числу CPU)
+    IMPORT_FOLDER = os.path.join(UPLOAD_FOLDER, 'imports')  # Файлы и отчёты импорта из веб-интерфейса
     
     # Настройки Telegram бота
     TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
+    TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')  # Для тестов - адрес поддельного API
+    TELEGRAM_FILE_URL = os.getenv('TELEGRAM_FILE_URL', 'https://api.telegram.org/file/bot')
+    
+    # Режим получения обновлений: 'polling' - один процесс опрашивает Telegram,
+    # 'webhook' - Telegram присылает обновления в веб-приложение, процессы бота разбирают очередь
+    BOT_MODE = os.getenv('BOT_MODE', 'polling')
+    TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')  # https://<домен>/telegram/webhook
+    TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')  # Символы A-Z, a-z, 0-9, _ и -
+    
+    BOT_CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES', 32))  # Обновлений, обрабатываемых одновременно
+    
+    # Напоминания о сроке ознакомления
+    REMINDER_DAYS = int(os.getenv('REMINDER_DAYS', 3))  # За сколько дней до срока напоминать
+    REMINDER_TIME = os.getenv('REMINDER_TIME', '09:00')  # Время ежедневной рассылки
+    REMINDER_TIMEZONE = os.getenv('REMINDER_TIMEZONE', 'Europe/Moscow')
+    
+    UNREAD_PAGE_SIZE = 10  # Документов на странице /unread
+    UNREAD_CACHE_TTL = int(os.getenv('UNREAD_CACHE_TTL', 60))  # Время жизни списка непрочитанных в кэше, секунд
+    UNREAD_CACHE_SIZE = 10000  # Сотрудников в кэше непрочитанных
+    
+    # Пул асинхронных соединений бота с базой данных
+    BOT_DB_POOL_SIZE = int(os.getenv('BOT_DB_POOL_SIZE', 10))  # Постоянных соединений
+    BOT_DB_MAX_OVERFLOW = int(os.getenv('BOT_DB_MAX_OVERFLOW', 10))  # Дополнительных соединений при пиках
+    BOT_DB_POOL_TIMEOUT = 10  # Ожидание свободного соединения, секунд
+    BOT_DB_POOL_RECYCLE = 1800  # Пересоздание соединений старше, секунд
+    
+    # Настройки распознавания QR-кодов в боте
+    QR_DECODE_WORKERS = int(os.getenv('QR_DECODE_WORKERS', 0))  # Процессов распознавания (0 - по числу CPU)
+    QR_DECODE_MAX_PENDING = int(os.getenv('QR_DECODE_MAX_PENDING', 64))  # Предел одновременных распознаваний
+    QR_DECODE_FIRST_SIDE = 800  # Сначала пробуем наименьший размер фото с такой стороной, пикс.
     
     # Поддерживаемые типы файлов
     ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'xls', 'xlsx', 'txt'}
+    
+    # Настройки рассылки уведомлений
+    NOTIFY_RATE = float(os.getenv('NOTIFY_RATE', 25))  # Сообщений в секунду на всего бота (рассылает один процесс)
+    NOTIFY_PER_CHAT_RATE = float(os.getenv('NOTIFY_PER_CHAT_RATE', 1))  # Сообщений в секунду в один чат
+    NOTIFY_BATCH_SIZE = 100  # Сколько уведомлений забирать из очереди за раз
+    NOTIFY_MAX_ATTEMPTS = 5  # Попыток отправки до пометки об ошибке
+    
+    # Метрики Prometheus и журнал медленных запросов (см. metrics.py)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') != '0'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # Если задан, /metrics требует заголовок Authorization: Bearer <токен>, иначе доступен только с localhost
+    BOT_METRICS_PORT = int(os.getenv('BOT_METRICS_PORT', 0))  # Порт /metrics процесса бота (0 - не открывать)
+    SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 500))  # Запросы дольше пишутся в журнал с планом (0 - не писать)
+    SLOW_QUERY_EXPLAIN_INTERVAL = 300  # План одного и того же запроса пишется не чаще, секунд
+    
+    # Резервное копирование (scripts/backup.py)
+    BACKUP_DIR = os.getenv('BACKUP_DIR', '/var/backups/docmanagement')
+    BACKUP_JOBS = int(os.getenv('BACKUP_JOBS', 4))  # Потоков pg_dump/pg_restore и чтения файлов
+    BACKUP_KEEP_DAYS = int(os.getenv('BACKUP_KEEP_DAYS', 7))  # Срок хранения снимков, дней
+    
+    # Секции журнала прочтений и архив документов (см. read_partitions.py, archive.py)
+    READ_PARTITIONS_AHEAD = 3  # На сколько месяцев вперёд создаются секции
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 3 * 365))  # Документы старше уходят в архив
+    ARCHIVE_FOLDER = os.getenv('ARCHIVE_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+    ARCHIVE_BATCH_SIZE = 500  # Документов в одном пакете архива
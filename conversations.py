@@ -0,0 +1,109 @@
+"""Диалоги бота с состоянием в базе данных.
+
+ConversationHandler хранит шаг диалога в памяти процесса, поэтому
+продолжить регистрацию может только процесс, который её начал. Диалог
+хранит шаг и user_data пользователя в таблице состояния_диалогов: любой
+процесс бота загружает их перед обработкой сообщения и сохраняет после.
+Обработчики те же, что и для ConversationHandler: они возвращают
+следующее состояние, ConversationHandler.END завершает диалог, None
+оставляет текущий шаг.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from telegram.ext import CommandHandler, ConversationHandler, MessageHandler, filters
+from async_db import выполнить
+from models import СостояниеДиалога
+
+# Незавершённый диалог забывается через сутки
+TIMEOUT = timedelta(hours=24)
+
+
+def загрузить_состояние(session, диалог, telegram_id):
+    """(состояние, данные); (None, {}), если диалога нет или он устарел"""
+    строка = session.execute(
+        select(
+            СостояниеДиалога.состояние, СостояниеДиалога.данные, СостояниеДиалога.дата_изменения
+        ).where(
+            СостояниеДиалога.диалог == диалог,
+            СостояниеДиалога.telegram_id == telegram_id
+        )
+    ).first()
+    if строка is None or строка.дата_изменения < datetime.utcnow() - TIMEOUT:
+        return None, {}
+    return строка.состояние, строка.данные
+
+
+def сохранить_состояние(session, диалог, telegram_id, состояние, данные):
+    """Записать шаг диалога; END удаляет состояние"""
+    if состояние == ConversationHandler.END:
+        session.execute(delete(СостояниеДиалога).where(
+            СостояниеДиалога.диалог == диалог,
+            СостояниеДиалога.telegram_id == telegram_id
+        ))
+        return
+    значения = {'состояние': состояние, 'данные': данные, 'дата_изменения': datetime.utcnow()}
+    session.execute(
+        insert(СостояниеДиалога).values(
+            диалог=диалог, telegram_id=telegram_id, **значения
+        ).on_conflict_do_update(
+            index_elements=['диалог', 'telegram_id'], set_=значения
+        )
+    )
+
+
+class Диалог:
+    """Замена ConversationHandler, шаг которой хранится в базе.
+
+    entry_points и fallbacks - {команда: обработчик}, states - {состояние:
+    обработчик текстового сообщения}. Как и у ConversationHandler без
+    allow_reentry, точки входа не срабатывают посреди начатого диалога,
+    а fallbacks - вне диалога. user_data должны сериализоваться в JSON.
+    """
+
+    def __init__(self, name, entry_points, states, fallbacks):
+        self.name = name
+        self.entry_points = entry_points
+        self.states = states
+        self.fallbacks = fallbacks
+
+    async def _вызвать(self, callback, update, context, состояние, данные):
+        context.user_data.update(данные)
+        новое = await callback(update, context)
+        if новое is None:
+            новое = состояние
+        if новое is not None:
+            await выполнить(
+                сохранить_состояние, self.name, update.effective_user.id, новое, dict(context.user_data)
+            )
+        return новое
+
+    def _точка_входа(self, callback):
+        async def handler(update, context):
+            состояние, данные = await выполнить(загрузить_состояние, self.name, update.effective_user.id)
+            if состояние is None:
+                return await self._вызвать(callback, update, context, None, данные)
+        return handler
+
+    def _запасной(self, callback):
+        async def handler(update, context):
+            состояние, данные = await выполнить(загрузить_состояние, self.name, update.effective_user.id)
+            if состояние is not None:
+                return await self._вызвать(callback, update, context, состояние, данные)
+        return handler
+
+    async def _шаг(self, update, context):
+        состояние, данные = await выполнить(загрузить_состояние, self.name, update.effective_user.id)
+        callback = self.states.get(состояние)
+        if callback is not None:
+            return await self._вызвать(callback, update, context, состояние, данные)
+
+    def handlers(self):
+        """Обработчики для application.add_handler, в порядке проверки"""
+        return (
+            [CommandHandler(command, self._точка_входа(callback))
+             for command, callback in self.entry_points.items()]
+            + [CommandHandler(command, self._запасной(callback))
+               for command, callback in self.fallbacks.items()]
+            + [MessageHandler(filters.TEXT & ~filters.COMMAND, self._шаг)]
+        )
@@ -0,0 +1,197 @@
+"""Денормализованные счётчики прогресса ознакомления.
+
+Отдел.число_сотрудников - количество сотрудников отдела.
+ДокументОтдела.число_прочтений - количество прочтений документа сотрудниками отдела-адресата.
+Сотрудник.число_непрочитанных - количество непрочитанных документов, адресованных его отделу.
+
+Функции учесть_* вызываются в той же транзакции, что и изменение данных,
+и меняют счётчики атомарными UPDATE. По умолчанию используется db.session
+веб-приложения; бот передаёт свою сессию в аргументе session. Команда `flask rebuild-counters`
+сверяет счётчики с исходными таблицами и исправляет расхождения.
+"""
+import click
+from flask.cli import with_appcontext
+from extensions import db
+from models import Сотрудник, ДокументОтдела, ПрочтениеДокумента, Отдел
+from queries import численность_отделов_subquery, ознакомления_по_отделам_subquery
+
+
+def _прибавить(model, column, delta, *criteria, session=None):
+    """Атомарно прибавить delta к счётчику у строк, подходящих под условия"""
+    return (session or db.session).execute(
+        db.update(model).where(*criteria).values({column: column + delta}),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+
+
+def _прочитанные_документы(сотрудник_id):
+    return db.select(ПрочтениеДокумента.документ_id).where(
+        ПрочтениеДокумента.сотрудник_id == сотрудник_id
+    )
+
+
+def непрочитанных_у(сотрудник_id, отдел_id, session=None):
+    """Точное количество непрочитанных документов сотрудника в отделе"""
+    return (session or db.session).scalar(
+        db.select(db.func.count(ДокументОтдела.id)).where(
+            ДокументОтдела.отдел_id == отдел_id,
+            ~ДокументОтдела.документ_id.in_(_прочитанные_документы(сотрудник_id))
+        )
+    )
+
+
+def учесть_прочтение(сотрудник, документ, session=None):
+    """Новое подтверждение ознакомления"""
+    учтено = _прибавить(ДокументОтдела, ДокументОтдела.число_прочтений, 1,
+                        ДокументОтдела.документ_id == документ.id,
+                        ДокументОтдела.отдел_id == сотрудник.отдел_id,
+                        session=session)
+    if учтено:
+        _прибавить(Сотрудник, Сотрудник.число_непрочитанных, -1, Сотрудник.id == сотрудник.id,
+                   session=session)
+
+
+def _отделы_адресаты(документ_id):
+    return db.session.query(ДокументОтдела.отдел_id).filter(
+        ДокументОтдела.документ_id == документ_id
+    )
+
+
+def учесть_новый_документ(документ):
+    """Новый документ: у сотрудников отделов-адресатов на один непрочитанный больше.
+
+    Вызывать после flush адресатов документа.
+    """
+    _прибавить(Сотрудник, Сотрудник.число_непрочитанных, 1,
+               Сотрудник.отдел_id.in_(_отделы_адресаты(документ.id)))
+
+
+def учесть_снятие_адресата(документ_id, отдел_id):
+    """Документ больше не адресован отделу; вызывать до удаления прочтений"""
+    прочитавшие = db.session.query(ПрочтениеДокумента.сотрудник_id).filter(
+        ПрочтениеДокумента.документ_id == документ_id
+    )
+    _прибавить(Сотрудник, Сотрудник.число_непрочитанных, -1,
+               Сотрудник.отдел_id == отдел_id,
+               ~Сотрудник.id.in_(прочитавшие))
+
+
+def учесть_удаление_документа(документ):
+    """Удаление документа целиком; вызывать до удаления его прочтений"""
+    прочитавшие = db.session.query(ПрочтениеДокумента.сотрудник_id).filter(
+        ПрочтениеДокумента.документ_id == документ.id
+    )
+    _прибавить(Сотрудник, Сотрудник.число_непрочитанных, -1,
+               Сотрудник.отдел_id.in_(_отделы_адресаты(документ.id)),
+               ~Сотрудник.id.in_(прочитавшие))
+
+
+def учесть_нового_сотрудника(сотрудник):
+    """Новый сотрудник; вызывать после flush, когда известен его id"""
+    _прибавить(Отдел, Отдел.число_сотрудников, 1, Отдел.id == сотрудник.отдел_id)
+    сотрудник.число_непрочитанных = ДокументОтдела.query.filter_by(отдел_id=сотрудник.отдел_id).count()
+
+
+def документов_в_отделах(отдел_ids):
+    """{отдел_id: количество адресованных отделу документов} - начальное число_непрочитанных"""
+    return dict(db.session.execute(
+        db.select(ДокументОтдела.отдел_id, db.func.count(ДокументОтдела.id)).where(
+            ДокументОтдела.отдел_id.in_(отдел_ids)
+        ).group_by(ДокументОтдела.отдел_id)
+    ).all())
+
+
+def учесть_новых_сотрудников(по_отделам):
+    """Массовое добавление сотрудников; по_отделам - {отдел_id: добавлено}"""
+    for отдел_id, добавлено in по_отделам.items():
+        _прибавить(Отдел, Отдел.число_сотрудников, добавлено, Отдел.id == отдел_id)
+
+
+def учесть_перевод(сотрудник, старый_отдел_id, session=None):
+    """Перевод сотрудника в другой отдел; отдел_id уже должен быть новым"""
+    новый_отдел_id = сотрудник.отдел_id
+    if старый_отдел_id == новый_отдел_id:
+        return
+    прочитанные = _прочитанные_документы(сотрудник.id)
+    _прибавить(Отдел, Отдел.число_сотрудников, -1, Отдел.id == старый_отдел_id, session=session)
+    _прибавить(Отдел, Отдел.число_сотрудников, 1, Отдел.id == новый_отдел_id, session=session)
+    _прибавить(ДокументОтдела, ДокументОтдела.число_прочтений, -1,
+               ДокументОтдела.отдел_id == старый_отдел_id,
+               ДокументОтдела.документ_id.in_(прочитанные),
+               session=session)
+    _прибавить(ДокументОтдела, ДокументОтдела.число_прочтений, 1,
+               ДокументОтдела.отдел_id == новый_отдел_id,
+               ДокументОтдела.документ_id.in_(прочитанные),
+               session=session)
+    сотрудник.число_непрочитанных = непрочитанных_у(сотрудник.id, новый_отдел_id, session=session)
+
+
+def пересчитать_счётчики(исправить=True):
+    """Сверка счётчиков с исходными таблицами.
+
+    Возвращает словарь {название счётчика: количество расхождений}.
+    При исправить=True расхождения записываются в базу.
+    """
+    численность = численность_отделов_subquery()
+    ознакомления = ознакомления_по_отделам_subquery()
+    документов_в_отделе = db.session.query(
+        ДокументОтдела.отдел_id.label('отдел_id'),
+        db.func.count(ДокументОтдела.id).label('всего')
+    ).group_by(ДокументОтдела.отдел_id).subquery()
+    прочитано_в_своём_отделе = db.session.query(
+        ПрочтениеДокумента.сотрудник_id.label('сотрудник_id'),
+        db.func.count(ПрочтениеДокумента.id).label('прочитано')
+    ).join(
+        Сотрудник, Сотрудник.id == ПрочтениеДокумента.сотрудник_id
+    ).join(
+        ДокументОтдела,
+        db.and_(
+            ДокументОтдела.документ_id == ПрочтениеДокумента.документ_id,
+            ДокументОтдела.отдел_id == Сотрудник.отдел_id
+        )
+    ).group_by(ПрочтениеДокумента.сотрудник_id).subquery()
+
+    проверки = [
+        ('Отдел.число_сотрудников', Отдел, Отдел.число_сотрудников,
+         db.func.coalesce(численность.c.всего, 0),
+         [(численность, численность.c.отдел_id == Отдел.id)]),
+        ('ДокументОтдела.число_прочтений', ДокументОтдела, ДокументОтдела.число_прочтений,
+         db.func.coalesce(ознакомления.c.прочитали, 0),
+         [(ознакомления, db.and_(
+             ознакомления.c.документ_id == ДокументОтдела.документ_id,
+             ознакомления.c.отдел_id == ДокументОтдела.отдел_id
+         ))]),
+        ('Сотрудник.число_непрочитанных', Сотрудник, Сотрудник.число_непрочитанных,
+         db.func.coalesce(документов_в_отделе.c.всего, 0)
+         - db.func.coalesce(прочитано_в_своём_отделе.c.прочитано, 0),
+         [(документов_в_отделе, документов_в_отделе.c.отдел_id == Сотрудник.отдел_id),
+          (прочитано_в_своём_отделе, прочитано_в_своём_отделе.c.сотрудник_id == Сотрудник.id)]),
+    ]
+
+    результат = {}
+    for название, model, column, actual, joins in проверки:
+        query = db.session.query(model.id, actual)
+        for subquery, onclause in joins:
+            query = query.outerjoin(subquery, onclause)
+        расхождения = query.filter(column != actual).all()
+        результат[название] = len(расхождения)
+        if исправить and расхождения:
+            db.session.bulk_update_mappings(model, [
+                {'id': id, column.key: значение} for id, значение in расхождения
+            ])
+
+    if исправить:
+        db.session.commit()
+    return результат
+
+
+@click.command('rebuild-counters')
+@with_appcontext
+@click.option('--check', is_flag=True, help='Только проверить, не исправляя')
+def rebuild_counters_command(check):
+    """Сверить и пересчитать счётчики прогресса ознакомления"""
+    результат = пересчитать_счётчики(исправить=not check)
+    for название, количество in результат.items():
+        click.echo(f'{название}: расхождений {количество}')
+    if check and any(результат.values()):
+        raise SystemExit(1)
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from sqlalchemy import func, select, text, update
+from config import Config
+from async_db import Session, engine
+from models import Уведомление
+
+logger = logging.getLogger(__name__)
+
+# Пауза между опросами пустой очереди, секунд
+POLL_INTERVAL = 2
+# На сколько забранное уведомление скрывается от других обработчиков
+LEASE = timedelta(minutes=5)
+# Базовая задержка повтора при сетевых ошибках, секунд
+RETRY_BASE_DELAY = 5
+# Сколько корзин отдельных чатов держать в памяти
+MAX_CHAT_BUCKETS = 10000
+# Ключ рекомендательной блокировки ведущего процесса рассылки
+LEADER_LOCK = 5_200_001
+# Как часто остальные процессы пробуют стать ведущим, секунд
+LEADER_RETRY_INTERVAL = 10
+
+
+class TokenBucket:
+    """Ограничитель частоты "корзина токенов" для asyncio"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Приостановить выдачу токенов, например после RetryAfter"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _секунды(retry_after):
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class Dispatcher:
+    """Фоновая рассылка уведомлений из таблицы уведомления.
+
+    Отправка идёт параллельно с общим ограничением частоты и ограничением
+    на каждый чат; результат по каждому получателю записывается в его строку
+    очереди. Ограничители и пауза после RetryAfter живут в памяти процесса,
+    поэтому при нескольких процессах бота (режим webhook) рассылает только
+    ведущий - тот, кто держит рекомендательную блокировку LEADER_LOCK на
+    отдельном соединении. Остальные раз в LEADER_RETRY_INTERVAL секунд
+    пробуют её взять и заменяют ведущего, если его процесс остановился.
+    """
+
+    def __init__(self, bot, rate=None, per_chat_rate=None, batch_size=None, max_attempts=None):
+        self.bot = bot
+        self.global_bucket = TokenBucket(rate or Config.NOTIFY_RATE)
+        self.per_chat_rate = per_chat_rate or Config.NOTIFY_PER_CHAT_RATE
+        self.chat_buckets = {}
+        self.batch_size = batch_size or Config.NOTIFY_BATCH_SIZE
+        self.max_attempts = max_attempts or Config.NOTIFY_MAX_ATTEMPTS
+        self._stopping = asyncio.Event()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+                self.chat_buckets.clear()
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+
+    async def claim(self):
+        """Забрать пачку готовых к отправке уведомлений"""
+        async with Session() as session, session.begin():
+            now = datetime.utcnow()
+            batch = (await session.execute(
+                select(
+                    Уведомление.id, Уведомление.chat_id, Уведомление.текст, Уведомление.попыток
+                ).where(
+                    Уведомление.статус == 'ожидает',
+                    Уведомление.следующая_попытка <= now
+                ).order_by(
+                    Уведомление.следующая_попытка, Уведомление.id
+                ).limit(self.batch_size).with_for_update(skip_locked=True)
+            )).all()
+            if batch:
+                await session.execute(
+                    update(Уведомление).where(
+                        Уведомление.id.in_([row.id for row in batch])
+                    ).values(следующая_попытка=now + LEASE)
+                )
+            return [tuple(row) for row in batch]
+
+    async def _send(self, item):
+        id, chat_id, текст, попыток = item
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+        попыток += 1
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=текст)
+            return {'id': id, 'статус': 'отправлено', 'попыток': попыток,
+                    'дата_отправки': datetime.utcnow(), 'ошибка': None}
+        except RetryAfter as e:
+            delay = _секунды(e.retry_after)
+            self.global_bucket.pause(delay)
+            logger.warning(f"Превышен лимит Telegram, пауза {delay} с")
+            # Ограничение со стороны Telegram не считается неудачной попыткой
+            return self._retry(id, попыток - 1, delay, str(e))
+        except (Forbidden, BadRequest) as e:
+            # Пользователь заблокировал бота или чат недоступен - повтор не поможет
+            return {'id': id, 'статус': 'ошибка', 'попыток': попыток, 'ошибка': str(e)}
+        except TelegramError as e:
+            if попыток >= self.max_attempts:
+                return {'id': id, 'статус': 'ошибка', 'попыток': попыток, 'ошибка': str(e)}
+            return self._retry(id, попыток, RETRY_BASE_DELAY * 2 ** (попыток - 1), str(e))
+
+    def _failed(self, item, e):
+        """Результат отправки, прерванной непредвиденным исключением"""
+        id, chat_id, текст, попыток = item
+        logger.error(f"Ошибка при отправке уведомления {id}: {str(e)}")
+        попыток += 1
+        if попыток >= self.max_attempts:
+            return {'id': id, 'статус': 'ошибка', 'попыток': попыток, 'ошибка': str(e)}
+        return self._retry(id, попыток, RETRY_BASE_DELAY * 2 ** (попыток - 1), str(e))
+
+    def _retry(self, id, попыток, delay, ошибка):
+        return {'id': id, 'статус': 'ожидает', 'попыток': попыток, 'ошибка': ошибка,
+                'следующая_попытка': datetime.utcnow() + timedelta(seconds=delay)}
+
+    async def record(self, results):
+        """Записать результаты отправки"""
+        async with Session() as session, session.begin():
+            await session.execute(update(Уведомление), results)
+
+    async def run_once(self):
+        """Отправить одну пачку; возвращает количество обработанных уведомлений"""
+        batch = await self.claim()
+        if batch:
+            # Исключение одной отправки не должно отменять запись остальных результатов:
+            # иначе отправленные уведомления остаются забранными и уходят повторно
+            results = await asyncio.gather(*(self._send(item) for item in batch), return_exceptions=True)
+            results = [
+                self._failed(item, result) if isinstance(result, BaseException) else result
+                for item, result in zip(batch, results)
+            ]
+            await self.record(results)
+            отправлено = sum(1 for r in results if r['статус'] == 'отправлено')
+            logger.info(f"Рассылка: отправлено {отправлено} из {len(batch)}")
+        return len(batch)
+
+    async def _ждать(self, seconds):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _рассылать(self, conn):
+        """Разбирать очередь, пока процесс ведущий"""
+        while not self._stopping.is_set():
+            # Блокировка держится, пока живо её соединение; при обрыве ведущим
+            # может стать другой процесс, поэтому исключение прекращает рассылку
+            await conn.execute(text('SELECT 1'))
+            try:
+                if await self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Ошибка в рассылке уведомлений: {str(e)}")
+            await self._ждать(POLL_INTERVAL)
+
+    async def run(self):
+        logger.info("Запуск рассылки уведомлений")
+        while not self._stopping.is_set():
+            try:
+                async with engine.connect() as conn:
+                    # Без открытой транзакции: соединение живёт столько же, сколько процесс
+                    conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+                    if await conn.scalar(select(func.pg_try_advisory_lock(LEADER_LOCK))):
+                        logger.info("Процесс ведёт рассылку уведомлений")
+                        try:
+                            await self._рассылать(conn)
+                        finally:
+                            await conn.scalar(select(func.pg_advisory_unlock(LEADER_LOCK)))
+            except Exception as e:
+                logger.error(f"Ошибка в рассылке уведомлений: {str(e)}")
+            await self._ждать(LEADER_RETRY_INTERVAL)
+
+    def stop(self):
+        self._stopping.set()
@@ -0,0 +1,72 @@
+"""Отдача загруженных файлов с проверкой прав в приложении.
+
+Право на скачивание проверяет Flask, а передачу файла можно поручить
+веб-серверу (DOWNLOAD_OFFLOAD): nginx получает X-Accel-Redirect на internal
+location, Apache/lighttpd - X-Sendfile. Воркер при этом не читает файл.
+
+ETag файла из хранилища - его SHA-256, поэтому он одинаков в обоих режимах
+и не меняется при копировании файлов между серверами. If-None-Match
+обрабатывается здесь, а Range при выгрузке на веб-сервер - самим сервером.
+"""
+import mimetypes
+import os
+import unicodedata
+from urllib.parse import quote
+from flask import current_app, request, send_file, Response
+from storage import полный_путь
+
+
+def etag_документа(документ):
+    """Сильный ETag для файлов хранилища; None для старых файлов без хеша"""
+    return документ.файл.sha256 if документ.файл else None
+
+
+def _content_disposition(имя):
+    """Content-Disposition с именем файла по RFC 6266 (кириллица через filename*)"""
+    try:
+        имя.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', имя).encode('ascii', 'ignore').decode('ascii')
+        return f'attachment; filename="{simple}"; filename*=UTF-8\'\'{quote(имя, safe="")}'
+    return f'attachment; filename="{имя}"'
+
+
+def _через_сервер(режим, путь_к_файлу, file_path, имя, etag):
+    if etag is None:
+        stat = os.stat(file_path)
+        etag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+    response = Response(mimetype=mimetypes.guess_type(имя)[0] or 'application/octet-stream')
+    response.headers['Content-Disposition'] = _content_disposition(имя)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(etag)
+    if режим == 'nginx':
+        response.headers['X-Accel-Redirect'] = quote(
+            current_app.config['DOWNLOAD_ACCEL_PREFIX'] + путь_к_файлу.replace(os.sep, '/')
+        )
+    else:
+        response.headers['X-Sendfile'] = file_path
+    # 304 отдаём сами, не передавая запрос веб-серверу
+    return response.make_conditional(request)
+
+
+def отдать_документ(документ):
+    """Ответ на скачивание файла документа; права должны быть уже проверены"""
+    file_path = полный_путь(документ.путь_к_файлу)
+    имя = документ.имя_для_скачивания
+    etag = etag_документа(документ)
+    режим = current_app.config['DOWNLOAD_OFFLOAD']
+
+    if режим in ('nginx', 'sendfile'):
+        response = _через_сервер(режим, документ.путь_к_файлу, file_path, имя, etag)
+    else:
+        # send_file сам отвечает на If-None-Match и Range
+        response = send_file(file_path, as_attachment=True, download_name=имя,
+                             etag=etag or True, conditional=True)
+
+    # Файл доступен только после входа: браузер хранит копию, но сверяет ETag
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.cache_control.public = False
+    response.cache_control.max_age = None
+    return response
@@ -0,0 +1,367 @@
+"""Массовый импорт сотрудников из XLSX или CSV.
+
+Первая непустая строка файла - заголовки (порядок столбцов любой,
+лишние столбцы игнорируются): Фамилия, Имя, Отчество, Табельный номер,
+Должность, Рабочий телефон, Email, Пароль, Отдел (название или id), Роль.
+XLSX читается openpyxl в режиме read_only, CSV - модулем csv
+(UTF-8 или cp1251, разделитель ';', ',' или табуляция).
+
+Импорт идёт в четыре этапа:
+1. чтение и проверка строк; уникальность табельных номеров и email
+   проверяется внутри файла и одним запросом к базе по всем строкам;
+2. хеширование паролей в пуле процессов (PBKDF2 занимает большую часть
+   времени импорта);
+3. вставка пачками по INSERT_BATCH строк одним executemany;
+4. обновление счётчиков отделов (counters.py).
+
+Если хотя бы одна строка с ошибкой, по умолчанию ничего не добавляется:
+исправленный файл можно загрузить заново целиком. С skip_invalid
+добавляются только строки без ошибок. Результат - отчёт со списком
+ошибок по номерам строк файла.
+
+Веб-приложение запускает импорт командой `flask import-employees`
+в отдельном процессе (хеширование тысяч паролей дольше таймаута
+gunicorn) и показывает отчёт, когда он записан.
+"""
+import csv
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+from extensions import db
+from models import Сотрудник, Отдел
+from counters import документов_в_отделах, учесть_новых_сотрудников
+
+# Заголовок столбца (без учёта регистра) -> поле
+COLUMNS = {
+    'фамилия': 'фамилия',
+    'имя': 'имя',
+    'отчество': 'отчество',
+    'табельный номер': 'табельный_номер',
+    'должность': 'должность',
+    'рабочий телефон': 'рабочий_телефон',
+    'телефон': 'рабочий_телефон',
+    'email': 'email',
+    'e-mail': 'email',
+    'пароль': 'пароль',
+    'отдел': 'отдел',
+    'роль': 'роль',
+}
+REQUIRED = ('фамилия', 'имя', 'табельный_номер', 'email', 'пароль', 'отдел')
+РОЛИ = ('сотрудник', 'руководитель', 'администратор')
+# Длины строковых столбцов таблицы сотрудники
+MAX_LENGTH = {
+    'фамилия': 100, 'имя': 100, 'отчество': 100, 'табельный_номер': 20,
+    'должность': 255, 'рабочий_телефон': 20, 'email': 255,
+}
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+# Строк в одном INSERT
+INSERT_BATCH = 1000
+# Поля сотрудника, которые берутся из файла как есть
+ПОЛЯ = ('фамилия', 'имя', 'отчество', 'табельный_номер', 'должность', 'рабочий_телефон', 'email')
+
+
+class ОшибкаИмпорта(Exception):
+    """Файл нельзя импортировать целиком: формат, заголовки"""
+
+
+def _значение(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Табельные номера и телефоны в Excel часто хранятся числами
+        value = int(value)
+    return str(value).strip()
+
+
+def _строки_xlsx(path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _строки_csv(path):
+    for encoding in ('utf-8-sig', 'cp1251'):
+        try:
+            with open(path, encoding=encoding, newline='') as f:
+                sample = f.read(64 * 1024)
+        except UnicodeDecodeError:
+            continue
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+        except csv.Error:
+            dialect = csv.excel
+        with open(path, encoding=encoding, newline='') as f:
+            yield from csv.reader(f, dialect)
+        return
+    raise ОшибкаИмпорта('Не удалось определить кодировку CSV (ожидается UTF-8 или cp1251)')
+
+
+def прочитать_файл(path):
+    """Строки файла: (номер строки, {поле: значение})"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.xlsx':
+        строки = _строки_xlsx(path)
+    elif extension in ('.csv', '.txt'):
+        строки = _строки_csv(path)
+    else:
+        raise ОшибкаИмпорта('Поддерживаются файлы XLSX и CSV')
+
+    поля = None
+    for номер, row in enumerate(строки, 1):
+        values = [_значение(value) for value in row]
+        if not any(values):
+            continue
+        if поля is None:
+            поля = [COLUMNS.get(value.lower().replace('ё', 'е')) for value in values]
+            нет = [field for field in REQUIRED if field not in поля]
+            if нет:
+                raise ОшибкаИмпорта('Нет обязательных столбцов: ' + ', '.join(нет))
+            continue
+        yield номер, {field: value for field, value in zip(поля, values) if field}
+    if поля is None:
+        raise ОшибкаИмпорта('Файл пуст')
+
+
+def _отделы():
+    """({название в нижнем регистре: id или None, если названий несколько}, {id})"""
+    по_названию, ids = {}, set()
+    for id, название in db.session.execute(db.select(Отдел.id, Отдел.название)):
+        key = название.strip().lower()
+        по_названию[key] = None if key in по_названию else id
+        ids.add(id)
+    return по_названию, ids
+
+
+def _ошибки_строки(строка, отделы_по_названию, отделы_ids):
+    ошибки = []
+    for field in REQUIRED:
+        if not строка.get(field):
+            ошибки.append(f'не заполнено поле «{field}»')
+    for field, length in MAX_LENGTH.items():
+        if len(строка.get(field, '')) > length:
+            ошибки.append(f'поле «{field}» длиннее {length} символов')
+    if строка.get('email') and not EMAIL_RE.match(строка['email']):
+        ошибки.append('неверный email')
+    роль = строка.get('роль', '').lower() or 'сотрудник'
+    if роль not in РОЛИ:
+        ошибки.append(f'неизвестная роль «{строка["роль"]}»')
+    строка['роль'] = роль
+
+    отдел = строка.get('отдел', '')
+    if отдел:
+        key = отдел.lower()
+        if key in отделы_по_названию:
+            строка['отдел_id'] = отделы_по_названию[key]
+            if строка['отдел_id'] is None:
+                ошибки.append(f'несколько отделов с названием «{отдел}», укажите id')
+        elif отдел.isdigit() and int(отдел) in отделы_ids:
+            строка['отдел_id'] = int(отдел)
+        else:
+            ошибки.append(f'отдел «{отдел}» не найден')
+    return ошибки
+
+
+def проверить(строки):
+    """Проверка строк файла; возвращает (годные строки, {номер строки: [ошибки]})"""
+    отделы_по_названию, отделы_ids = _отделы()
+    годные, ошибки = [], {}
+    номера, emails = {}, {}
+    for номер, строка in строки:
+        ошибки_строки = _ошибки_строки(строка, отделы_по_названию, отделы_ids)
+        табельный_номер = строка.get('табельный_номер')
+        email = строка.get('email', '').lower()
+        if табельный_номер in номера:
+            ошибки_строки.append(f'табельный номер повторяет строку {номера[табельный_номер]}')
+        elif табельный_номер:
+            номера[табельный_номер] = номер
+        if email in emails:
+            ошибки_строки.append(f'email повторяет строку {emails[email]}')
+        elif email:
+            emails[email] = номер
+        if ошибки_строки:
+            ошибки[номер] = ошибки_строки
+        else:
+            годные.append((номер, строка))
+
+    # Уже существующие сотрудники - один запрос по всем номерам и email файла
+    if номера or emails:
+        email_lower = db.func.lower(Сотрудник.email)
+        существующие = db.session.execute(
+            db.select(Сотрудник.табельный_номер, email_lower).where(
+                db.or_(Сотрудник.табельный_номер.in_(list(номера)), email_lower.in_(list(emails)))
+            )
+        ).all()
+        for табельный_номер, email in существующие:
+            if табельный_номер in номера:
+                ошибки.setdefault(номера[табельный_номер], []).append(
+                    'сотрудник с таким табельным номером уже есть')
+            if email in emails:
+                ошибки.setdefault(emails[email], []).append('сотрудник с таким email уже есть')
+        годные = [(номер, строка) for номер, строка in годные if номер not in ошибки]
+    return годные, ошибки
+
+
+def захешировать(пароли, workers=None):
+    """Хеши паролей, посчитанные в пуле процессов"""
+    workers = workers or current_app.config['IMPORT_HASH_WORKERS'] or os.cpu_count()
+    if len(пароли) < 2 or workers == 1:
+        return [generate_password_hash(пароль) for пароль in пароли]
+    chunksize = max(1, len(пароли) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(generate_password_hash, пароли, chunksize=chunksize))
+
+
+def вставить(строки, хеши):
+    """Вставить сотрудников пачками; возвращает {отдел_id: добавлено}"""
+    по_отделам = {}
+    for _, строка in строки:
+        по_отделам[строка['отдел_id']] = по_отделам.get(строка['отдел_id'], 0) + 1
+    непрочитанных = документов_в_отделах(list(по_отделам))
+
+    пачка = []
+    for (_, строка), хеш in zip(строки, хеши):
+        значения = {field: строка.get(field) or None for field in ПОЛЯ}
+        значения.update(
+            пароль=хеш,
+            отдел_id=строка['отдел_id'],
+            роль=строка['роль'],
+            статус_регистрации=False,
+            число_непрочитанных=непрочитанных.get(строка['отдел_id'], 0),
+        )
+        пачка.append(значения)
+        if len(пачка) >= INSERT_BATCH:
+            db.session.execute(db.insert(Сотрудник), пачка)
+            пачка = []
+    if пачка:
+        db.session.execute(db.insert(Сотрудник), пачка)
+    учесть_новых_сотрудников(по_отделам)
+    return по_отделам
+
+
+def импортировать(path, workers=None, skip_invalid=False, dry_run=False):
+    """Импорт сотрудников из файла в текущей транзакции (коммит - на вызывающем).
+
+    Возвращает отчёт: всего строк, добавлено, ошибки по строкам
+    и длительность этапов в секундах.
+    """
+    отчёт = {'файл': os.path.basename(path), 'всего': 0, 'добавлено': 0, 'ошибки': [], 'секунд': {}}
+    started = time.perf_counter()
+    try:
+        строки = list(прочитать_файл(path))
+    except ОшибкаИмпорта as e:
+        отчёт['ошибка'] = str(e)
+        return отчёт
+    отчёт['всего'] = len(строки)
+    отчёт['секунд']['чтение'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    годные, ошибки = проверить(строки)
+    номера = dict(строки)
+    отчёт['ошибки'] = [
+        {'строка': номер, 'табельный_номер': номера[номер].get('табельный_номер', ''), 'ошибки': ошибки[номер]}
+        for номер in sorted(ошибки)
+    ]
+    отчёт['секунд']['проверка'] = time.perf_counter() - started
+    if dry_run or not годные or (ошибки and not skip_invalid):
+        return отчёт
+
+    started = time.perf_counter()
+    хеши = захешировать([строка['пароль'] for _, строка in годные], workers)
+    отчёт['секунд']['хеширование'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    вставить(годные, хеши)
+    отчёт['добавлено'] = len(годные)
+    отчёт['секунд']['вставка'] = time.perf_counter() - started
+    return отчёт
+
+
+def записать_отчёт(отчёт, path):
+    """Записать отчёт JSON атомарно: веб-приложение ждёт появления файла"""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(отчёт, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _пути_импорта(import_id, extension=''):
+    folder = current_app.config['IMPORT_FOLDER']
+    return os.path.join(folder, f'{import_id}{extension}'), os.path.join(folder, f'{import_id}.json')
+
+
+def запустить_импорт(файл, skip_invalid=False):
+    """Сохранить загруженный файл и запустить его импорт в отдельном процессе; возвращает id импорта"""
+    extension = os.path.splitext(файл.filename or '')[1].lower()
+    if extension not in ('.xlsx', '.csv', '.txt'):
+        raise ОшибкаИмпорта('Поддерживаются файлы XLSX и CSV')
+    import_id = uuid.uuid4()
+    path, report = _пути_импорта(import_id, extension)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    файл.save(path)
+    command = [sys.executable, '-m', 'flask', '--app', 'app', 'import-employees', path,
+               '--report', report, '--remove']
+    if skip_invalid:
+        command.append('--skip-invalid')
+    # Отдельная сессия: импорт не прервётся при перезапуске воркера gunicorn
+    subprocess.Popen(command, cwd=current_app.root_path, start_new_session=True,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return import_id
+
+
+def отчёт_импорта(import_id):
+    """Отчёт импорта, запущенного из веб-интерфейса; None, пока импорт идёт"""
+    _, report = _пути_импорта(import_id)
+    try:
+        with open(report, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+@click.command('import-employees')
+@with_appcontext
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--workers', type=int, help='Процессов хеширования паролей')
+@click.option('--skip-invalid', is_flag=True, help='Добавить строки без ошибок, даже если в файле есть ошибочные')
+@click.option('--dry-run', is_flag=True, help='Только проверить файл')
+@click.option('--report', type=click.Path(dir_okay=False), help='Записать отчёт в JSON')
+@click.option('--remove', is_flag=True, help='Удалить файл после чтения (в нём пароли)')
+def import_employees_command(path, workers, skip_invalid, dry_run, report, remove):
+    """Импортировать сотрудников из XLSX или CSV"""
+    try:
+        отчёт = импортировать(path, workers, skip_invalid, dry_run)
+        if отчёт['добавлено']:
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        отчёт = {'файл': os.path.basename(path), 'всего': 0, 'добавлено': 0, 'ошибки': [],
+                 'секунд': {}, 'ошибка': f'Ошибка при добавлении сотрудников: {e}'}
+    finally:
+        if remove:
+            os.remove(path)
+    if report:
+        записать_отчёт(отчёт, report)
+
+    for ошибка in отчёт['ошибки']:
+        click.echo(f"Строка {ошибка['строка']}: {'; '.join(ошибка['ошибки'])}")
+    if отчёт.get('ошибка'):
+        click.echo(отчёт['ошибка'])
+    секунд = sum(отчёт['секунд'].values())
+    click.echo(f"Строк: {отчёт['всего']}, с ошибками: {len(отчёт['ошибки'])}, "
+               f"добавлено: {отчёт['добавлено']} за {секунд:.1f} с")
+    if отчёт.get('ошибка') or (отчёт['ошибки'] and not отчёт['добавлено']):
+        raise SystemExit(1)
@@ -0,0 +1,173 @@
+import csv
+import io
+import os
+import tempfile
+from itertools import chain, islice
+from extensions import db
+from models import Сотрудник, Документ, ДокументОтдела, ПрочтениеДокумента, Отдел
+
+# Размер пачки строк, читаемых из серверного курсора
+BATCH_SIZE = 1000
+# Сколько первых строк учитывается при расчёте ширины столбцов
+WIDTH_SAMPLE_ROWS = 200
+# Размер фрагмента потокового ответа
+CHUNK_SIZE = 64 * 1024
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv; charset=utf-8'
+
+ЗАГОЛОВКИ_СТАТИСТИКИ = [
+    "Название документа", "Тип документа", "Отдел",
+    "Дата создания", "Срок ознакомления",
+    "Всего сотрудников", "Прочитали", "Процент ознакомления"
+]
+
+ЗАГОЛОВКИ_ПО_СОТРУДНИКАМ = [
+    "Название документа", "Тип документа", "Отдел", "Срок ознакомления",
+    "ФИО", "Табельный номер", "Должность", "Статус", "Дата прочтения"
+]
+
+
+def _дата(value, fmt='%d.%m.%Y'):
+    return value.strftime(fmt) if value else ''
+
+
+def строки_статистики(query):
+    """Строки сводной статистики из запроса статистика_query()"""
+    for док, отдел, всего, прочитали in query.yield_per(BATCH_SIZE):
+        процент = round((прочитали / всего * 100) if всего > 0 else 0, 2)
+        yield [
+            док.название, док.тип_документа, отдел,
+            _дата(док.дата_создания), _дата(док.срок_ознакомления),
+            всего, прочитали, f"{процент}%"
+        ]
+
+
+def по_сотрудникам_query(статус=None):
+    """Запрос: каждый документ × каждый сотрудник отделов-адресатов с отметкой о прочтении"""
+    query = db.session.query(
+        Документ.название, Документ.тип_документа, Отдел.название, Документ.срок_ознакомления,
+        Сотрудник.фамилия, Сотрудник.имя, Сотрудник.отчество,
+        Сотрудник.табельный_номер, Сотрудник.должность,
+        ПрочтениеДокумента.дата_прочтения
+    ).select_from(ДокументОтдела).join(
+        Документ, Документ.id == ДокументОтдела.документ_id
+    ).join(
+        Отдел, Отдел.id == ДокументОтдела.отдел_id
+    ).join(
+        Сотрудник, Сотрудник.отдел_id == ДокументОтдела.отдел_id
+    ).outerjoin(
+        ПрочтениеДокумента,
+        db.and_(
+            ПрочтениеДокумента.документ_id == Документ.id,
+            ПрочтениеДокумента.сотрудник_id == Сотрудник.id
+        )
+    )
+    if статус == 'read':
+        query = query.filter(ПрочтениеДокумента.id.isnot(None))
+    elif статус == 'unread':
+        query = query.filter(ПрочтениеДокумента.id.is_(None))
+    return query.order_by(Документ.id, Отдел.название, Сотрудник.фамилия, Сотрудник.id)
+
+
+def строки_по_сотрудникам(query):
+    """Строки детального отчёта из запроса по_сотрудникам_query()"""
+    for (название, тип, отдел, срок, фамилия, имя, отчество,
+         табельный_номер, должность, дата_прочтения) in query.yield_per(BATCH_SIZE):
+        фио = ' '.join(part for part in (фамилия, имя, отчество) if part)
+        yield [
+            название, тип, отдел, _дата(срок),
+            фио, табельный_номер, должность,
+            'Прочитано' if дата_прочтения else 'Не прочитано',
+            _дата(дата_прочтения, '%d.%m.%Y %H:%M')
+        ]
+
+
+def csv_stream(headers, rows):
+    """Генератор CSV-ответа: строки кодируются и отдаются пачками"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    # BOM нужен, чтобы Excel правильно определил кодировку
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _ширины_столбцов(headers, sample):
+    ширины = [len(str(h)) for h in headers]
+    for row in sample:
+        for i, value in enumerate(row):
+            ширины[i] = max(ширины[i], len(str(value)) if value is not None else 0)
+    return [w + 2 for w in ширины]
+
+
+def xlsx_file(headers, rows, title):
+    """Запись строк в XLSX в режиме write-only; возвращает путь к временному файлу.
+
+    Память не растёт с числом строк: openpyxl сбрасывает их на диск по мере записи.
+    Ширина столбцов считается по первым WIDTH_SAMPLE_ROWS строкам.
+
+    В отличие от CSV, файл собирается целиком до отправки первого байта:
+    формат ZIP пишет оглавление в конце, а openpyxl - только в файл. Поэтому
+    большая выгрузка держит воркер всё время сборки и укладывается в таймаут
+    gunicorn (GUNICORN_TIMEOUT) и nginx только с запасом; для миллионов строк
+    быстрее выгрузка в CSV.
+    """
+    # openpyxl нужен только для выгрузки в Excel, не загружаем его при старте
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+
+    rows = iter(rows)
+    sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    for col, width in enumerate(_ширины_столбцов(headers, sample), 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+    # Стили для заголовков
+    header_font = Font(bold=True)
+    header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    header_row = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal='center')
+        header_row.append(cell)
+    ws.append(header_row)
+
+    for row in chain(sample, rows):
+        ws.append(row)
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        wb.save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def file_stream(path):
+    """Отдача файла фрагментами; удаляет его удалить_временный_файл при закрытии ответа"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def удалить_временный_файл(path):
+    if os.path.exists(path):
+        os.remove(path)
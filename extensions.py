@@ -1,8 +1,8 @@
-from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from config import Config
+from flask_login import LoginManager
+from flask_migrate import Migrate
 
-app = Flask(__name__)
-app.config.from_object(Config)
-
-db = SQLAlchemy(app)
+# Расширения создаются без приложения и подключаются в app.create_app()
+db = SQLAlchemy()
+migrate = Migrate()
+login_manager = LoginManager()
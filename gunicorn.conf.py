@@ -0,0 +1,56 @@
+"""Настройки gunicorn для веб-приложения.
+
+Приложение загружается один раз в мастер-процессе (preload_app) и делится
+с воркерами через fork. Плавный перезапуск воркеров с новыми настройками -
+`kill -HUP <master>`; для выката нового кода, поскольку код загружен
+в мастере, - `kill -USR2 <master>`, затем `kill -TERM` старому мастеру.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+preload_app = True
+
+# Долгие выгрузки и листы QR отдаются потоком, поэтому таймаут с запасом.
+# XLSX собирается целиком до отправки первого байта (см. exports.xlsx_file):
+# выгрузка статистики по сотрудникам за годы может занять несколько минут.
+# Таймаут общий для всех маршрутов; nginx держит соединение столько же
+# только для /export_statistics (см. README)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 300))
+graceful_timeout = 30
+keepalive = 5
+
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = 2000
+max_requests_jitter = 200
+
+# Каталог метрик воркеров: /metrics любого воркера отдаёт сумму по всем.
+# Переменная должна быть задана до импорта prometheus_client (preload_app)
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prometheus_multiproc')
+)
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # Соединения пула, открытые в мастере, не должны использоваться воркерами
+    from extensions import db
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
+
+
+def on_starting(server):
+    # Метрики прошлого запуска не должны попасть в новые суммы
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
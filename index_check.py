@@ -0,0 +1,99 @@
+"""Проверка планов частых запросов: каждый должен читать таблицы по индексу.
+
+`flask check-indexes` выполняет EXPLAIN для запросов бота, статистики
+и списков документов и завершается с кодом 1, если в плане есть
+последовательное чтение проверяемой таблицы. На маленькой базе планировщик
+всегда предпочтёт полный просмотр, поэтому он отключается на время
+проверки (enable_seqscan = off): Seq Scan в плане остаётся только там,
+где подходящего индекса нет.
+"""
+import json
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, text
+from extensions import db
+from models import Сотрудник, Документ, ПрочтениеДокумента
+from repository import непрочитанные_query
+from read_partitions import таблица
+from search import RUSSIAN
+
+
+def горячие_запросы(сотрудник_id, отдел_id, документ_id):
+    """Список (название, запрос, таблицы, которые нельзя читать целиком)"""
+    return [
+        ('Повторное подтверждение ознакомления',
+         select(ПрочтениеДокумента.id).where(
+             ПрочтениеДокумента.сотрудник_id == сотрудник_id,
+             ПрочтениеДокумента.документ_id == документ_id
+         ),
+         {'прочтения_документов'}),
+        ('Непрочитанные документы сотрудника',
+         непрочитанные_query(сотрудник_id, отдел_id),
+         {'документы_отделов', 'прочтения_документов', 'документы'}),
+        ('Прочтения документа',
+         select(ПрочтениеДокумента.сотрудник_id).where(
+             ПрочтениеДокумента.документ_id == документ_id
+         ),
+         {'прочтения_документов'}),
+        ('Сотрудники отдела',
+         select(Сотрудник.id).where(Сотрудник.отдел_id == отдел_id),
+         {'сотрудники'}),
+        ('Новые документы',
+         select(Документ.id).order_by(Документ.дата_создания.desc()).limit(50),
+         {'документы'}),
+        ('Документы по типу',
+         select(Документ.id).where(Документ.тип_документа == 'Приказ'),
+         {'документы'}),
+        ('Полнотекстовый поиск',
+         select(Документ.id).where(Документ.поисковый_вектор.op('@@')(
+             db.func.websearch_to_tsquery(RUSSIAN, 'приказ')
+         )),
+         {'документы'}),
+    ]
+
+
+def _план(query):
+    sql = query.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    план = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+    if isinstance(план, str):
+        план = json.loads(план)
+    return план[0]['Plan']
+
+
+def _полные_просмотры(узел):
+    if узел.get('Node Type') == 'Seq Scan':
+        # Секции журнала прочтений считаются самой таблицей
+        yield таблица(узел['Relation Name'])
+    for дочерний in узел.get('Plans', []):
+        yield from _полные_просмотры(дочерний)
+
+
+def проверить_индексы():
+    """Возвращает {название запроса: таблицы, прочитанные целиком}"""
+    сотрудник = db.session.execute(
+        select(Сотрудник.id, Сотрудник.отдел_id).order_by(Сотрудник.id).limit(1)
+    ).first() or (1, 1)
+    документ_id = db.session.scalar(select(Документ.id).order_by(Документ.id).limit(1)) or 1
+
+    результат = {}
+    try:
+        db.session.execute(text('SET LOCAL enable_seqscan = off'))
+        for название, query, таблицы in горячие_запросы(*сотрудник, документ_id):
+            результат[название] = sorted(set(_полные_просмотры(_план(query))) & таблицы)
+    finally:
+        db.session.rollback()
+    return результат
+
+
+@click.command('check-indexes')
+@with_appcontext
+def check_indexes_command():
+    """Проверить, что частые запросы используют индексы"""
+    результат = проверить_индексы()
+    for название, таблицы in результат.items():
+        if таблицы:
+            click.echo(f'{название}: последовательное чтение {", ".join(таблицы)}')
+        else:
+            click.echo(f'{название}: OK')
+    if any(результат.values()):
+        raise SystemExit(1)
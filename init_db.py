@@ -1,12 +1,64 @@
-from extensions import app, db
-from models import Организация, Отдел, Сотрудник
+"""Создание схемы и начальное заполнение базы.
+
+    python init_db.py
+        схема и тестовые данные: организация, три отдела, пять сотрудников;
+    python init_db.py --synthetic [--departments 100] [--employees 50000]
+        [--documents 20000] [--read-share 0.6] [--seed 1]
+        дополнительно синтетическая организация заданного масштаба для
+        замеров (scripts/bench_routes.py): отделы, сотрудники, документы,
+        адресаты и миллионы отметок о прочтении, вставляемых пачками и
+        INSERT ... SELECT на стороне базы.
+"""
+import argparse
+import hashlib
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from flask_migrate import upgrade
+from app import create_app
+from extensions import db
+from models import Организация, Отдел, Сотрудник, Документ, ДокументОтдела, Файл
 from werkzeug.security import generate_password_hash
+from counters import пересчитать_счётчики
+from search import обновить_поисковые_векторы
+from storage import полный_путь, путь_объекта
+from text_extraction import EXTRACTOR_VERSION
+from reference_cache import отметить_изменение, ОТДЕЛЫ, ТИПЫ_ДОКУМЕНТОВ
+from read_partitions import подготовить_секции
+
+# Строк в одном INSERT при синтетическом заполнении
+BATCH = 5000
+# Различных файлов у синтетических документов
+SYNTHETIC_FILES = 50
+# Доля документов, адресованных всем отделам
+ALL_DEPARTMENTS_SHARE = 0.02
+# Доля сотрудников, подключивших Telegram
+REGISTERED_SHARE = 0.7
+# Первый telegram_id синтетических сотрудников
+SYNTHETIC_TELEGRAM_ID = 5 * 10 ** 9
+
+SYNTHETIC_ADMIN_EMAIL = 'synthetic-admin@example.com'
+SYNTHETIC_PASSWORD = 'synthetic123'
+
+ТИПЫ = ['Приказ', 'Распоряжение', 'Положение', 'Инструкция', 'Регламент', 'Памятка']
+СЛОВА = (
+    'пожарная безопасность охрана труда отпуск график командировка премия договор '
+    'поставка склад инвентаризация обучение аттестация персонал защита данных доступ '
+    'пропускной режим дежурство эвакуация проверка комиссия бюджет закупка ремонт'
+).split()
+ФАМИЛИИ = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов']
+ИМЕНА = ['Иван', 'Пётр', 'Алексей', 'Сергей', 'Андрей', 'Дмитрий', 'Михаил', 'Николай']
+ОТЧЕСТВА = ['Иванович', 'Петрович', 'Алексеевич', 'Сергеевич', 'Андреевич', 'Дмитриевич']
 
 def init_database():
+    app = create_app()
     with app.app_context():
-        # Удаляем существующие данные
-        db.drop_all()
-        db.create_all()
+        # Схема создаётся и обновляется только миграциями
+        upgrade()
+        if Организация.query.first():
+            print('База данных уже содержит данные, начальное заполнение пропущено.')
+            return
 
         # Создаем организацию
         org = Организация(название='ООО Тест')
@@ -91,6 +143,9 @@ def init_database():
         
         db.session.commit()
 
+        # Заполняем счётчики прогресса ознакомления
+        пересчитать_счётчики()
+
         print('База данных успешно инициализирована!')
         print('\nДанные для входа администратора:')
         print('Email: admin@example.com')
@@ -108,5 +163,149 @@ def init_database():
         print('0004 - Петров Петр Петрович (сотрудник)')
         print('0005 - Сидорова Анна Владимировна (сотрудник)')
 
-if __name__ == '__main__':
+def _вставить(model, строки, returning=None):
+    """Вставить строки пачками по BATCH; возвращает значения столбца returning"""
+    результат = []
+    for start in range(0, len(строки), BATCH):
+        пачка = строки[start:start + BATCH]
+        if returning is None:
+            db.session.execute(db.insert(model), пачка)
+        else:
+            результат.extend(db.session.scalars(db.insert(model).returning(returning), пачка))
+    return результат
+
+
+def _синтетические_файлы(rng, count):
+    """Небольшие текстовые файлы в хранилище; возвращает id строк файлы"""
+    ids = []
+    for n in range(count):
+        текст = f'Синтетический документ {n}. ' + ' '.join(rng.choice(СЛОВА) for _ in range(300))
+        data = текст.encode('utf-8')
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = полный_путь(путь_объекта(sha256))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        файл = Файл.query.filter_by(sha256=sha256).first()
+        if файл is None:
+            файл = Файл(sha256=sha256, размер=len(data), число_ссылок=0,
+                        текст=текст, версия_извлечения=EXTRACTOR_VERSION)
+            db.session.add(файл)
+            db.session.flush()
+        ids.append((файл.id, sha256))
+    return ids
+
+
+def создать_синтетику(отделов, сотрудников, документов, доля_прочтений, seed):
+    """Синтетическая организация заданного масштаба для замеров"""
+    rng = random.Random(seed)
+    метка = f's{seed}'
+    started = time.perf_counter()
+
+    org = Организация(название=f'Синтетическая организация {метка}')
+    db.session.add(org)
+    db.session.flush()
+    отделы_ids = _вставить(Отдел, [
+        {'название': f'Синтетический отдел {n + 1} ({метка})', 'организация_id': org.id}
+        for n in range(отделов)
+    ], Отдел.id)
+
+    # Хеш одного пароля на всех: PBKDF2 для каждого из десятков тысяч заняло бы минуты
+    пароль = generate_password_hash(SYNTHETIC_PASSWORD)
+    admin_email = SYNTHETIC_ADMIN_EMAIL if seed == 1 else f'{метка}-admin@example.com'
+    строки = [{
+        'фамилия': 'Администратор', 'имя': 'Синтетический', 'табельный_номер': f'{метка}-admin',
+        'должность': 'Администратор', 'email': admin_email,
+        'пароль': пароль, 'отдел_id': отделы_ids[0], 'роль': 'администратор',
+    }]
+    for n in range(сотрудников):
+        зарегистрирован = rng.random() < REGISTERED_SHARE
+        строки.append({
+            'фамилия': rng.choice(ФАМИЛИИ), 'имя': rng.choice(ИМЕНА), 'отчество': rng.choice(ОТЧЕСТВА),
+            'табельный_номер': f'{метка}-{n}', 'должность': 'Специалист',
+            'email': f'{метка}.{n}@synthetic.example', 'пароль': пароль,
+            'отдел_id': отделы_ids[n % отделов],
+            'роль': 'руководитель' if n < отделов else 'сотрудник',
+            'telegram_id': SYNTHETIC_TELEGRAM_ID + seed * 10 ** 7 + n if зарегистрирован else None,
+            'статус_регистрации': зарегистрирован,
+        })
+    _вставить(Сотрудник, строки)
+    print(f'Отделов: {отделов}, сотрудников: {len(строки)} ({time.perf_counter() - started:.1f} с)')
+
+    started = time.perf_counter()
+    файлы = _синтетические_файлы(rng, min(SYNTHETIC_FILES, документов))
+    сейчас = datetime.utcnow()
+    строки = []
+    for n in range(документов):
+        файл_id, sha256 = файлы[n % len(файлы)]
+        создан = сейчас - timedelta(days=rng.uniform(0, 730))
+        строки.append({
+            'название': f"{rng.choice(ТИПЫ)} о {' '.join(rng.choice(СЛОВА) for _ in range(3))} № {n + 1}",
+            'тип_документа': rng.choice(ТИПЫ),
+            'файл_id': файл_id, 'путь_к_файлу': путь_объекта(sha256), 'имя_файла': f'document_{n + 1}.txt',
+            'дата_создания': создан,
+            'срок_ознакомления': (создан + timedelta(days=rng.randint(7, 60))).date(),
+        })
+    документы_ids = _вставить(Документ, строки, Документ.id)
+    первый, последний = min(документы_ids), max(документы_ids)
+    for файл_id, _ in файлы:
+        db.session.execute(db.update(Файл).where(Файл.id == файл_id).values(
+            число_ссылок=db.select(db.func.count(Документ.id)).where(Документ.файл_id == файл_id).scalar_subquery()
+        ))
+
+    адресаты = []
+    for документ_id in документы_ids:
+        if rng.random() < ALL_DEPARTMENTS_SHARE:
+            выбранные = отделы_ids
+        else:
+            выбранные = rng.sample(отделы_ids, min(len(отделы_ids), rng.randint(1, 3)))
+        адресаты.extend({'документ_id': документ_id, 'отдел_id': отдел_id} for отдел_id in выбранные)
+    _вставить(ДокументОтдела, адресаты)
+    print(f'Документов: {документов}, адресатов: {len(адресаты)} ({time.perf_counter() - started:.1f} с)')
+
+    # Отметки о прочтении - на стороне базы, без передачи миллионов строк;
+    # секции журнала прочтений нужны с месяца самого старого документа
+    started = time.perf_counter()
+    подготовить_секции(с=min(строка['дата_создания'] for строка in строки))
+    db.session.execute(db.text('SELECT setseed(:seed)'), {'seed': (seed % 1000) / 1000})
+    прочтений = db.session.execute(db.text("""
+        INSERT INTO прочтения_документов (сотрудник_id, документ_id, дата_прочтения, подтверждено)
+        SELECT с.id, до.документ_id, д.дата_создания + random() * interval '30 days', true
+        FROM документы_отделов до
+        JOIN документы д ON д.id = до.документ_id
+        JOIN сотрудники с ON с.отдел_id = до.отдел_id
+        WHERE до.документ_id BETWEEN :first AND :last AND random() < :share
+    """), {'first': первый, 'last': последний, 'share': доля_прочтений}).rowcount
+    print(f'Отметок о прочтении: {прочтений} ({time.perf_counter() - started:.1f} с)')
+
+    started = time.perf_counter()
+    обновить_поисковые_векторы(Документ.id.between(первый, последний))
+    отметить_изменение(ОТДЕЛЫ, ТИПЫ_ДОКУМЕНТОВ)
+    db.session.commit()
+    пересчитать_счётчики()
+    for table in ('отделы', 'сотрудники', 'документы', 'документы_отделов', 'прочтения_документов'):
+        db.session.execute(db.text(f'ANALYZE {table}'))
+    db.session.commit()
+    print(f'Поисковые векторы, счётчики и статистика планировщика: {time.perf_counter() - started:.1f} с')
+    print(f'\nАдминистратор синтетической организации: {admin_email} / {SYNTHETIC_PASSWORD}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Создание схемы и начальное заполнение базы')
+    parser.add_argument('--synthetic', action='store_true', help='Добавить синтетическую организацию для замеров')
+    parser.add_argument('--departments', type=int, default=100)
+    parser.add_argument('--employees', type=int, default=50000)
+    parser.add_argument('--documents', type=int, default=20000)
+    parser.add_argument('--read-share', type=float, default=0.6, help='Доля прочитанных пар сотрудник-документ')
+    parser.add_argument('--seed', type=int, default=1, help='Разные seed дают независимые организации')
+    args = parser.parse_args()
+
     init_database()
+    if args.synthetic:
+        app = create_app()
+        with app.app_context():
+            создать_синтетику(args.departments, args.employees, args.documents, args.read_share, args.seed)
+
+
+if __name__ == '__main__':
+    main()
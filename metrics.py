@@ -0,0 +1,277 @@
+"""Метрики производительности и журнал медленных запросов.
+
+События SQLAlchemy (before/after_cursor_execute) считают время каждого
+SQL-запроса; запросы дольше SLOW_QUERY_MS пишутся в журнал с параметрами
+и планом EXPLAIN (план одного и того же текста - не чаще раза в
+SLOW_QUERY_EXPLAIN_INTERVAL секунд). Запросы и время в базе суммируются
+в пределах текущего запроса Flask или обработчика бота (contextvar),
+поэтому для медленной страницы видно, где ушло время: в базе, в
+шаблоне или в остальном коде.
+
+Веб-приложение отдаёт метрики на /metrics. Под gunicorn каждый воркер -
+отдельный процесс, поэтому их значения собираются через каталог
+PROMETHEUS_MULTIPROC_DIR (см. gunicorn.conf.py). Бот открывает свой
+/metrics на порту BOT_METRICS_PORT.
+
+Без METRICS_TOKEN /metrics отвечает только на запросы с самого сервера,
+пришедшие не через прокси.
+
+Накладные расходы - несколько микросекунд на SQL-запрос и на запрос
+страницы (замер: scripts/bench_metrics.py); METRICS_ENABLED=0 отключает
+всё, кроме пустого /metrics.
+"""
+import functools
+import hmac
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from flask import Response, abort, before_render_template, current_app, g, request, template_rendered
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+
+logger = logging.getLogger('slow_query')
+
+# Границы корзин: время, секунд, и число SQL-запросов
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Длина текста параметров в журнале медленных запросов
+MAX_PARAMS_CHARS = 1000
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+# Сколько текстов запросов помнить, чтобы не повторять их EXPLAIN
+MAX_EXPLAINED = 1000
+LOOPBACK = ('127.0.0.1', '::1')
+
+SQL_SECONDS = Histogram('docmanagement_sql_query_seconds', 'Время SQL-запроса', buckets=TIME_BUCKETS)
+SLOW_QUERIES = Counter('docmanagement_sql_slow_queries_total', 'SQL-запросов дольше SLOW_QUERY_MS')
+
+HTTP_SECONDS = Histogram(
+    'docmanagement_http_request_seconds', 'Время обработки запроса до отдачи ответа',
+    ['endpoint', 'method', 'status'], buckets=TIME_BUCKETS
+)
+HTTP_SQL_QUERIES = Histogram(
+    'docmanagement_http_request_sql_queries', 'SQL-запросов за запрос', ['endpoint'], buckets=COUNT_BUCKETS
+)
+HTTP_SQL_SECONDS = Histogram(
+    'docmanagement_http_request_sql_seconds', 'Время в базе за запрос', ['endpoint'], buckets=TIME_BUCKETS
+)
+RENDER_SECONDS = Histogram(
+    'docmanagement_template_render_seconds', 'Время рендеринга шаблона', ['template'], buckets=TIME_BUCKETS
+)
+
+BOT_SECONDS = Histogram(
+    'docmanagement_bot_handler_seconds', 'Время обработчика бота', ['handler'], buckets=TIME_BUCKETS
+)
+BOT_SQL_QUERIES = Histogram(
+    'docmanagement_bot_handler_sql_queries', 'SQL-запросов за вызов обработчика', ['handler'],
+    buckets=COUNT_BUCKETS
+)
+BOT_SQL_SECONDS = Histogram(
+    'docmanagement_bot_handler_sql_seconds', 'Время в базе за вызов обработчика', ['handler'],
+    buckets=TIME_BUCKETS
+)
+
+# Распознавание QR-кодов в пуле процессов бота (см. qr_decode.py)
+QR_QUEUE_DEPTH = Gauge(
+    'docmanagement_qr_decode_queue_depth', 'Фото в очереди и в работе у пула распознавания QR',
+    multiprocess_mode='livesum'
+)
+QR_DECODED = Counter('docmanagement_qr_decoded_total', 'Фото, на которых распознан QR-код')
+QR_FAILED = Counter('docmanagement_qr_decode_failed_total', 'Фото, на которых QR-код не найден')
+
+
+class _Замер:
+    """SQL-запросы текущего запроса Flask или вызова обработчика"""
+    __slots__ = ('запросов', 'секунд', 'рендер')
+
+    def __init__(self):
+        self.запросов = 0
+        self.секунд = 0.0
+        self.рендер = None
+
+
+_замер = ContextVar('замер', default=None)
+# Время последнего EXPLAIN по тексту запроса; давно не встречавшиеся вытесняются
+_объяснено = OrderedDict()
+_подключено = False
+
+
+def _начать_sql(conn, cursor, statement, parameters, context, executemany):
+    # Время хранится в контексте выполнения: если запрос упадёт и after_cursor_execute
+    # не наступит, оно уйдёт вместе с контекстом
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _закончить_sql(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    SQL_SECONDS.observe(elapsed)
+    замер = _замер.get()
+    if замер is not None:
+        замер.запросов += 1
+        замер.секунд += elapsed
+    if Config.SLOW_QUERY_MS and elapsed * 1000 >= Config.SLOW_QUERY_MS:
+        SLOW_QUERIES.inc()
+        _записать_медленный(conn, statement, parameters, executemany, elapsed)
+
+
+def _план(conn, statement, parameters):
+    """EXPLAIN запроса отдельным курсором; в точке сохранения, чтобы ошибка не прервала транзакцию"""
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute('SAVEPOINT metrics_explain')
+        try:
+            cursor.execute('EXPLAIN ' + statement, parameters)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        except Exception as e:
+            cursor.execute('ROLLBACK TO SAVEPOINT metrics_explain')
+            plan = f'не удалось получить план: {e}'
+        cursor.execute('RELEASE SAVEPOINT metrics_explain')
+        return plan
+    finally:
+        cursor.close()
+
+
+def _записать_медленный(conn, statement, parameters, executemany, elapsed):
+    params = repr(parameters)
+    if len(params) > MAX_PARAMS_CHARS:
+        params = params[:MAX_PARAMS_CHARS] + '…'
+    plan = ''
+    now = time.monotonic()
+    explainable = not executemany and statement.lstrip().split(None, 1)[0].upper() in EXPLAINABLE
+    if explainable and now - _объяснено.get(statement, -Config.SLOW_QUERY_EXPLAIN_INTERVAL) \
+            >= Config.SLOW_QUERY_EXPLAIN_INTERVAL:
+        _объяснено[statement] = now
+        _объяснено.move_to_end(statement)
+        if len(_объяснено) > MAX_EXPLAINED:
+            _объяснено.popitem(last=False)
+        try:
+            plan = '\nПлан:\n' + _план(conn, statement, parameters)
+        except Exception as e:
+            plan = f'\nПлан не получен: {e}'
+    logger.warning(f'Медленный запрос {elapsed * 1000:.0f} мс:\n{statement}\nПараметры: {params}{plan}')
+
+
+def подключить_sql():
+    """Засекать все SQL-запросы процесса (веб-приложения или бота)"""
+    global _подключено
+    if _подключено or not Config.METRICS_ENABLED:
+        return
+    event.listen(Engine, 'before_cursor_execute', _начать_sql)
+    event.listen(Engine, 'after_cursor_execute', _закончить_sql)
+    _подключено = True
+
+
+def _до_запроса():
+    g.metrics_started = time.perf_counter()
+    g.metrics_замер = _Замер()
+    g.metrics_token = _замер.set(g.metrics_замер)
+
+
+def _после_запроса(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _завершить_запрос(exc):
+    """Записать метрики запроса; выполняется и после необработанного исключения"""
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    замер = g.pop('metrics_замер')
+    status = 500 if exc is not None else g.pop('metrics_status', 500)
+    endpoint = request.endpoint or 'none'
+    HTTP_SECONDS.labels(endpoint, request.method, status).observe(time.perf_counter() - started)
+    HTTP_SQL_QUERIES.labels(endpoint).observe(замер.запросов)
+    HTTP_SQL_SECONDS.labels(endpoint).observe(замер.секунд)
+    _замер.reset(g.pop('metrics_token'))
+
+
+def _до_рендера(sender, template, context, **extra):
+    замер = _замер.get()
+    if замер is not None:
+        замер.рендер = time.perf_counter()
+
+
+def _после_рендера(sender, template, context, **extra):
+    замер = _замер.get()
+    if замер is not None and замер.рендер is not None:
+        RENDER_SECONDS.labels(template.name or 'string').observe(time.perf_counter() - замер.рендер)
+        замер.рендер = None
+
+
+def метрики():
+    """Текст метрик в формате Prometheus; под gunicorn - сумма по всем воркерам"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def _локальный_запрос():
+    """Запрос с самого сервера напрямую, а не через nginx"""
+    return request.remote_addr in LOOPBACK and not (
+        request.headers.get('X-Forwarded-For') or request.headers.get('X-Real-IP')
+    )
+
+
+def metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            abort(403)
+    elif not _локальный_запрос():
+        abort(403)
+    return Response(метрики(), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Метрики веб-приложения: SQL, время запросов и шаблонов, маршрут /metrics"""
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    if not app.config['METRICS_ENABLED']:
+        return
+    подключить_sql()
+    app.before_request(_до_запроса)
+    app.after_request(_после_запроса)
+    app.teardown_request(_завершить_запрос)
+    before_render_template.connect(_до_рендера, app)
+    template_rendered.connect(_после_рендера, app)
+
+
+def обработчик(callback):
+    """Засекать время и SQL-запросы обработчика бота"""
+    if not Config.METRICS_ENABLED:
+        return callback
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        замер = _Замер()
+        token = _замер.set(замер)
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            BOT_SECONDS.labels(name).observe(time.perf_counter() - started)
+            BOT_SQL_QUERIES.labels(name).observe(замер.запросов)
+            BOT_SQL_SECONDS.labels(name).observe(замер.секунд)
+            _замер.reset(token)
+    return wrapper
+
+
+def запустить_сервер_бота():
+    """/metrics процесса бота в отдельном потоке, если задан BOT_METRICS_PORT"""
+    if Config.BOT_METRICS_PORT:
+        from prometheus_client import start_http_server
+        start_http_server(Config.BOT_METRICS_PORT)
@@ -0,0 +1,83 @@
+"""Исходная схема: организации, отделы, сотрудники, документы, прочтения
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 12:00:00
+
+База, созданная раньше через db.create_all(), уже содержит эту схему:
+отметьте её командой `flask db stamp 0001` и затем выполните `flask db upgrade`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('организации',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('название', sa.String(length=255), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('отделы',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('название', sa.String(length=255), nullable=False),
+        sa.Column('организация_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['организация_id'], ['организации.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('сотрудники',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('отдел_id', sa.Integer(), nullable=False),
+        sa.Column('telegram_id', sa.BigInteger(), nullable=True),
+        sa.Column('фамилия', sa.String(length=100), nullable=False),
+        sa.Column('имя', sa.String(length=100), nullable=False),
+        sa.Column('отчество', sa.String(length=100), nullable=True),
+        sa.Column('табельный_номер', sa.String(length=20), nullable=False),
+        sa.Column('должность', sa.String(length=255), nullable=True),
+        sa.Column('рабочий_телефон', sa.String(length=20), nullable=True),
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('пароль', sa.String(length=255), nullable=False),
+        sa.Column('роль', sa.String(length=20), nullable=True),
+        sa.Column('статус_регистрации', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['отдел_id'], ['отделы.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('telegram_id'),
+        sa.UniqueConstraint('табельный_номер')
+    )
+    op.create_table('документы',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('отдел_id', sa.Integer(), nullable=False),
+        sa.Column('название', sa.String(length=255), nullable=False),
+        sa.Column('путь_к_файлу', sa.Text(), nullable=True),
+        sa.Column('срок_ознакомления', sa.Date(), nullable=True),
+        sa.Column('тип_документа', sa.String(length=50), nullable=True),
+        sa.Column('дата_создания', sa.DateTime(), nullable=True),
+        sa.Column('qr_код', sa.String(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['отдел_id'], ['отделы.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('прочтения_документов',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('сотрудник_id', sa.Integer(), nullable=False),
+        sa.Column('документ_id', sa.Integer(), nullable=False),
+        sa.Column('дата_прочтения', sa.DateTime(), nullable=True),
+        sa.Column('подтверждено', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['документ_id'], ['документы.id'], ),
+        sa.ForeignKeyConstraint(['сотрудник_id'], ['сотрудники.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('прочтения_документов')
+    op.drop_table('документы')
+    op.drop_table('сотрудники')
+    op.drop_table('отделы')
+    op.drop_table('организации')
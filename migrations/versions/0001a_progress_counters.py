@@ -0,0 +1,32 @@
+"""Счётчики прогресса ознакомления у отделов и сотрудников
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18 12:05:00
+
+Счётчики появились раньше миграций: база, созданная тогда через
+db.create_all(), уже содержит эти столбцы, поэтому они добавляются,
+только если их нет. После применения пересчитайте счётчики:
+`flask rebuild-counters`.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0001a'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('ALTER TABLE отделы ADD COLUMN IF NOT EXISTS число_сотрудников integer DEFAULT 0 NOT NULL')
+    op.execute('ALTER TABLE сотрудники ADD COLUMN IF NOT EXISTS число_непрочитанных integer DEFAULT 0 NOT NULL')
+    # Счётчик прочтений документа в отделе автора; позже переезжает в документы_отделов
+    op.execute('ALTER TABLE документы ADD COLUMN IF NOT EXISTS число_прочтений integer DEFAULT 0 NOT NULL')
+
+
+def downgrade():
+    op.drop_column('документы', 'число_прочтений')
+    op.drop_column('сотрудники', 'число_непрочитанных')
+    op.drop_column('отделы', 'число_сотрудников')
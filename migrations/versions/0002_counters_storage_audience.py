@@ -0,0 +1,89 @@
+"""Хранилище файлов, адресаты документов, очередь уведомлений
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-18 12:10:00
+
+Документ.отдел_id переносится в таблицу документы_отделов, а счётчик
+прочтений документа - в её строки. После применения пересчитайте счётчики: `flask rebuild-counters`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('файлы',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('размер', sa.BigInteger(), nullable=False),
+        sa.Column('число_ссылок', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('дата_создания', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sha256')
+    )
+    op.add_column('документы', sa.Column('файл_id', sa.Integer(), nullable=True))
+    op.add_column('документы', sa.Column('имя_файла', sa.String(length=255), nullable=True))
+    op.create_foreign_key('документы_файл_id_fkey', 'документы', 'файлы', ['файл_id'], ['id'])
+
+    op.create_table('документы_отделов',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('документ_id', sa.Integer(), nullable=False),
+        sa.Column('отдел_id', sa.Integer(), nullable=False),
+        sa.Column('число_прочтений', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['документ_id'], ['документы.id'], ),
+        sa.ForeignKeyConstraint(['отдел_id'], ['отделы.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('документ_id', 'отдел_id', name='uq_документы_отделов')
+    )
+    op.execute(
+        'INSERT INTO документы_отделов (документ_id, отдел_id) '
+        'SELECT id, отдел_id FROM документы'
+    )
+    op.drop_column('документы', 'отдел_id')
+    op.drop_column('документы', 'число_прочтений')
+
+    op.create_table('уведомления',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('сотрудник_id', sa.Integer(), nullable=False),
+        sa.Column('документ_id', sa.Integer(), nullable=True),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('текст', sa.Text(), nullable=False),
+        sa.Column('статус', sa.String(length=20), server_default='ожидает', nullable=False),
+        sa.Column('попыток', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('следующая_попытка', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('ошибка', sa.Text(), nullable=True),
+        sa.Column('дата_создания', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('дата_отправки', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['документ_id'], ['документы.id'], ),
+        sa.ForeignKeyConstraint(['сотрудник_id'], ['сотрудники.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_уведомления_очередь', 'уведомления', ['статус', 'следующая_попытка'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_уведомления_очередь', table_name='уведомления')
+    op.drop_table('уведомления')
+
+    # Документ, адресованный нескольким отделам, остаётся в первом из них
+    op.add_column('документы', sa.Column('отдел_id', sa.Integer(), nullable=True))
+    op.execute(
+        'UPDATE документы SET отдел_id = ('
+        'SELECT min(отдел_id) FROM документы_отделов WHERE документ_id = документы.id)'
+    )
+    op.alter_column('документы', 'отдел_id', nullable=False)
+    op.add_column('документы', sa.Column('число_прочтений', sa.Integer(), server_default='0', nullable=False))
+    op.create_foreign_key('документы_отдел_id_fkey', 'документы', 'отделы', ['отдел_id'], ['id'])
+    op.drop_table('документы_отделов')
+
+    op.drop_constraint('документы_файл_id_fkey', 'документы', type_='foreignkey')
+    op.drop_column('документы', 'имя_файла')
+    op.drop_column('документы', 'файл_id')
+    op.drop_table('файлы')
@@ -0,0 +1,51 @@
+"""Индексы для частых запросов и уникальность подтверждения ознакомления
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:20:00
+
+Перед созданием уникального ограничения удаляются повторные подтверждения
+(остаётся самое раннее). Если такие были, пересчитайте счётчики:
+`flask rebuild-counters`. Проверка планов запросов: `flask check-indexes`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        'DELETE FROM прочтения_документов п USING прочтения_документов раньше '
+        'WHERE п.сотрудник_id = раньше.сотрудник_id '
+        'AND п.документ_id = раньше.документ_id AND п.id > раньше.id'
+    )
+    op.create_unique_constraint(
+        'uq_прочтения_сотрудник_документ', 'прочтения_документов', ['сотрудник_id', 'документ_id']
+    )
+    op.create_index(
+        'ix_прочтения_документ_id', 'прочтения_документов', ['документ_id', 'сотрудник_id'], unique=False
+    )
+    op.create_index(
+        'ix_документы_отделов_отдел_id', 'документы_отделов', ['отдел_id', 'документ_id'],
+        unique=False, postgresql_include=['число_прочтений']
+    )
+    op.create_index('ix_сотрудники_отдел_id', 'сотрудники', ['отдел_id'], unique=False)
+    op.create_index('ix_документы_дата_создания', 'документы', ['дата_создания'], unique=False)
+    op.create_index('ix_документы_тип_документа', 'документы', ['тип_документа'], unique=False)
+    op.create_index('ix_документы_файл_id', 'документы', ['файл_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_документы_файл_id', table_name='документы')
+    op.drop_index('ix_документы_тип_документа', table_name='документы')
+    op.drop_index('ix_документы_дата_создания', table_name='документы')
+    op.drop_index('ix_сотрудники_отдел_id', table_name='сотрудники')
+    op.drop_index('ix_документы_отделов_отдел_id', table_name='документы_отделов')
+    op.drop_index('ix_прочтения_документ_id', table_name='прочтения_документов')
+    op.drop_constraint('uq_прочтения_сотрудник_документ', 'прочтения_документов', type_='unique')
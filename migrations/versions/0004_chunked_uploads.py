@@ -0,0 +1,34 @@
+"""Загрузки файлов по частям
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('загрузки',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('сотрудник_id', sa.Integer(), nullable=False),
+        sa.Column('имя_файла', sa.String(length=255), nullable=False),
+        sa.Column('размер', sa.BigInteger(), nullable=False),
+        sa.Column('получено', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('дата_создания', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('дата_изменения', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['сотрудник_id'], ['сотрудники.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('загрузки')
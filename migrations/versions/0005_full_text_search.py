@@ -0,0 +1,43 @@
+"""Полнотекстовый поиск: извлечённый текст файлов и tsvector документов
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:40:00
+
+Векторы документов заполняются по названию сразу; текст файлов извлекает
+`flask extract-text`, после чего векторы дополняются.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('файлы', sa.Column('текст', sa.Text(), nullable=True))
+    op.add_column('файлы', sa.Column('версия_извлечения', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('файлы', sa.Column('ошибка_извлечения', sa.Text(), nullable=True))
+    op.create_index('ix_файлы_версия_извлечения', 'файлы', ['версия_извлечения'], unique=False)
+
+    op.add_column('документы', sa.Column('поисковый_вектор', postgresql.TSVECTOR(), nullable=True))
+    op.execute(
+        "UPDATE документы SET поисковый_вектор = "
+        "setweight(to_tsvector('russian', coalesce(название, '')), 'A')"
+    )
+    op.create_index('ix_документы_поиск', 'документы', ['поисковый_вектор'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_документы_поиск', table_name='документы')
+    op.drop_column('документы', 'поисковый_вектор')
+    op.drop_index('ix_файлы_версия_извлечения', table_name='файлы')
+    op.drop_column('файлы', 'ошибка_извлечения')
+    op.drop_column('файлы', 'версия_извлечения')
+    op.drop_column('файлы', 'текст')
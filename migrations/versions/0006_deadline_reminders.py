@@ -0,0 +1,37 @@
+"""Напоминания о сроке ознакомления
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 12:50:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('напоминания',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('сотрудник_id', sa.Integer(), nullable=False),
+        sa.Column('документ_id', sa.Integer(), nullable=False),
+        sa.Column('дата_отправки', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['сотрудник_id'], ['сотрудники.id'], ),
+        sa.ForeignKeyConstraint(['документ_id'], ['документы.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('сотрудник_id', 'документ_id', name='uq_напоминания_сотрудник_документ')
+    )
+    op.create_index('ix_напоминания_документ_id', 'напоминания', ['документ_id'], unique=False)
+    op.create_index('ix_документы_срок_ознакомления', 'документы', ['срок_ознакомления'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_документы_срок_ознакомления', table_name='документы')
+    op.drop_index('ix_напоминания_документ_id', table_name='напоминания')
+    op.drop_table('напоминания')
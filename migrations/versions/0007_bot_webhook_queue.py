@@ -0,0 +1,44 @@
+"""Очередь обновлений бота для режима webhook и состояния диалогов
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('обновления_бота',
+        sa.Column('update_id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('данные', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('занято_до', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('попыток', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('дата_создания', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('update_id')
+    )
+    op.create_index('ix_обновления_бота_chat_id', 'обновления_бота', ['chat_id', 'update_id'], unique=False)
+    op.create_table('состояния_диалогов',
+        sa.Column('диалог', sa.String(length=50), nullable=False),
+        sa.Column('telegram_id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('состояние', sa.Integer(), nullable=False),
+        sa.Column('данные', postgresql.JSONB(astext_type=sa.Text()), server_default='{}', nullable=False),
+        sa.Column('дата_изменения', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('диалог', 'telegram_id')
+    )
+
+
+def downgrade():
+    op.drop_table('состояния_диалогов')
+    op.drop_index('ix_обновления_бота_chat_id', table_name='обновления_бота')
+    op.drop_table('обновления_бота')
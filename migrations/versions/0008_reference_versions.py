@@ -0,0 +1,32 @@
+"""Версии справочников для кэша в процессах веб-приложения и бота
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('версии_справочников',
+        sa.Column('справочник', sa.String(length=50), nullable=False),
+        sa.Column('версия', sa.BigInteger(), server_default='1', nullable=False),
+        sa.PrimaryKeyConstraint('справочник')
+    )
+    op.execute(
+        "INSERT INTO версии_справочников (справочник) "
+        "VALUES ('отделы'), ('типы_документов'), ('сотрудники')"
+    )
+
+
+def downgrade():
+    op.drop_table('версии_справочников')
@@ -0,0 +1,133 @@
+"""Секции журнала прочтений по месяцам и архив документов
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+# Секции создаются от самого раннего прочтения до текущего месяца и на столько месяцев вперёд
+AHEAD_MONTHS = 3
+
+
+def upgrade():
+    # Дата прочтения становится ключом секционирования и не может быть пустой;
+    # прочтение без даты получает дату создания документа
+    op.execute("""
+        UPDATE документы SET дата_создания = COALESCE(
+            (SELECT min(п.дата_прочтения) FROM прочтения_документов п WHERE п.документ_id = документы.id),
+            timezone('utc', now())
+        )
+        WHERE дата_создания IS NULL
+    """)
+    op.execute('ALTER TABLE прочтения_документов RENAME TO прочтения_документов_старые')
+    op.execute('ALTER TABLE прочтения_документов_старые DROP CONSTRAINT прочтения_документов_pkey')
+    op.execute('ALTER TABLE прочтения_документов_старые DROP CONSTRAINT uq_прочтения_сотрудник_документ')
+    op.execute('DROP INDEX ix_прочтения_документ_id')
+
+    op.execute("""
+        CREATE TABLE прочтения_документов (
+            id integer NOT NULL DEFAULT nextval('прочтения_документов_id_seq'::regclass),
+            сотрудник_id integer NOT NULL REFERENCES сотрудники (id),
+            документ_id integer NOT NULL REFERENCES документы (id),
+            дата_прочтения timestamp without time zone NOT NULL DEFAULT timezone('utc', now()),
+            подтверждено boolean,
+            CONSTRAINT прочтения_документов_pkey PRIMARY KEY (id, дата_прочтения)
+        ) PARTITION BY RANGE (дата_прочтения)
+    """)
+    op.execute('CREATE TABLE прочтения_документов_прочие PARTITION OF прочтения_документов DEFAULT')
+    op.execute(f"""
+        DO $$
+        DECLARE
+            месяц date;
+        BEGIN
+            FOR месяц IN SELECT generate_series(
+                date_trunc('month', LEAST(
+                    (SELECT min(дата_прочтения) FROM прочтения_документов_старые), timezone('utc', now())
+                )),
+                date_trunc('month', timezone('utc', now())) + interval '{AHEAD_MONTHS} months',
+                interval '1 month'
+            )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF прочтения_документов FOR VALUES FROM (%L) TO (%L)',
+                    'прочтения_документов_' || to_char(месяц, 'YYYY_MM'), месяц, месяц + interval '1 month'
+                );
+            END LOOP;
+        END $$
+    """)
+    op.execute("""
+        INSERT INTO прочтения_документов (id, сотрудник_id, документ_id, дата_прочтения, подтверждено)
+        SELECT п.id, п.сотрудник_id, п.документ_id, COALESCE(п.дата_прочтения, д.дата_создания), п.подтверждено
+        FROM прочтения_документов_старые п
+        JOIN документы д ON д.id = п.документ_id
+    """)
+    op.execute('ALTER SEQUENCE прочтения_документов_id_seq OWNED BY прочтения_документов.id')
+    op.execute('DROP TABLE прочтения_документов_старые')
+    # Индексы после загрузки строк: так быстрее, чем обновлять их на каждой вставке
+    op.create_index('ix_прочтения_сотрудник_документ', 'прочтения_документов', ['сотрудник_id', 'документ_id'],
+                    unique=False)
+    op.create_index('ix_прочтения_документ_id', 'прочтения_документов', ['документ_id', 'сотрудник_id'],
+                    unique=False)
+    op.execute('ANALYZE прочтения_документов')
+
+    op.create_table('архив_документов',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('название', sa.String(length=255), nullable=False),
+        sa.Column('тип_документа', sa.String(length=50), nullable=True),
+        sa.Column('дата_создания', sa.DateTime(), nullable=False),
+        sa.Column('срок_ознакомления', sa.Date(), nullable=True),
+        sa.Column('имя_файла', sa.String(length=255), nullable=True),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('размер', sa.BigInteger(), nullable=True),
+        sa.Column('qr_код', sa.String(length=255), nullable=True),
+        sa.Column('пакет', sa.String(length=255), nullable=False),
+        sa.Column('адресаты', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('прочтений', sa.Integer(), nullable=False),
+        sa.Column('дата_архивации', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_архив_документов_дата_создания', 'архив_документов', ['дата_создания'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_архив_документов_дата_создания', table_name='архив_документов')
+    op.drop_table('архив_документов')
+
+    op.execute('ALTER TABLE прочтения_документов RENAME TO прочтения_документов_секции')
+    op.execute('ALTER TABLE прочтения_документов_секции DROP CONSTRAINT прочтения_документов_pkey')
+    op.execute('DROP INDEX ix_прочтения_сотрудник_документ')
+    op.execute('DROP INDEX ix_прочтения_документ_id')
+    op.execute("""
+        CREATE TABLE прочтения_документов (
+            id integer NOT NULL DEFAULT nextval('прочтения_документов_id_seq'::regclass),
+            сотрудник_id integer NOT NULL REFERENCES сотрудники (id),
+            документ_id integer NOT NULL REFERENCES документы (id),
+            дата_прочтения timestamp without time zone,
+            подтверждено boolean,
+            CONSTRAINT прочтения_документов_pkey PRIMARY KEY (id)
+        )
+    """)
+    # Без уникального индекса дубли были возможны; при возврате остаётся самое раннее прочтение
+    op.execute("""
+        INSERT INTO прочтения_документов (id, сотрудник_id, документ_id, дата_прочтения, подтверждено)
+        SELECT DISTINCT ON (сотрудник_id, документ_id) id, сотрудник_id, документ_id, дата_прочтения, подтверждено
+        FROM прочтения_документов_секции
+        ORDER BY сотрудник_id, документ_id, дата_прочтения
+    """)
+    op.execute('ALTER SEQUENCE прочтения_документов_id_seq OWNED BY прочтения_документов.id')
+    op.execute('DROP TABLE прочтения_документов_секции')
+    op.create_unique_constraint('uq_прочтения_сотрудник_документ', 'прочтения_документов',
+                                ['сотрудник_id', 'документ_id'])
+    op.create_index('ix_прочтения_документ_id', 'прочтения_документов', ['документ_id', 'сотрудник_id'],
+                    unique=False)
@@ -0,0 +1,44 @@
+"""Дата создания документов в UTC
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 16:00:00
+
+"""
+import os
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def _часовой_пояс():
+    """Пояс, в котором веб-приложение записывало дату создания (datetime.now()).
+
+    Переменная TZ процесса, иначе часовой пояс сеанса базы: сервер приложения
+    и база обычно работают в одном поясе.
+    """
+    return os.environ.get('TZ') or op.get_bind().scalar(sa.text("SELECT current_setting('TimeZone')"))
+
+
+def upgrade():
+    # Прочтения всегда записывались в UTC, а дата создания документа - в местном
+    # времени; сравнения дат документа и прочтений требуют одного пояса
+    for table in ('документы', 'архив_документов'):
+        op.execute(sa.text(
+            f"UPDATE {table} SET дата_создания = (дата_создания AT TIME ZONE :zone) AT TIME ZONE 'UTC'"
+        ).bindparams(zone=_часовой_пояс()))
+    op.alter_column('архив_документов', 'дата_архивации', server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade():
+    op.alter_column('архив_документов', 'дата_архивации', server_default=sa.text('now()'))
+    for table in ('документы', 'архив_документов'):
+        op.execute(sa.text(
+            f"UPDATE {table} SET дата_создания = (дата_создания AT TIME ZONE 'UTC') AT TIME ZONE :zone"
+        ).bindparams(zone=_часовой_пояс()))
@@ -0,0 +1,40 @@
+"""Время в очереди уведомлений по умолчанию в UTC
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 17:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def _часовой_пояс():
+    """Часовой пояс сеанса базы, в котором now() записывал значения по умолчанию"""
+    return op.get_bind().scalar(sa.text("SELECT current_setting('TimeZone')"))
+
+
+def upgrade():
+    op.alter_column('уведомления', 'следующая_попытка', server_default=sa.text("timezone('utc', now())"))
+    op.alter_column('уведомления', 'дата_создания', server_default=sa.text("timezone('utc', now())"))
+    # Рассыльщик записывает следующую попытку в UTC сам; значение по умолчанию
+    # осталось только у ещё не забранных уведомлений, у них оно равно дате создания
+    op.execute(sa.text("""
+        UPDATE уведомления SET
+            дата_создания = (дата_создания AT TIME ZONE :zone) AT TIME ZONE 'UTC',
+            следующая_попытка = CASE WHEN следующая_попытка = дата_создания
+                THEN (следующая_попытка AT TIME ZONE :zone) AT TIME ZONE 'UTC'
+                ELSE следующая_попытка END
+    """).bindparams(zone=_часовой_пояс()))
+
+
+def downgrade():
+    op.alter_column('уведомления', 'следующая_попытка', server_default=sa.text('now()'))
+    op.alter_column('уведомления', 'дата_создания', server_default=sa.text('now()'))
@@ -0,0 +1,31 @@
+"""Время в очереди обновлений бота по умолчанию в UTC
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('обновления_бота', 'занято_до', server_default=sa.text("timezone('utc', now())"))
+    op.alter_column('обновления_бота', 'дата_создания', server_default=sa.text("timezone('utc', now())"))
+    # Ещё не забранные обновления с местным временем по умолчанию готовы к обработке сразу
+    op.execute("""
+        UPDATE обновления_бота SET занято_до = LEAST(занято_до, timezone('utc', now()))
+        WHERE попыток = 0
+    """)
+
+
+def downgrade():
+    op.alter_column('обновления_бота', 'занято_до', server_default=sa.text('now()'))
+    op.alter_column('обновления_бота', 'дата_создания', server_default=sa.text('now()'))
@@ -0,0 +1,24 @@
+"""Аренда файла на время извлечения текста
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18 19:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('файлы', sa.Column('извлечение_до', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('файлы', 'извлечение_до')
@@ -1,6 +1,7 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from extensions import db
 
 class Организация(db.Model):
@@ -14,13 +15,14 @@ class Отдел(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     название = db.Column(db.String(255), nullable=False)
     организация_id = db.Column(db.Integer, db.ForeignKey('организации.id'), nullable=False)
+    число_сотрудников = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Счётчик, см. counters.py
     сотрудники = db.relationship('Сотрудник', backref='отдел', lazy=True)
-    документы = db.relationship('Документ', backref='отдел', lazy=True)
+    адресаты = db.relationship('ДокументОтдела', backref='отдел', lazy=True)
 
 class Сотрудник(UserMixin, db.Model):
     __tablename__ = 'сотрудники'
     id = db.Column(db.Integer, primary_key=True)
-    отдел_id = db.Column(db.Integer, db.ForeignKey('отделы.id'), nullable=False)
+    отдел_id = db.Column(db.Integer, db.ForeignKey('отделы.id'), nullable=False, index=True)
     telegram_id = db.Column(db.BigInteger, unique=True)
     фамилия = db.Column(db.String(100), nullable=False)
     имя = db.Column(db.String(100), nullable=False)
@@ -32,6 +34,7 @@ class Сотрудник(UserMixin, db.Model):
     пароль = db.Column(db.String(255), nullable=False)
     роль = db.Column(db.String(20), default='сотрудник')  # администратор, руководитель, сотрудник
     статус_регистрации = db.Column(db.Boolean, default=False)
+    число_непрочитанных = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Счётчик, см. counters.py
     прочтения = db.relationship('ПрочтениеДокумента', backref='сотрудник', lazy=True)
 
     @property
@@ -40,22 +43,160 @@ class Сотрудник(UserMixin, db.Model):
             return f"{self.фамилия} {self.имя} {self.отчество}"
         return f"{self.фамилия} {self.имя}"
 
+# Файл в хранилище, адресуемом по содержимому (см. storage.py)
+class Файл(db.Model):
+    __tablename__ = 'файлы'
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    размер = db.Column(db.BigInteger, nullable=False)
+    число_ссылок = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    дата_создания = db.Column(db.DateTime, default=datetime.utcnow)
+    # Извлечённый текст для полнотекстового поиска (см. text_extraction.py)
+    текст = db.deferred(db.Column(db.Text))
+    версия_извлечения = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
+    # Файл забран обработчиком extract-text до этого времени (UTC)
+    извлечение_до = db.Column(db.DateTime)
+    ошибка_извлечения = db.Column(db.Text)
+    документы = db.relationship('Документ', backref='файл', lazy=True)
+
 class Документ(db.Model):
     __tablename__ = 'документы'
+    __table_args__ = (
+        db.Index('ix_документы_поиск', 'поисковый_вектор', postgresql_using='gin'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    отдел_id = db.Column(db.Integer, db.ForeignKey('отделы.id'), nullable=False)
     название = db.Column(db.String(255), nullable=False)
-    путь_к_файлу = db.Column(db.Text)
-    срок_ознакомления = db.Column(db.Date)
-    тип_документа = db.Column(db.String(50))
-    дата_создания = db.Column(db.DateTime, default=datetime.utcnow)
+    файл_id = db.Column(db.Integer, db.ForeignKey('файлы.id'), index=True)
+    путь_к_файлу = db.Column(db.Text)  # Относительно UPLOAD_FOLDER
+    имя_файла = db.Column(db.String(255))  # Исходное имя файла для скачивания
+    срок_ознакомления = db.Column(db.Date, index=True)
+    тип_документа = db.Column(db.String(50), index=True)
+    дата_создания = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     qr_код = db.Column(db.String(255))
+    поисковый_вектор = db.deferred(db.Column(TSVECTOR))  # Название и текст файла, см. search.py
+    адресаты = db.relationship('ДокументОтдела', backref='документ', lazy=True,
+                               cascade='all, delete-orphan')
     прочтения = db.relationship('ПрочтениеДокумента', backref='документ', lazy=True)
 
+    @property
+    def имя_для_скачивания(self):
+        if self.имя_файла:
+            return self.имя_файла
+        return self.путь_к_файлу.split('_', 2)[-1]
+
+# Отдел, которому адресован документ
+class ДокументОтдела(db.Model):
+    __tablename__ = 'документы_отделов'
+    __table_args__ = (
+        db.UniqueConstraint('документ_id', 'отдел_id', name='uq_документы_отделов'),
+        # Документы отдела вместе со счётчиком без обращения к таблице
+        db.Index('ix_документы_отделов_отдел_id', 'отдел_id', 'документ_id',
+                 postgresql_include=['число_прочтений']),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    документ_id = db.Column(db.Integer, db.ForeignKey('документы.id'), nullable=False)
+    отдел_id = db.Column(db.Integer, db.ForeignKey('отделы.id'), nullable=False)
+    число_прочтений = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Счётчик, см. counters.py
+
 class ПрочтениеДокумента(db.Model):
     __tablename__ = 'прочтения_документов'
-    id = db.Column(db.Integer, primary_key=True)
+    __table_args__ = (
+        # Секции по месяцам дата_прочтения, см. read_partitions.py. Уникальный индекс
+        # без даты в секционированной таблице невозможен: одно подтверждение
+        # на сотрудника и документ обеспечивает repository.подтвердить_прочтение
+        db.Index('ix_прочтения_сотрудник_документ', 'сотрудник_id', 'документ_id'),
+        db.Index('ix_прочтения_документ_id', 'документ_id', 'сотрудник_id'),
+        {'postgresql_partition_by': 'RANGE (дата_прочтения)'},
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     сотрудник_id = db.Column(db.Integer, db.ForeignKey('сотрудники.id'), nullable=False)
     документ_id = db.Column(db.Integer, db.ForeignKey('документы.id'), nullable=False)
-    дата_прочтения = db.Column(db.DateTime, default=datetime.utcnow)
+    дата_прочтения = db.Column(db.DateTime, primary_key=True, default=datetime.utcnow)
     подтверждено = db.Column(db.Boolean, default=False)
+
+# Очередь исходящих сообщений в Telegram (outbox), её разбирает бот
+class Уведомление(db.Model):
+    __tablename__ = 'уведомления'
+    __table_args__ = (
+        db.Index('ix_уведомления_очередь', 'статус', 'следующая_попытка'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    сотрудник_id = db.Column(db.Integer, db.ForeignKey('сотрудники.id'), nullable=False)
+    документ_id = db.Column(db.Integer, db.ForeignKey('документы.id'))
+    chat_id = db.Column(db.BigInteger, nullable=False)
+    текст = db.Column(db.Text, nullable=False)
+    статус = db.Column(db.String(20), nullable=False, server_default='ожидает')  # ожидает, отправлено, ошибка
+    попыток = db.Column(db.Integer, nullable=False, server_default='0')
+    # Рассыльщик сравнивает с datetime.utcnow(), поэтому и значения по умолчанию в UTC
+    следующая_попытка = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
+    ошибка = db.Column(db.Text)
+    дата_создания = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
+    дата_отправки = db.Column(db.DateTime)
+
+# Незавершённая загрузка файла по частям (см. chunked_upload.py)
+class Загрузка(db.Model):
+    __tablename__ = 'загрузки'
+    id = db.Column(db.String(32), primary_key=True)
+    сотрудник_id = db.Column(db.Integer, db.ForeignKey('сотрудники.id'), nullable=False)
+    имя_файла = db.Column(db.String(255), nullable=False)
+    размер = db.Column(db.BigInteger, nullable=False)  # Заявленный клиентом размер файла
+    получено = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # Подтверждённое смещение
+    дата_создания = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
+    дата_изменения = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
+
+# Отправленное напоминание о сроке ознакомления (см. reminders.py)
+class НапоминаниеОСроке(db.Model):
+    __tablename__ = 'напоминания'
+    __table_args__ = (
+        db.UniqueConstraint('сотрудник_id', 'документ_id', name='uq_напоминания_сотрудник_документ'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    сотрудник_id = db.Column(db.Integer, db.ForeignKey('сотрудники.id'), nullable=False)
+    документ_id = db.Column(db.Integer, db.ForeignKey('документы.id'), nullable=False, index=True)
+    дата_отправки = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+
+# Входящее обновление Telegram в режиме webhook; очередь разбирают процессы бота (см. update_queue.py)
+class ОбновлениеБота(db.Model):
+    __tablename__ = 'обновления_бота'
+    __table_args__ = (
+        db.Index('ix_обновления_бота_chat_id', 'chat_id', 'update_id'),
+    )
+    update_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    chat_id = db.Column(db.BigInteger, nullable=False)
+    данные = db.Column(JSONB, nullable=False)
+    # Очередь сравнивает с datetime.utcnow(), поэтому и значения по умолчанию в UTC
+    занято_до = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
+    попыток = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    дата_создания = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
+
+# Шаг диалога с пользователем бота, общий для всех процессов бота (см. conversations.py)
+class СостояниеДиалога(db.Model):
+    __tablename__ = 'состояния_диалогов'
+    диалог = db.Column(db.String(50), primary_key=True)
+    telegram_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    состояние = db.Column(db.Integer, nullable=False)
+    данные = db.Column(JSONB, nullable=False, server_default='{}')
+    дата_изменения = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.func.now())
+
+# Версия справочника: меняется вместе с данными, по ней процессы сбрасывают свой кэш (см. reference_cache.py)
+class ВерсияСправочника(db.Model):
+    __tablename__ = 'версии_справочников'
+    справочник = db.Column(db.String(50), primary_key=True)
+    версия = db.Column(db.BigInteger, nullable=False, default=1, server_default='1')
+
+# Документ, перенесённый в архив (archive.py): файл, QR-код и прочтения лежат в пакете
+class АрхивныйДокумент(db.Model):
+    __tablename__ = 'архив_документов'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # id исходного документа
+    название = db.Column(db.String(255), nullable=False)
+    тип_документа = db.Column(db.String(50))
+    дата_создания = db.Column(db.DateTime, nullable=False, index=True)
+    срок_ознакомления = db.Column(db.Date)
+    имя_файла = db.Column(db.String(255))
+    sha256 = db.Column(db.String(64))  # Файл в пакете: files/<sha256>
+    размер = db.Column(db.BigInteger)
+    qr_код = db.Column(db.String(255))  # QR-код на диске в пакете: qr/<qr_код>
+    пакет = db.Column(db.String(255), nullable=False)  # ZIP-файл в ARCHIVE_FOLDER
+    адресаты = db.Column(JSONB, nullable=False)  # [{отдел, всего, прочитали}] на момент архивации
+    прочтений = db.Column(db.Integer, nullable=False)
+    дата_архивации = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
@@ -0,0 +1,49 @@
+from extensions import db
+from models import Сотрудник, ДокументОтдела, Уведомление
+
+
+def текст_нового_документа(документ):
+    """Текст уведомления о новом документе"""
+    return (
+        f"📄 Опубликован новый документ!\n\n"
+        f"Название: {документ.название}\n"
+        f"Тип: {документ.тип_документа}\n"
+        f"Срок ознакомления: {документ.срок_ознакомления.strftime('%d.%m.%Y')}\n\n"
+        f"Пожалуйста, ознакомьтесь с документом в системе и подтвердите ознакомление, отсканировав QR-код."
+    )
+
+
+def поставить_в_очередь(сотрудники_query, текст, документ_id=None):
+    """Поставить сообщение в очередь для сотрудников из запроса одним INSERT ... SELECT.
+
+    Выполняется в текущей транзакции: уведомления появятся в очереди
+    только вместе с коммитом данных, к которым они относятся.
+    """
+    получатели = сотрудники_query.filter(
+        Сотрудник.статус_регистрации == True,
+        Сотрудник.telegram_id != None
+    ).with_entities(
+        Сотрудник.id,
+        Сотрудник.telegram_id,
+        db.literal(текст, db.Text),
+        db.literal(документ_id, db.Integer)
+    )
+    result = db.session.execute(
+        db.insert(Уведомление).from_select(
+            ['сотрудник_id', 'chat_id', 'текст', 'документ_id'],
+            получатели.statement
+        )
+    )
+    return result.rowcount
+
+
+def уведомить_о_документе(документ):
+    """Поставить в очередь уведомления о новом документе сотрудникам отделов-адресатов"""
+    отделы = db.session.query(ДокументОтдела.отдел_id).filter(
+        ДокументОтдела.документ_id == документ.id
+    )
+    return поставить_в_очередь(
+        Сотрудник.query.filter(Сотрудник.отдел_id.in_(отделы)),
+        текст_нового_документа(документ),
+        документ.id
+    )
@@ -0,0 +1,141 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import current_app, request, url_for
+from extensions import db
+
+
+class Page:
+    """Страница результатов с курсорами на соседние страницы"""
+
+    def __init__(self, items, sort, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.sort = sort
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise ValueError('Неизвестный тип значения курсора')
+    return value
+
+
+def encode_cursor(sort, values):
+    """Кодирование ключа сортировки строки в курсор для URL"""
+    payload = json.dumps({'s': sort, 'v': [_encode_value(v) for v in values]},
+                         ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(sort, cursor):
+    """Декодирование курсора; None, если курсор пуст, повреждён или от другой сортировки"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        if payload.get('s') != sort or len(payload.get('v', [])) != 2:
+            return None
+        return [_decode_value(v) for v in payload['v']]
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def get_page_args(sort_options, default_sort, prefix=''):
+    """Параметры страницы из запроса: сортировка, курсор, направление и размер"""
+    sort = request.args.get(f'{prefix}sort')
+    if sort not in sort_options:
+        sort = default_sort
+    per_page = request.args.get(f'{prefix}per_page', type=int) or current_app.config['PAGE_SIZE']
+    per_page = max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+    direction = 'prev' if request.args.get(f'{prefix}direction') == 'prev' else 'next'
+    return {
+        'sort': sort,
+        'cursor': request.args.get(f'{prefix}cursor'),
+        'direction': direction,
+        'per_page': per_page,
+    }
+
+
+def paginate_keyset(query, sort, sort_expr, id_expr, descending=False,
+                    cursor=None, direction='next', per_page=None):
+    """Keyset-пагинация запроса по (sort_expr, id_expr).
+
+    Вместо OFFSET используется сравнение кортежей с ключом последней
+    показанной строки, поэтому стоимость страницы не зависит от её номера.
+    Возвращает Page, элементы которой - строки исходного запроса.
+    """
+    per_page = per_page or current_app.config['PAGE_SIZE']
+    values = decode_cursor(sort, cursor)
+    backwards = direction == 'prev' and values is not None
+
+    query = query.add_columns(sort_expr.label('_sort_key'), id_expr.label('_sort_id'))
+    if values is not None:
+        key = db.tuple_(sort_expr, id_expr)
+        bound = db.tuple_(db.literal(values[0], sort_expr.type), db.literal(values[1], id_expr.type))
+        query = query.filter(key < bound if descending != backwards else key > bound)
+
+    if descending != backwards:
+        query = query.order_by(sort_expr.desc(), id_expr.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), id_expr.asc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor_of(row):
+        return encode_cursor(sort, (row[-2], row[-1]))
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            next_cursor = cursor_of(rows[-1])
+            prev_cursor = cursor_of(rows[0]) if has_more else None
+        else:
+            next_cursor = cursor_of(rows[-1]) if has_more else None
+            prev_cursor = cursor_of(rows[0]) if values is not None else None
+
+    items = [row[0] if len(row) == 3 else tuple(row[:-2]) for row in rows]
+    return Page(items, sort, per_page, next_cursor, prev_cursor)
+
+
+def page_url(cursor, direction, prefix=''):
+    """URL соседней страницы с сохранением остальных параметров запроса"""
+    args = request.args.to_dict()
+    args[f'{prefix}cursor'] = cursor
+    args[f'{prefix}direction'] = direction
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
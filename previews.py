@@ -0,0 +1,255 @@
+"""Превью документов: уменьшенная первая страница и начало текста.
+
+PDF рисуется утилитой pdftoppm (poppler-utils), изображения уменьшаются
+как есть, для остальных форматов рисуется страница из начала извлечённого
+текста. Готовые превью лежат в кэше на диске (PREVIEW_CACHE_DIR) размером
+не больше PREVIEW_CACHE_SIZE: при переполнении удаляются давно не
+запрашивавшиеся файлы, время последнего запроса - mtime файла.
+
+Ключ превью строится по пути файла в хранилище, а путь - по SHA-256
+содержимого, поэтому URL превью меняется только вместе с файлом
+и может кэшироваться браузером без перепроверки. Превью рисует только
+flask extract-text сразу после извлечения текста, а не запрос страницы:
+отрисовка PDF может занять до минуты. Если превью ещё нет или оно
+вытеснено из кэша, запрос получает 404 с коротким сроком кэширования,
+а файл снова ставится в очередь extract-text.
+"""
+import hashlib
+import io
+import os
+import subprocess
+import tempfile
+import time
+from flask import current_app, url_for
+from extensions import db
+from models import Документ, Файл
+
+# Увеличить, если изменится способ отрисовки: сменятся ключи и URL всех превью
+PREVIEW_VERSION = 1
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png'),
+}
+
+# Срок кэширования ответа "превью ещё нет", секунд
+MISS_MAX_AGE = 60
+
+# mtime обновляется не чаще, чем раз в час, чтобы не писать на диск на каждый запрос
+TOUCH_INTERVAL = 3600
+
+# Страница текста рисуется крупно и уменьшается, чтобы превью походило на лист
+TEXT_PAGE_WIDTH = 640
+TEXT_PAGE_CHARS = 1500
+
+
+def настройки_превью():
+    """Настройки для процессов пула, где нет контекста приложения"""
+    config = current_app.config
+    return {
+        'cache_dir': config['PREVIEW_CACHE_DIR'],
+        'max_bytes': config['PREVIEW_CACHE_SIZE'],
+        'width': config['PREVIEW_WIDTH'],
+        'font_path': config['QR_SHEET_FONT'],
+    }
+
+
+def ключ_превью(путь_к_файлу, width):
+    digest = hashlib.sha256(путь_к_файлу.encode('utf-8')).hexdigest()[:20]
+    return f'{digest}-{PREVIEW_VERSION}-{width}'
+
+
+def _имя_в_кэше(ключ, fmt):
+    return f'{ключ}.{fmt}'
+
+
+def _pdf(path, width):
+    from PIL import Image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, 'page')
+        subprocess.run(
+            ['pdftoppm', '-f', '1', '-l', '1', '-singlefile', '-png',
+             '-scale-to-x', str(width), '-scale-to-y', '-1', path, out],
+            check=True, capture_output=True, timeout=60
+        )
+        image = Image.open(out + '.png')
+        image.load()
+    return image
+
+
+def _изображение(path, width):
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        image = Image.open(path)
+        # JPEG декодируется сразу в уменьшенном масштабе
+        image.draft('RGB', (width * 2, width * 4))
+        image.load()
+        return image
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+def _страница_текста(текст, font_path):
+    from PIL import Image, ImageDraw
+    from qr_sheets import _font, _wrap
+
+    width, height = TEXT_PAGE_WIDTH, int(TEXT_PAGE_WIDTH * 1.414)
+    page = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    font = _font(font_path, 18)
+    y = 40
+    for paragraph in текст[:TEXT_PAGE_CHARS].splitlines():
+        for line in _wrap(draw, paragraph, font, width - 80):
+            if y > height - 60:
+                return page
+            draw.text((40, y), line, font=font, fill=0)
+            y += 24
+    return page
+
+
+def рендер_превью(path, текст, fmt, width, font_path):
+    """Превью файла в формате fmt шириной width; None, если рисовать нечего"""
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    if head.startswith(b'%PDF'):
+        image = _pdf(path, width)
+    else:
+        image = _изображение(path, width)
+        if image is None:
+            if not текст:
+                return None
+            image = _страница_текста(текст, font_path)
+
+    image = image.convert('RGB' if image.mode not in ('L', 'RGB') else image.mode)
+    image.thumbnail((width, width * 2))
+    buffer = io.BytesIO()
+    pil_format = FORMATS[fmt][0]
+    if pil_format == 'WEBP':
+        image.save(buffer, pil_format, quality=80, method=4)
+    else:
+        image.save(buffer, pil_format, optimize=True)
+    return buffer.getvalue()
+
+
+def _вытеснить(cache_dir, max_bytes):
+    """Удалить давно не запрашивавшиеся превью, пока кэш не станет меньше 90% предела"""
+    entries, total = [], 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    if total <= max_bytes:
+        return
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # Уже удалил другой процесс
+        total -= size
+
+
+def _записать(cache_dir, name, data, max_bytes):
+    data = data or b''
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, os.path.join(cache_dir, name))
+    _вытеснить(cache_dir, max_bytes)
+
+
+def _из_кэша(cache_dir, name):
+    """Содержимое превью из кэша или None; файл может быть вытеснен в любой момент"""
+    path = os.path.join(cache_dir, name)
+    try:
+        with open(path, 'rb') as f:
+            mtime = os.fstat(f.fileno()).st_mtime
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    now = time.time()
+    if now - mtime > TOUCH_INTERVAL:
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            pass
+    return data
+
+
+def создать_превью(путь_к_файлу, path, текст, настройки):
+    """Нарисовать превью во всех форматах и положить в кэш; выполняется в процессе пула.
+
+    Возвращает текст ошибки или None.
+    """
+    ключ = ключ_превью(путь_к_файлу, настройки['width'])
+    try:
+        for fmt in FORMATS:
+            name = _имя_в_кэше(ключ, fmt)
+            if os.path.exists(os.path.join(настройки['cache_dir'], name)):
+                continue
+            data = рендер_превью(path, текст, fmt, настройки['width'], настройки['font_path'])
+            # Пустая запись в кэше - "рисовать нечего": такой файл не заказывается снова
+            _записать(настройки['cache_dir'], name, data, настройки['max_bytes'])
+    except Exception as e:
+        return f'{type(e).__name__}: {e}'[:1000]
+    return None
+
+
+def заказать_превью(документ):
+    """Поставить файл документа в очередь extract-text, чтобы превью нарисовалось заново.
+
+    Файл, ещё ожидающий обработки, не меняется; файлы, загруженные до
+    появления хранилища, в очереди не участвуют.
+    """
+    if not документ.файл_id:
+        return
+    db.session.execute(
+        db.update(Файл).where(Файл.id == документ.файл_id, Файл.версия_извлечения > 0).values(
+            версия_извлечения=0
+        ),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+
+
+def превью_документа(документ, fmt):
+    """Превью документа (байты) из кэша или None.
+
+    При промахе превью заказывается у extract-text (заказать_превью):
+    запрос страницы его не рисует.
+    """
+    if not документ.путь_к_файлу:
+        return None
+    настройки = настройки_превью()
+    name = _имя_в_кэше(ключ_превью(документ.путь_к_файлу, настройки['width']), fmt)
+    data = _из_кэша(настройки['cache_dir'], name)
+    if data is None:
+        заказать_превью(документ)
+    return data or None
+
+
+def preview_url(документ, fmt='webp'):
+    """URL превью документа с ключом по содержимому файла"""
+    ключ = ключ_превью(документ.путь_к_файлу, current_app.config['PREVIEW_WIDTH'])
+    return url_for('main.document_preview', document_id=документ.id, key=ключ, fmt=fmt)
+
+
+def фрагменты_документов(ids):
+    """{id документа: начало текста его файла} одним запросом"""
+    if not ids:
+        return {}
+    return dict(db.session.query(
+        Документ.id,
+        db.func.left(Файл.текст, current_app.config['PREVIEW_SNIPPET_CHARS'])
+    ).join(
+        Файл, Файл.id == Документ.файл_id
+    ).filter(
+        Документ.id.in_(ids), Файл.текст.isnot(None), Файл.текст != ''
+    ))
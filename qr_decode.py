@@ -0,0 +1,107 @@
+"""Распознавание QR-кодов на фотографиях вне цикла событий бота.
+
+Декодирование выполняется в ограниченном пуле процессов. Если QR-код
+не найден на исходном снимке, изображение последовательно
+предобрабатывается (оттенки серого, контраст, порог, поворот).
+"""
+import asyncio
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from pyzbar.pyzbar import decode, ZBarSymbol
+from config import Config
+from metrics import QR_QUEUE_DEPTH, QR_DECODED, QR_FAILED
+
+logger = logging.getLogger(__name__)
+
+
+def _gray(image):
+    return ImageOps.grayscale(image)
+
+
+def _autocontrast(image):
+    return ImageOps.autocontrast(ImageOps.grayscale(image), cutoff=2)
+
+
+def _threshold(image):
+    gray = ImageOps.autocontrast(ImageOps.grayscale(image), cutoff=2)
+    # Порог по среднему уровню яркости, устойчивее фиксированного при плохом освещении
+    histogram = gray.histogram()
+    total = sum(histogram)
+    mean = sum(i * count for i, count in enumerate(histogram)) / total if total else 128
+    return gray.point(lambda p: 255 if p > mean else 0)
+
+
+def _rotate(image):
+    return ImageOps.grayscale(image).rotate(45, expand=True, fillcolor=255)
+
+
+# Этапы предобработки в порядке возрастания стоимости
+STAGES = [
+    ('original', lambda image: image),
+    ('grayscale', _gray),
+    ('autocontrast', _autocontrast),
+    ('threshold', _threshold),
+    ('rotate45', _rotate),
+]
+
+
+def decode_qr(image_bytes):
+    """Распознать QR-код; возвращает (данные, этап) или (None, None)"""
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    for stage, prepare in STAGES:
+        decoded = decode(prepare(image), symbols=[ZBarSymbol.QRCODE])
+        if decoded:
+            return decoded[0].data.decode('utf-8'), stage
+    return None, None
+
+
+def выбрать_размеры(photo_sizes, first_side=None):
+    """Порядок попыток по размерам фото: сначала уменьшенный, затем самый большой"""
+    first_side = first_side or Config.QR_DECODE_FIRST_SIDE
+    sizes = sorted(photo_sizes, key=lambda p: p.width * p.height)
+    if not sizes:
+        return []
+    largest = sizes[-1]
+    first = next((p for p in sizes if max(p.width, p.height) >= first_side), largest)
+    return [first] if first is largest else [first, largest]
+
+
+class QRDecoder:
+    """Пул распознавания с ограничением очереди; глубина очереди и итоги - в метриках"""
+
+    def __init__(self, workers=None, max_pending=None):
+        self.executor = ProcessPoolExecutor(max_workers=workers or Config.QR_DECODE_WORKERS or None)
+        self.slots = asyncio.Semaphore(max_pending or Config.QR_DECODE_MAX_PENDING)
+
+    async def decode(self, image_bytes):
+        """Распознать QR-код в пуле; ждёт свободного места, если очередь заполнена"""
+        if self.slots.locked():
+            logger.warning("Очередь распознавания QR заполнена, фото ждёт свободного места")
+        QR_QUEUE_DEPTH.inc()
+        try:
+            async with self.slots:
+                loop = asyncio.get_running_loop()
+                data, stage = await loop.run_in_executor(self.executor, decode_qr, bytes(image_bytes))
+        finally:
+            QR_QUEUE_DEPTH.dec()
+        if data is None:
+            QR_FAILED.inc()
+        else:
+            QR_DECODED.inc()
+            logger.debug(f"QR-код распознан на этапе {stage}")
+        return data
+
+    async def decode_photo(self, photo_sizes):
+        """Скачать и распознать фото, при неудаче повторить на полном размере"""
+        for size in выбрать_размеры(photo_sizes):
+            file = await size.get_file()
+            data = await self.decode(await file.download_as_bytearray())
+            if data is not None:
+                return data
+        return None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
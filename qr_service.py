@@ -0,0 +1,59 @@
+import io
+import os
+from functools import lru_cache
+from config import Config
+
+# Версия содержимого QR-кода: увеличить, если изменится то, что в нём кодируется
+QR_PAYLOAD_VERSION = 1
+
+# Каталог QR-кодов, созданных до появления сервиса (сохранялись на диск)
+LEGACY_QR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'qr_codes')
+
+MIMETYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def содержимое_qr(документ_id):
+    """Данные, которые кодируются в QR-коде документа; их читает бот"""
+    return str(документ_id)
+
+
+@lru_cache(maxsize=Config.QR_CACHE_SIZE)
+def _render(version, документ_id, fmt):
+    import qrcode
+    import qrcode.image.svg
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(содержимое_qr(документ_id))
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    if fmt == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer)
+    return buffer.getvalue()
+
+
+def рендер_qr(документ_id, fmt='png'):
+    """QR-код документа в формате png или svg.
+
+    Изображение строится при первом запросе и хранится в ограниченном
+    LRU-кэше процесса (QR_CACHE_SIZE записей).
+    """
+    return _render(QR_PAYLOAD_VERSION, документ_id, fmt)
+
+
+def etag_qr(документ_id, fmt='png'):
+    """Сильный ETag: изображение зависит только от документа, версии и формата"""
+    return f'qr-{QR_PAYLOAD_VERSION}-{документ_id}-{fmt}'
+
+
+def удалить_старый_qr(qr_код):
+    """Удалить QR-код, сохранённый на диск старыми версиями приложения"""
+    if qr_код:
+        qr_path = os.path.join(LEGACY_QR_DIR, qr_код)
+        if os.path.exists(qr_path):
+            os.remove(qr_path)
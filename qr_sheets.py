@@ -0,0 +1,235 @@
+"""Печатные листы с QR-кодами нескольких документов.
+
+Страницы рисуются параллельно в пуле процессов и отдаются по мере
+готовности: PDF собирается потоково (см. PDFStream), PNG-страницы
+упаковываются в ZIP без перемотки.
+"""
+import io
+import os
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+from extensions import db
+from models import Документ, ДокументОтдела
+from qr_service import рендер_qr
+from queries import применить_фильтры_статистики
+
+# Страница A4 при 200 dpi
+PAGE_SIZE_PX = (1654, 2339)
+PAGE_SIZE_PT = (595, 842)
+COLUMNS, ROWS = 3, 4
+PER_PAGE = COLUMNS * ROWS
+MARGIN = 80
+
+
+def документы_для_листов(args):
+    """Документы, подходящие под фильтры статистики, в порядке создания"""
+    ids = применить_фильтры_статистики(
+        db.session.query(ДокументОтдела.документ_id).join(
+            Документ, Документ.id == ДокументОтдела.документ_id
+        ),
+        args
+    )
+    return Документ.query.filter(Документ.id.in_(ids)).order_by(
+        Документ.дата_создания, Документ.id
+    )
+
+
+def ячейки(документы):
+    """Данные для отрисовки, разбитые по страницам"""
+    cells = [
+        (док.id, док.название,
+         док.срок_ознакомления.strftime('%d.%m.%Y') if док.срок_ознакомления else '')
+        for док in документы
+    ]
+    return [cells[i:i + PER_PAGE] for i in range(0, len(cells), PER_PAGE)]
+
+
+def _font(path, size):
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _wrap(draw, text, font, width):
+    lines, line = [], ''
+    for word in text.split():
+        candidate = f'{line} {word}'.strip()
+        if line and draw.textlength(candidate, font=font) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def render_page(cells, fmt, font_path):
+    """Отрисовать одну страницу; выполняется в процессе пула.
+
+    Возвращает PNG для fmt='png' или сжатые zlib пиксели в оттенках серого для PDF.
+    """
+    from PIL import Image, ImageDraw
+
+    page = Image.new('L', PAGE_SIZE_PX, 255)
+    draw = ImageDraw.Draw(page)
+    title_font = _font(font_path, 30)
+    small_font = _font(font_path, 24)
+    cell_w = (PAGE_SIZE_PX[0] - 2 * MARGIN) // COLUMNS
+    cell_h = (PAGE_SIZE_PX[1] - 2 * MARGIN) // ROWS
+    qr_size = min(cell_w - 40, cell_h - 150)
+
+    for i, (документ_id, название, срок) in enumerate(cells):
+        x0 = MARGIN + (i % COLUMNS) * cell_w
+        y0 = MARGIN + (i // COLUMNS) * cell_h
+        qr = Image.open(io.BytesIO(рендер_qr(документ_id))).convert('L')
+        qr = qr.resize((qr_size, qr_size), Image.NEAREST)
+        page.paste(qr, (x0 + (cell_w - qr_size) // 2, y0))
+
+        y = y0 + qr_size + 8
+        for line in _wrap(draw, название, title_font, cell_w - 20)[:2]:
+            draw.text((x0 + 10, y), line, font=title_font, fill=0)
+            y += 36
+        draw.text((x0 + 10, y), f'Срок: {срок}   № {документ_id}', font=small_font, fill=0)
+
+    if fmt == 'png':
+        buffer = io.BytesIO()
+        page.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue()
+    return zlib.compress(page.tobytes(), 6)
+
+
+class PDFStream:
+    """Минимальный потоковый PDF: по одному изображению на страницу.
+
+    Номера объектов известны заранее по числу страниц, поэтому страницы
+    можно отдавать сразу, а таблицу xref записать в конце.
+    """
+
+    def __init__(self, page_count):
+        self.page_count = page_count
+        self.offsets = {}
+        self.position = 0
+
+    def _page_obj(self, n):
+        return 3 + 3 * n
+
+    def _object(self, number, body, stream=None):
+        self.offsets[number] = self.position
+        data = f'{number} 0 obj\n'.encode() + body
+        if stream is not None:
+            data += b'\nstream\n' + stream + b'\nendstream'
+        data += b'\nendobj\n'
+        self.position += len(data)
+        return data
+
+    def header(self):
+        data = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        self.position += len(data)
+        kids = ' '.join(f'{self._page_obj(n)} 0 R' for n in range(self.page_count))
+        data += self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        data += self._object(2, f'<< /Type /Pages /Kids [{kids}] /Count {self.page_count} >>'.encode())
+        return data
+
+    def page(self, n, pixels):
+        page_obj = self._page_obj(n)
+        w, h = PAGE_SIZE_PT
+        content = f'q {w} 0 0 {h} 0 0 cm /Im0 Do Q'.encode()
+        data = self._object(page_obj, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {w} {h}] '
+            f'/Resources << /XObject << /Im0 {page_obj + 2} 0 R >> >> '
+            f'/Contents {page_obj + 1} 0 R >>'
+        ).encode())
+        data += self._object(page_obj + 1, f'<< /Length {len(content)} >>'.encode(), content)
+        data += self._object(page_obj + 2, (
+            f'<< /Type /XObject /Subtype /Image /Width {PAGE_SIZE_PX[0]} /Height {PAGE_SIZE_PX[1]} '
+            f'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode /Length {len(pixels)} >>'
+        ).encode(), pixels)
+        return data
+
+    def trailer(self):
+        size = 3 + 3 * self.page_count
+        xref = [f'xref\n0 {size}\n', '0000000000 65535 f \n']
+        xref += [f'{self.offsets[n]:010d} 00000 n \n' for n in range(1, size)]
+        xref.append(f'trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{self.position}\n%%EOF\n')
+        return ''.join(xref).encode()
+
+
+class _Sink:
+    """Неперематываемый приёмник для zipfile, из которого забираются готовые байты"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _pages(pages, fmt):
+    font_path = current_app.config['QR_SHEET_FONT']
+    workers = current_app.config['QR_SHEET_WORKERS'] or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, len(pages)))) as executor:
+        yield from executor.map(render_page, pages, [fmt] * len(pages), [font_path] * len(pages))
+
+
+def sheet_stream(pages, fmt='pdf'):
+    """Генератор листа: PDF или ZIP из PNG-страниц, по мере отрисовки"""
+    if fmt == 'png':
+        sink = _Sink()
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+            for n, png in enumerate(_pages(pages, 'png'), 1):
+                archive.writestr(f'qr_page_{n:03d}.png', png)
+                yield sink.drain()
+        yield sink.drain()
+        return
+
+    pdf = PDFStream(len(pages))
+    yield pdf.header()
+    for n, pixels in enumerate(_pages(pages, 'pdf')):
+        yield pdf.page(n, pixels)
+    yield pdf.trailer()
+
+
+@click.command('qr-sheets')
+@with_appcontext
+@click.option('--start-date', help='Документы, созданные с даты (ГГГГ-ММ-ДД)')
+@click.option('--end-date', help='Документы, созданные по дату (ГГГГ-ММ-ДД)')
+@click.option('--document-type', help='Тип документа')
+@click.option('--department-id', type=int, help='ID отдела')
+@click.option('--format', 'fmt', type=click.Choice(['pdf', 'png']), default='pdf')
+@click.option('--output', '-o', required=True, type=click.Path(dir_okay=False))
+def qr_sheets_command(start_date, end_date, document_type, department_id, fmt, output):
+    """Сформировать лист QR-кодов для печати"""
+    args = MultiDict({
+        key: value for key, value in {
+            'start_date': start_date,
+            'end_date': end_date,
+            'document_type': document_type,
+            'department_id': department_id,
+        }.items() if value
+    })
+    pages = ячейки(документы_для_листов(args))
+    if not pages:
+        click.echo('Нет документов под выбранные фильтры')
+        return
+    with open(output, 'wb') as f:
+        for chunk in sheet_stream(pages, fmt):
+            f.write(chunk)
+    click.echo(f'Страниц: {len(pages)}, файл: {output}')
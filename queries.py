@@ -0,0 +1,188 @@
+from datetime import datetime
+from extensions import db
+from models import Сотрудник, Документ, ДокументОтдела, ПрочтениеДокумента, Отдел
+from pagination import paginate_keyset
+
+# Варианты сортировки: ключ -> (подпись, по убыванию)
+СОРТИРОВКИ_ДОКУМЕНТОВ = {
+    'created': ('Дата создания', True),
+    'title': ('Название', False),
+    'progress': ('Прогресс ознакомления', False),
+}
+
+СОРТИРОВКИ_СТАТИСТИКИ = {
+    'created': ('Дата создания', True),
+    'title': ('Название', False),
+    'progress': ('Процент ознакомления', False),
+}
+
+СОРТИРОВКИ_СОТРУДНИКОВ = {
+    'surname': ('Фамилия', False),
+    'employee_number': ('Табельный номер', False),
+}
+
+
+def численность_отделов_subquery():
+    """Подзапрос: количество сотрудников в каждом отделе"""
+    return db.session.query(
+        Сотрудник.отдел_id.label('отдел_id'),
+        db.func.count(Сотрудник.id).label('всего')
+    ).group_by(Сотрудник.отдел_id).subquery()
+
+
+def ознакомления_по_отделам_subquery():
+    """Подзапрос: количество прочтений документа сотрудниками каждого отдела"""
+    return db.session.query(
+        ПрочтениеДокумента.документ_id.label('документ_id'),
+        Сотрудник.отдел_id.label('отдел_id'),
+        db.func.count(ПрочтениеДокумента.id).label('прочитали')
+    ).join(
+        Сотрудник, Сотрудник.id == ПрочтениеДокумента.сотрудник_id
+    ).group_by(ПрочтениеДокумента.документ_id, Сотрудник.отдел_id).subquery()
+
+
+def документы_отдела(отдел_id):
+    """Запрос документов, адресованных отделу"""
+    return Документ.query.join(
+        ДокументОтдела, ДокументОтдела.документ_id == Документ.id
+    ).filter(ДокументОтдела.отдел_id == отдел_id)
+
+
+def адресовано_отделу(документ_id, отдел_id):
+    """Адресован ли документ отделу"""
+    return db.session.query(db.exists().where(
+        ДокументОтдела.документ_id == документ_id,
+        ДокументОтдела.отдел_id == отдел_id
+    )).scalar()
+
+
+def процент(прочитали, всего):
+    """SQL-выражение процента ознакомления"""
+    return db.cast(
+        db.func.coalesce(прочитали * 100.0 / db.func.nullif(всего, 0), 0),
+        db.Float
+    )
+
+
+def документы_query():
+    """Запрос строк "документ × отдел-адресат" с документом и отделом"""
+    return db.session.query(ДокументОтдела, Документ, Отдел).join(
+        Документ, Документ.id == ДокументОтдела.документ_id
+    ).join(
+        Отдел, Отдел.id == ДокументОтдела.отдел_id
+    )
+
+
+def документы_с_прогрессом(query, сотрудник_id, sort='created', cursor=None,
+                           direction='next', per_page=None):
+    """Страница документов вместе с прогрессом ознакомления одним запросом.
+
+    query - запрос из документы_query() с уже применёнными фильтрами.
+    Документ, адресованный нескольким отделам, даёт строку на каждый отдел.
+    Прогресс берётся из счётчиков (см. counters.py). Элементы страницы -
+    словари с ключами документ, отдел, total_count, read_count, progress
+    и прочитано_мной.
+    """
+    всего = Отдел.число_сотрудников
+    прочитали = ДокументОтдела.число_прочтений
+    прочитано_мной = db.exists().where(
+        ПрочтениеДокумента.документ_id == Документ.id,
+        ПрочтениеДокумента.сотрудник_id == сотрудник_id
+    )
+    query = query.add_columns(прочитано_мной.label('прочитано_мной'))
+
+    sort_expr = {
+        'created': Документ.дата_создания,
+        'title': Документ.название,
+        'progress': процент(прочитали, всего),
+    }[sort]
+    page = paginate_keyset(query, sort, sort_expr, ДокументОтдела.id,
+                           СОРТИРОВКИ_ДОКУМЕНТОВ[sort][1], cursor, direction, per_page)
+
+    page.items = [{
+        'документ': док,
+        'отдел': отдел,
+        'total_count': отдел.число_сотрудников,
+        'read_count': адресат.число_прочтений,
+        'progress': int((адресат.число_прочтений / отдел.число_сотрудников * 100)
+                        if отдел.число_сотрудников > 0 else 0),
+        'прочитано_мной': bool(своё),
+    } for адресат, док, отдел, своё in page.items]
+    return page
+
+
+def статистика_query():
+    """Запрос статистики: документ, отдел, всего сотрудников и ознакомившиеся.
+
+    Строка на каждую пару "документ × отдел-адресат". Значения берутся
+    из счётчиков (см. counters.py), поэтому стоимость запроса
+    пропорциональна числу строк, а не сотрудников и прочтений.
+    Возвращает запрос и словарь выражений сортировки для СОРТИРОВКИ_СТАТИСТИКИ.
+    """
+    всего = Отдел.число_сотрудников
+    прочитали = ДокументОтдела.число_прочтений
+
+    query = db.session.query(
+        Документ,
+        Отдел.название.label('отдел_название'),
+        всего.label('всего_сотрудников'),
+        прочитали.label('ознакомились')
+    ).select_from(ДокументОтдела).join(
+        Документ, Документ.id == ДокументОтдела.документ_id
+    ).join(
+        Отдел, Отдел.id == ДокументОтдела.отдел_id
+    )
+
+    sort_exprs = {
+        'created': Документ.дата_создания,
+        'title': Документ.название,
+        'progress': процент(прочитали, всего),
+    }
+    return query, sort_exprs
+
+
+def страница_статистики(query, sort_exprs, sort='created', cursor=None,
+                        direction='next', per_page=None):
+    """Страница статистики в виде списка словарей для шаблона"""
+    page = paginate_keyset(query, sort, sort_exprs[sort], ДокументОтдела.id,
+                           СОРТИРОВКИ_СТАТИСТИКИ[sort][1], cursor, direction, per_page)
+    page.items = [{
+        'документ': док,
+        'отдел': отдел_название,
+        'всего_сотрудников': всего,
+        'ознакомились': ознакомились,
+        'процент': round((ознакомились / всего * 100) if всего > 0 else 0, 2)
+    } for док, отдел_название, всего, ознакомились in page.items]
+    return page
+
+
+def страница_сотрудников(query, sort='surname', cursor=None, direction='next', per_page=None):
+    """Страница сотрудников с подгруженными отделами"""
+    sort_expr = {
+        'surname': Сотрудник.фамилия,
+        'employee_number': Сотрудник.табельный_номер,
+    }[sort]
+    query = query.options(db.joinedload(Сотрудник.отдел))
+    return paginate_keyset(query, sort, sort_expr, Сотрудник.id,
+                           СОРТИРОВКИ_СОТРУДНИКОВ[sort][1], cursor, direction, per_page)
+
+
+def применить_фильтры_статистики(query, args):
+    """Фильтры статистики из параметров запроса: период, тип документа и отдел.
+
+    query должен содержать ДокументОтдела.
+    """
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    document_type = args.get('document_type')
+    department_id = args.get('department_id', type=int)
+
+    if start_date:
+        query = query.filter(Документ.дата_создания >= datetime.strptime(start_date, '%Y-%m-%d'))
+    if end_date:
+        query = query.filter(Документ.дата_создания <= datetime.strptime(end_date, '%Y-%m-%d'))
+    if document_type:
+        query = query.filter(Документ.тип_документа == document_type)
+    if department_id:
+        query = query.filter(ДокументОтдела.отдел_id == department_id)
+    return query
@@ -0,0 +1,82 @@
+"""Проверка числа SQL-запросов страницы документов.
+
+`flask check-query-counts` запрашивает /documents тестовым клиентом от
+имени администратора и сотрудника со страницей в один документ и в
+MAX_PAGE_SIZE документов и считает запросы событием before_cursor_execute.
+Прогресс ознакомления загружается вместе со страницей (см.
+queries.документы_с_прогрессом), поэтому число запросов не должно зависеть
+от размера страницы и превышать MAX_QUERIES; иначе команда завершается
+с кодом 1.
+"""
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from extensions import db
+from models import Сотрудник, Документ
+
+# Запросов на страницу документов не больше, при любом её размере
+MAX_QUERIES = 6
+
+
+def _число_запросов(client, url):
+    запросы = []
+
+    def учесть(*args, **kwargs):
+        запросы.append(1)
+
+    # Сессия общая с командой: без сброса объекты из прошлого запроса не потребуют SQL
+    db.session.remove()
+    event.listen(db.engine, 'before_cursor_execute', учесть)
+    try:
+        response = client.get(url)
+        response.get_data()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', учесть)
+    if response.status_code >= 400:
+        raise click.ClickException(f'{url}: HTTP {response.status_code}')
+    return len(запросы)
+
+
+def проверить_число_запросов():
+    """Возвращает {роль: (запросов на странице из 1 документа, из MAX_PAGE_SIZE)}"""
+    пользователи = {
+        'администратор': Сотрудник.query.filter_by(роль='администратор').order_by(Сотрудник.id).first(),
+        'сотрудник': Сотрудник.query.filter_by(
+            роль='сотрудник', статус_регистрации=True
+        ).order_by(Сотрудник.id).first(),
+    }
+    результат = {}
+    for роль, пользователь in пользователи.items():
+        if пользователь is None:
+            continue
+        client = current_app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(пользователь.id)
+            session['_fresh'] = True
+        # Прогревочный запрос заполняет кэш справочников процесса
+        _число_запросов(client, '/documents')
+        результат[роль] = tuple(
+            _число_запросов(client, f'/documents?per_page={per_page}')
+            for per_page in (1, current_app.config['MAX_PAGE_SIZE'])
+        )
+    return результат
+
+
+@click.command('check-query-counts')
+@with_appcontext
+def check_query_counts_command():
+    """Проверить, что страница документов выполняет постоянное число запросов"""
+    if db.session.query(Документ.id).limit(2).count() < 2:
+        click.echo('В базе меньше двух документов: размер страницы не влияет на число запросов')
+    результат = проверить_число_запросов()
+    ok = True
+    for роль, (на_одном, на_странице) in результат.items():
+        if на_одном != на_странице or на_странице > MAX_QUERIES:
+            ok = False
+            click.echo(f'/documents ({роль}): {на_одном} запросов на 1 документ, '
+                       f'{на_странице} на страницу (не больше {MAX_QUERIES})')
+        else:
+            click.echo(f'/documents ({роль}): {на_странице} запросов, OK')
+    if not ok:
+        raise SystemExit(1)
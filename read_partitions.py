@@ -0,0 +1,149 @@
+"""Секции журнала прочтений по месяцам.
+
+Таблица прочтения_документов секционирована по дата_прочтения: секция
+на календарный месяц с именем прочтения_документов_ГГГГ_ММ. Секции
+держат индексы небольшими, а архивация освобождает место отсоединением
+опустевших секций вместо удаления миллионов строк с последующим VACUUM.
+
+`flask read-partitions` создаёт секции на READ_PARTITIONS_AHEAD месяцев
+вперёд и отсоединяет секции старше горизонта архива (ARCHIVE_AFTER_DAYS),
+если все их строки уже перенесены в архив (см. archive.py). Прочтение,
+для месяца которого секции нет, попадает в секцию по умолчанию
+прочтения_документов_прочие; при создании секции такие строки переносятся
+в неё. Команду достаточно запускать раз в сутки.
+"""
+import re
+from datetime import date, datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from extensions import db
+
+TABLE = 'прочтения_документов'
+DEFAULT_PARTITION = f'{TABLE}_прочие'
+NAME_RE = re.compile(rf'^{TABLE}_(\d{{4}})_(\d{{2}})$')
+
+
+def начало_месяца(value):
+    return date(value.year, value.month, 1)
+
+
+def следующий_месяц(месяц):
+    return date(месяц.year + месяц.month // 12, месяц.month % 12 + 1, 1)
+
+
+def имя_секции(месяц):
+    return f'{TABLE}_{месяц.year:04d}_{месяц.month:02d}'
+
+
+def таблица(relation):
+    """Имя таблицы для имени секции из плана запроса"""
+    return TABLE if relation == DEFAULT_PARTITION or NAME_RE.match(relation) else relation
+
+
+def секции(session=None):
+    """{первое число месяца: имя секции}"""
+    session = session or db.session
+    names = session.scalars(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass)
+    """), {'table': TABLE})
+    результат = {}
+    for name in names:
+        match = NAME_RE.match(name)
+        if match:
+            результат[date(int(match[1]), int(match[2]), 1)] = name
+    return dict(sorted(результат.items()))
+
+
+def создать_секцию(месяц, session=None):
+    """Создать секцию месяца; возвращает число строк, перенесённых в неё из секции по умолчанию.
+
+    CREATE TABLE ... PARTITION OF не пройдёт, если в секции по умолчанию есть
+    строки этого месяца, поэтому секция создаётся отдельной таблицей, строки
+    переносятся в неё, и только затем она присоединяется.
+    """
+    session = session or db.session
+    name, до = имя_секции(месяц), следующий_месяц(месяц)
+    session.execute(text(f'CREATE TABLE "{name}" (LIKE {TABLE} INCLUDING DEFAULTS)'))
+    перенесено = session.execute(text(f"""
+        WITH перенесённые AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE дата_прочтения >= :from AND дата_прочтения < :to
+            RETURNING *
+        )
+        INSERT INTO "{name}" SELECT * FROM перенесённые
+    """), {'from': месяц, 'to': до}).rowcount
+    session.execute(text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION \"{name}\" FOR VALUES FROM ('{месяц}') TO ('{до}')"
+    ))
+    return перенесено
+
+
+def подготовить_секции(с=None, ahead=None, session=None):
+    """Создать недостающие секции с месяца даты с (по умолчанию текущего) на ahead месяцев вперёд.
+
+    Возвращает {имя созданной секции: перенесено строк}.
+    """
+    session = session or db.session
+    ahead = current_app.config['READ_PARTITIONS_AHEAD'] if ahead is None else ahead
+    есть = секции(session)
+    месяц = начало_месяца(с or datetime.utcnow())
+    последний = начало_месяца(datetime.utcnow())
+    for _ in range(ahead):
+        последний = следующий_месяц(последний)
+
+    созданы = {}
+    while месяц <= последний:
+        if месяц not in есть:
+            созданы[имя_секции(месяц)] = создать_секцию(месяц, session)
+        месяц = следующий_месяц(месяц)
+    return созданы
+
+
+def отсоединить_старые(до, session=None):
+    """Отсоединить и удалить пустые секции, целиком лежащие раньше даты до.
+
+    Строки прочтений удаляются вместе с документом при его архивации, поэтому
+    секция старше горизонта архива пустеет; непустая секция (документ ещё не
+    заархивирован) остаётся. Возвращает (удалённые, оставленные).
+    """
+    session = session or db.session
+    удалены, оставлены = [], []
+    for месяц, name in секции(session).items():
+        if datetime.combine(следующий_месяц(месяц), datetime.min.time()) > до:
+            break
+        if session.scalar(text(f'SELECT EXISTS (SELECT 1 FROM "{name}")')):
+            оставлены.append(name)
+            continue
+        session.execute(text(f'ALTER TABLE {TABLE} DETACH PARTITION "{name}"'))
+        session.execute(text(f'DROP TABLE "{name}"'))
+        удалены.append(name)
+    return удалены, оставлены
+
+
+@click.command('read-partitions')
+@click.option('--ahead', type=int, default=None, help='Месяцев вперёд (по умолчанию READ_PARTITIONS_AHEAD)')
+@click.option('--keep-old', is_flag=True, help='Не отсоединять старые секции')
+@with_appcontext
+def read_partitions_command(ahead, keep_old):
+    """Создать секции журнала прочтений вперёд и отсоединить старые"""
+    созданы = подготовить_секции(ahead=ahead)
+    for name, перенесено in созданы.items():
+        click.echo(f'Создана секция {name}' + (f', перенесено строк: {перенесено}' if перенесено else ''))
+
+    if not keep_old:
+        горизонт = datetime.utcnow() - timedelta(days=current_app.config['ARCHIVE_AFTER_DAYS'])
+        удалены, оставлены = отсоединить_старые(горизонт)
+        for name in удалены:
+            click.echo(f'Отсоединена и удалена пустая секция {name}')
+        if оставлены:
+            click.echo(f'Остались непустые секции старше горизонта архива: {", ".join(оставлены)}; '
+                       f'сначала выполните flask archive-documents')
+
+    прочие = db.session.scalar(text(f'SELECT count(*) FROM {DEFAULT_PARTITION}'))
+    db.session.commit()
+    if прочие:
+        click.echo(f'В секции по умолчанию строк: {прочие}')
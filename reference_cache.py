@@ -0,0 +1,152 @@
+"""Кэш справочников в памяти процесса.
+
+Почти каждая страница показывает список отделов, статистика - типы
+документов, а flask-login на каждом запросе загружает вошедшего
+сотрудника. Эти данные меняются редко, поэтому каждый процесс (воркер
+gunicorn, бот) держит их в памяти.
+
+Изменение справочника в той же транзакции увеличивает его версию
+в таблице версии_справочников (отметить_изменение). Процесс сверяет
+версии с базой не чаще раза в REFERENCE_CHECK_INTERVAL секунд и
+перезагружает значения, версия которых изменилась. Свои изменения
+процесс видит сразу: после коммита транзакции с отметкой версии
+сверяются при следующем обращении. Изменения из других процессов
+видны не позже чем через REFERENCE_CHECK_INTERVAL секунд.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from config import Config
+from extensions import db
+from models import ВерсияСправочника, Отдел, Документ, Сотрудник
+
+ОТДЕЛЫ = 'отделы'
+ТИПЫ_ДОКУМЕНТОВ = 'типы_документов'
+СОТРУДНИКИ = 'сотрудники'
+
+ОтделКратко = namedtuple('ОтделКратко', 'id название')
+
+
+class ТекущийПользователь(UserMixin):
+    """Вошедший сотрудник для flask-login: только поля, нужные для проверки прав и шапки"""
+
+    def __init__(self, id, отдел_id, роль, фамилия, имя, отчество):
+        self.id = id
+        self.отдел_id = отдел_id
+        self.роль = роль
+        self.фамилия = фамилия
+        self.имя = имя
+        self.отчество = отчество
+
+    полное_имя = Сотрудник.полное_имя
+
+
+class СправочныйКэш:
+    """Значения справочников с версией, при которой они загружены"""
+
+    def __init__(self, check_interval=None, max_size=None):
+        self.check_interval = check_interval if check_interval is not None else Config.REFERENCE_CHECK_INTERVAL
+        self.max_size = max_size or Config.REFERENCE_CACHE_SIZE
+        self._версии = {}
+        self._сверено = None
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def устарел(self):
+        """Сверить версии с базой при следующем обращении"""
+        self._сверено = None
+
+    def _версия(self, session, справочник):
+        now = time.monotonic()
+        if self._сверено is None or now - self._сверено >= self.check_interval:
+            self._версии = dict(session.execute(
+                select(ВерсияСправочника.справочник, ВерсияСправочника.версия)
+            ).all())
+            self._сверено = now
+        return self._версии.get(справочник, 0)
+
+    def получить(self, session, справочник, key, загрузить):
+        """Значение из кэша; загрузить(session) вызывается, если его нет или версия устарела"""
+        версия = self._версия(session, справочник)
+        with self._lock:
+            item = self._items.get((справочник, key))
+            if item is not None and item[0] == версия:
+                self._items.move_to_end((справочник, key))
+                return item[1]
+        значение = загрузить(session)
+        if значение is not None:
+            with self._lock:
+                self._items[(справочник, key)] = (версия, значение)
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+        return значение
+
+
+кэш = СправочныйКэш()
+
+
+def отметить_изменение(*справочники, session=None):
+    """Увеличить версии справочников; вызывать в транзакции, которая их меняет"""
+    session = session or db.session
+    session.execute(
+        insert(ВерсияСправочника).values(
+            [{'справочник': справочник, 'версия': 1} for справочник in справочники]
+        ).on_conflict_do_update(
+            index_elements=['справочник'], set_={'версия': ВерсияСправочника.версия + 1}
+        )
+    )
+    session.info['справочники_изменены'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _после_коммита(session):
+    if session.info.pop('справочники_изменены', False):
+        кэш.устарел()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _после_отката(session):
+    session.info.pop('справочники_изменены', None)
+
+
+def _загрузить_отделы(session):
+    return [
+        ОтделКратко(*row)
+        for row in session.execute(select(Отдел.id, Отдел.название).order_by(Отдел.название, Отдел.id))
+    ]
+
+
+def отделы(session=None):
+    """Все отделы (id, название) по алфавиту"""
+    return кэш.получить(session or db.session, ОТДЕЛЫ, None, _загрузить_отделы)
+
+
+def _загрузить_типы(session):
+    return session.scalars(
+        select(Документ.тип_документа).where(
+            Документ.тип_документа != None
+        ).distinct().order_by(Документ.тип_документа)
+    ).all()
+
+
+def типы_документов(session=None):
+    """Различные типы загруженных документов"""
+    return кэш.получить(session or db.session, ТИПЫ_ДОКУМЕНТОВ, None, _загрузить_типы)
+
+
+def пользователь(user_id, session=None):
+    """ТекущийПользователь по id или None, если сотрудника нет"""
+    def загрузить(session):
+        row = session.execute(
+            select(
+                Сотрудник.id, Сотрудник.отдел_id, Сотрудник.роль,
+                Сотрудник.фамилия, Сотрудник.имя, Сотрудник.отчество
+            ).where(Сотрудник.id == user_id)
+        ).first()
+        return ТекущийПользователь(*row) if row else None
+
+    return кэш.получить(session or db.session, СОТРУДНИКИ, user_id, загрузить)
@@ -0,0 +1,104 @@
+"""Напоминания о приближающемся сроке ознакомления.
+
+Раз в день бот (job_queue) находит одним запросом все пары "сотрудник -
+непрочитанный документ отдела" со сроком в ближайшие REMINDER_DAYS дней,
+по которым напоминание ещё не отправлялось, записывает их в таблицу
+напоминания и ставит в очередь уведомлений одно сообщение на сотрудника
+со списком всех его документов. Запись напоминаний и постановка в очередь
+идут в одной транзакции, а повторная вставка пары отсекается уникальным
+индексом, поэтому перезапуск бота или второй его процесс не отправят
+напоминание дважды. Отправкой с ограничением частоты занимается Dispatcher.
+"""
+from datetime import date, timedelta
+from itertools import groupby
+from sqlalchemy import select, exists, insert as sa_insert
+from sqlalchemy.dialects.postgresql import insert
+from models import Сотрудник, Документ, ДокументОтдела, ПрочтениеДокумента, НапоминаниеОСроке, Уведомление
+
+# Документов в одном сообщении; остальные перечисляются числом (предел Telegram - 4096 символов)
+MAX_DOCUMENTS_IN_MESSAGE = 20
+
+# Уведомлений в одном INSERT
+INSERT_BATCH = 1000
+
+
+def текст_напоминания(документы):
+    """Текст дайджеста по списку (название, срок_ознакомления)"""
+    строки = [
+        f"• {название} - до {срок.strftime('%d.%m.%Y')}"
+        for название, срок in документы[:MAX_DOCUMENTS_IN_MESSAGE]
+    ]
+    if len(документы) > MAX_DOCUMENTS_IN_MESSAGE:
+        строки.append(f"…и ещё {len(документы) - MAX_DOCUMENTS_IN_MESSAGE}")
+    return (
+        "⏰ Скоро истекает срок ознакомления с документами:\n\n"
+        + "\n".join(строки)
+        + "\n\nОзнакомьтесь с ними и подтвердите ознакомление, отсканировав QR-код. "
+          "Полный список: /unread"
+    )
+
+
+def кандидаты_query(сегодня, дней):
+    """Пары (сотрудник, документ) для напоминания: срок близко, не прочитан, не напоминали"""
+    return select(Сотрудник.id, ДокументОтдела.документ_id).join(
+        ДокументОтдела, ДокументОтдела.отдел_id == Сотрудник.отдел_id
+    ).join(
+        Документ, Документ.id == ДокументОтдела.документ_id
+    ).where(
+        Документ.срок_ознакомления.between(сегодня, сегодня + timedelta(days=дней)),
+        Сотрудник.статус_регистрации == True,
+        Сотрудник.telegram_id != None,
+        ~exists().where(
+            ПрочтениеДокумента.документ_id == ДокументОтдела.документ_id,
+            ПрочтениеДокумента.сотрудник_id == Сотрудник.id
+        ),
+        ~exists().where(
+            НапоминаниеОСроке.документ_id == ДокументОтдела.документ_id,
+            НапоминаниеОСроке.сотрудник_id == Сотрудник.id
+        )
+    )
+
+
+def поставить_напоминания(session, дней, сегодня=None):
+    """Записать новые напоминания и поставить дайджесты в очередь уведомлений.
+
+    Возвращает (сотрудников, документов в напоминаниях).
+    """
+    сегодня = сегодня or date.today()
+    новые = insert(НапоминаниеОСроке).from_select(
+        ['сотрудник_id', 'документ_id'], кандидаты_query(сегодня, дней)
+    ).on_conflict_do_nothing(
+        index_elements=['сотрудник_id', 'документ_id']
+    ).returning(
+        НапоминаниеОСроке.сотрудник_id, НапоминаниеОСроке.документ_id
+    ).cte('новые')
+
+    # Вставка напоминаний и выборка данных для сообщений - один запрос
+    строки = session.execute(
+        select(
+            новые.c.сотрудник_id, Сотрудник.telegram_id,
+            Документ.название, Документ.срок_ознакомления
+        ).join(
+            Сотрудник, Сотрудник.id == новые.c.сотрудник_id
+        ).join(
+            Документ, Документ.id == новые.c.документ_id
+        ).order_by(новые.c.сотрудник_id, Документ.срок_ознакомления, Документ.id)
+    ).all()
+
+    сотрудников = документов = 0
+    пачка = []
+    for (сотрудник_id, chat_id), группа in groupby(строки, key=lambda row: (row[0], row[1])):
+        документы_сотрудника = [(row.название, row.срок_ознакомления) for row in группа]
+        пачка.append({
+            'сотрудник_id': сотрудник_id,
+            'chat_id': chat_id,
+            'текст': текст_напоминания(документы_сотрудника),
+        })
+        сотрудников += 1
+        документов += len(документы_сотрудника)
+        if len(пачка) >= INSERT_BATCH:
+            session.execute(sa_insert(Уведомление), пачка)
+            пачка = []
+    if пачка:
+        session.execute(sa_insert(Уведомление), пачка)
+    return сотрудников, документов
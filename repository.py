@@ -0,0 +1,131 @@
+"""Запросы сотрудника к своим документам для бота.
+
+Каждая функция принимает сессию первым аргументом и не делает commit: бот
+выполняет функции через async_db.выполнить, где транзакция открывается и
+закрывается вокруг вызова, а index_check строит запросы в db.session.
+Возвращаемые объекты не должны требовать ленивой загрузки после выхода из сессии.
+"""
+from sqlalchemy import select, func, exists
+from sqlalchemy.dialects.postgresql import insert
+from counters import учесть_прочтение, учесть_перевод
+from reference_cache import отделы, отметить_изменение, СОТРУДНИКИ
+from models import Сотрудник, Документ, ДокументОтдела, ПрочтениеДокумента, Отдел
+
+
+def сотрудник_по_telegram(session, telegram_id):
+    return session.scalars(
+        select(Сотрудник).where(Сотрудник.telegram_id == telegram_id)
+    ).first()
+
+
+def сотрудник_по_табельному_номеру(session, табельный_номер):
+    return session.scalars(
+        select(Сотрудник).where(Сотрудник.табельный_номер == табельный_номер)
+    ).first()
+
+
+def названия_отделов(session):
+    return [отдел.название for отдел in отделы(session)]
+
+
+def перевести_в_отдел(session, сотрудник_id, название_отдела):
+    """Записать сотрудника в отдел по названию; False, если такого отдела нет"""
+    отдел = session.scalars(select(Отдел).where(Отдел.название == название_отдела)).first()
+    if not отдел:
+        return False
+    сотрудник = session.get(Сотрудник, сотрудник_id)
+    старый_отдел_id = сотрудник.отдел_id
+    сотрудник.отдел_id = отдел.id
+    учесть_перевод(сотрудник, старый_отдел_id, session=session)
+    отметить_изменение(СОТРУДНИКИ, session=session)
+    return True
+
+
+def завершить_регистрацию(session, сотрудник_id, telegram_id, телефон):
+    """Привязать Telegram к сотруднику; возвращает данные для подтверждения"""
+    сотрудник = session.get(Сотрудник, сотрудник_id)
+    сотрудник.рабочий_телефон = телефон
+    сотрудник.telegram_id = telegram_id
+    сотрудник.статус_регистрации = True
+    return {
+        'полное_имя': сотрудник.полное_имя,
+        'отдел': сотрудник.отдел.название,
+        'табельный_номер': сотрудник.табельный_номер,
+        'рабочий_телефон': сотрудник.рабочий_телефон,
+    }
+
+
+def _не_прочитан(сотрудник_id):
+    """Условие анти-соединения: у сотрудника нет прочтения документа строки ДокументОтдела"""
+    return ~exists().where(
+        ПрочтениеДокумента.документ_id == ДокументОтдела.документ_id,
+        ПрочтениеДокумента.сотрудник_id == сотрудник_id
+    )
+
+
+def статистика_сотрудника(session, сотрудник):
+    """(всего документов отдела, прочитано из них) одним запросом"""
+    всего, непрочитано = session.execute(
+        select(
+            func.count(ДокументОтдела.id),
+            func.count(ДокументОтдела.id).filter(_не_прочитан(сотрудник.id))
+        ).where(ДокументОтдела.отдел_id == сотрудник.отдел_id)
+    ).one()
+    return всего, всего - непрочитано
+
+
+def непрочитанные_query(сотрудник_id, отдел_id):
+    """Запрос непрочитанных документов отдела (анти-соединение с прочтениями)"""
+    return select(
+        Документ.id, Документ.название, Документ.тип_документа, Документ.срок_ознакомления
+    ).join(
+        ДокументОтдела, ДокументОтдела.документ_id == Документ.id
+    ).where(
+        ДокументОтдела.отдел_id == отдел_id,
+        _не_прочитан(сотрудник_id)
+    ).order_by(Документ.срок_ознакомления, Документ.id)
+
+
+def непрочитанные_документы(session, сотрудник):
+    """Непрочитанные документы отдела сотрудника одним запросом.
+
+    Возвращает кортежи (id, название, тип_документа, срок_ознакомления)
+    в порядке срока ознакомления.
+    """
+    return [tuple(row) for row in session.execute(
+        непрочитанные_query(сотрудник.id, сотрудник.отдел_id)
+    )]
+
+
+def подтвердить_прочтение(session, сотрудник, документ_id):
+    """Подтвердить ознакомление.
+
+    Возвращает (документ, дата прежнего подтверждения или None);
+    документ равен None, если его нет в системе.
+    """
+    документ = session.get(Документ, документ_id)
+    if not документ:
+        return None, None
+
+    # Уникального индекса в секционированной таблице нет: параллельные подтверждения
+    # одной пары ждут друг друга на блокировке до конца транзакции, а прежнее
+    # прочтение ищется по всем секциям
+    session.execute(select(func.pg_advisory_xact_lock(сотрудник.id, документ.id)))
+    прежнее = session.scalar(
+        select(ПрочтениеДокумента.дата_прочтения).where(
+            ПрочтениеДокумента.сотрудник_id == сотрудник.id,
+            ПрочтениеДокумента.документ_id == документ.id
+        ).order_by(ПрочтениеДокумента.дата_прочтения).limit(1)
+    )
+    if прежнее is not None:
+        return документ, прежнее
+
+    session.execute(
+        insert(ПрочтениеДокумента).values(
+            сотрудник_id=сотрудник.id,
+            документ_id=документ.id,
+            подтверждено=True
+        )
+    )
+    учесть_прочтение(сотрудник, документ, session=session)
+    return документ, None
@@ -0,0 +1,439 @@
+"""Резервное копирование файлов и базы данных снимками с дедупликацией.
+
+Запуск из корня проекта (настройки из .env):
+    python scripts/backup.py create [--jobs 4] [--no-db]
+    python scripts/backup.py verify [SNAPSHOT] [--full]
+    python scripts/backup.py restore SNAPSHOT [--target DIR] [--no-files] [--no-db]
+    python scripts/backup.py list
+    python scripts/backup.py prune [--keep-days 7]
+
+Файлы из uploads/, static/qr_codes и архива документов (ARCHIVE_FOLDER)
+режутся на части по CHUNK_SIZE; часть хранится один раз под именем
+chunks/<первые 2 символа sha256>/<sha256> в BACKUP_DIR, поэтому снимок
+записывает только новое содержимое. Файл,
+размер и время изменения которого совпадают с прошлым снимком, не
+перечитывается. Снимок - каталог snapshots/<время> с manifest.json.gz
+(файлы и их части) и дампом базы в формате каталога (pg_dump -Fd -j),
+который восстанавливается параллельно (pg_restore -j).
+
+Снимок появляется только после записи манифеста; prune удаляет старые
+снимки и части, на которые не ссылается ни один оставшийся манифест.
+"""
+import argparse
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy.engine import make_url  # noqa: E402
+from config import Config  # noqa: E402
+
+# Размер части файла; загруженные файлы не меняются, поэтому хватает частей постоянного размера
+CHUNK_SIZE = 4 * 1024 * 1024
+MANIFEST = 'manifest.json.gz'
+NAME_FORMAT = '%Y%m%d-%H%M%S'
+
+
+class ОшибкаКопирования(Exception):
+    pass
+
+
+def каталоги():
+    """Копируемые каталоги: имя в манифесте -> путь"""
+    return {
+        'uploads': Config.UPLOAD_FOLDER,
+        'qr_codes': os.path.join(ROOT, 'static', 'qr_codes'),
+        'archive': Config.ARCHIVE_FOLDER,
+    }
+
+
+def обойти(каталог, base):
+    """(путь относительно base, stat) обычных файлов; незавершённые загрузки пропускаются"""
+    for dirpath, dirnames, filenames in os.walk(base):
+        if каталог == 'uploads' and dirpath == base and 'tmp' in dirnames:
+            dirnames.remove('tmp')
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            try:
+                st = os.lstat(path)
+            except FileNotFoundError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                yield os.path.relpath(path, base), st
+
+
+def sha256_файла(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(CHUNK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def окружение_pg():
+    """Переменные libpq из DATABASE_URL: пароль не попадает в командную строку"""
+    url = make_url(Config.SQLALCHEMY_DATABASE_URI)
+    env = dict(os.environ)
+    for key, value in (('PGHOST', url.host), ('PGPORT', url.port), ('PGUSER', url.username),
+                       ('PGPASSWORD', url.password), ('PGDATABASE', url.database)):
+        if value is not None:
+            env[key] = str(value)
+    return env
+
+
+class Хранилище:
+    """Каталог BACKUP_DIR: части файлов и снимки"""
+
+    def __init__(self, path):
+        self.path = path
+        self.chunks = os.path.join(path, 'chunks')
+        self.snapshots = os.path.join(path, 'snapshots')
+        os.makedirs(self.chunks, exist_ok=True)
+        os.makedirs(self.snapshots, exist_ok=True)
+
+    def заблокировать(self):
+        """Одновременно с хранилищем работает один процесс: prune не удалит части идущего снимка"""
+        lock = open(os.path.join(self.path, 'lock'), 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ОшибкаКопирования(f'С хранилищем {self.path} уже работает другой процесс')
+        return lock
+
+    def путь_части(self, sha256):
+        return os.path.join(self.chunks, sha256[:2], sha256)
+
+    def записать_часть(self, sha256, data):
+        """Сохранить часть, если её ещё нет; True, если записана"""
+        path = self.путь_части(sha256)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return True
+
+    def сохранить_файл(self, path):
+        """(части, прочитано байт, записано байт) или None, если файл успели удалить"""
+        части, прочитано, записано = [], 0, 0
+        try:
+            with open(path, 'rb') as f:
+                while data := f.read(CHUNK_SIZE):
+                    sha256 = hashlib.sha256(data).hexdigest()
+                    if self.записать_часть(sha256, data):
+                        записано += len(data)
+                    части.append([sha256, len(data)])
+                    прочитано += len(data)
+        except FileNotFoundError:
+            return None
+        return части, прочитано, записано
+
+    def снимки(self):
+        """Имена завершённых снимков, от старых к новым"""
+        return sorted(
+            name for name in os.listdir(self.snapshots)
+            if os.path.exists(os.path.join(self.snapshots, name, MANIFEST))
+        )
+
+    def манифест(self, name):
+        path = os.path.join(self.snapshots, name, MANIFEST)
+        if not os.path.exists(path):
+            raise ОшибкаКопирования(f'Снимок {name} не найден')
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def записать_манифест(path, манифест):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+        json.dump(манифест, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def дамп_базы(path):
+    """{файл: [sha256, размер]} дампа pg_dump -Fd"""
+    return {
+        name: [sha256_файла(os.path.join(path, name)), os.path.getsize(os.path.join(path, name))]
+        for name in sorted(os.listdir(path))
+    }
+
+
+def создать(хранилище, jobs, with_db=True):
+    """Новый снимок; возвращает отчёт о нём"""
+    started = time.perf_counter()
+    name = datetime.now().strftime(NAME_FORMAT)
+    if os.path.exists(os.path.join(хранилище.snapshots, name)):
+        raise ОшибкаКопирования(f'Снимок {name} уже есть')
+    work = os.path.join(хранилище.snapshots, f'.{name}.tmp')
+    os.makedirs(work)
+    dump = None
+    try:
+        # Дамп идёт параллельно с копированием файлов. Файлы пишутся в хранилище
+        # до коммита ссылающейся строки, поэтому снимку базы хватает файлов,
+        # обойдённых после запуска pg_dump
+        if with_db:
+            dump = subprocess.Popen(
+                ['pg_dump', '-Fd', '-j', str(jobs), '-f', os.path.join(work, 'db')], env=окружение_pg()
+            )
+
+        прошлые = {}
+        снимки = хранилище.снимки()
+        if снимки:
+            for entry in хранилище.манифест(снимки[-1])['файлы']:
+                прошлые[(entry['каталог'], entry['путь'])] = entry
+
+        файлы, прочитать = [], []
+        for каталог, base in каталоги().items():
+            for путь, st in обойти(каталог, base):
+                entry = {'каталог': каталог, 'путь': путь, 'размер': st.st_size,
+                         'mtime_ns': st.st_mtime_ns, 'режим': stat.S_IMODE(st.st_mode)}
+                прошлый = прошлые.get((каталог, путь))
+                if прошлый and прошлый['размер'] == st.st_size and прошлый['mtime_ns'] == st.st_mtime_ns:
+                    entry['части'] = прошлый['части']
+                else:
+                    прочитать.append((entry, os.path.join(base, путь)))
+                файлы.append(entry)
+
+        отчёт = {'снимок': name, 'файлов': 0, 'перечитано_файлов': len(прочитать),
+                 'прочитано_байт': 0, 'записано_байт': 0, 'база_байт': 0}
+        with ThreadPoolExecutor(jobs) as pool:
+            результаты = pool.map(lambda item: хранилище.сохранить_файл(item[1]), прочитать)
+            for (entry, _), результат in zip(прочитать, результаты):
+                if результат is not None:
+                    entry['части'], прочитано, записано = результат
+                    отчёт['прочитано_байт'] += прочитано
+                    отчёт['записано_байт'] += записано
+        файлы = [entry for entry in файлы if 'части' in entry]
+        отчёт['файлов'] = len(файлы)
+
+        база = None
+        if dump is not None:
+            if dump.wait() != 0:
+                raise ОшибкаКопирования(f'pg_dump завершился с кодом {dump.returncode}')
+            база = дамп_базы(os.path.join(work, 'db'))
+            отчёт['база_байт'] = sum(size for _, size in база.values())
+            отчёт['записано_байт'] += отчёт['база_байт']
+
+        # Части и дамп должны оказаться на диске раньше манифеста, который на них ссылается
+        os.sync()
+        отчёт['секунд'] = round(time.perf_counter() - started, 1)
+        записать_манифест(os.path.join(work, MANIFEST), {
+            'версия': 1, 'создан': datetime.now().isoformat(timespec='seconds'), 'chunk_size': CHUNK_SIZE,
+            'файлы': файлы, 'база': база, 'отчёт': отчёт,
+        })
+        os.rename(work, os.path.join(хранилище.snapshots, name))
+        return отчёт
+    except BaseException:
+        if dump is not None and dump.poll() is None:
+            dump.terminate()
+            dump.wait()
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+
+
+def проверить(хранилище, name, jobs, full=False):
+    """Список проблем снимка; full - перечитать и сверить хеши всех частей"""
+    манифест = хранилище.манифест(name)
+    проблемы = []
+    части = {}
+    for entry in манифест['файлы']:
+        if sum(size for _, size in entry['части']) != entry['размер']:
+            проблемы.append(f"{entry['каталог']}/{entry['путь']}: размер частей не совпадает с размером файла")
+        for sha256, size in entry['части']:
+            части[sha256] = size
+
+    def проверить_часть(item):
+        sha256, size = item
+        path = хранилище.путь_части(sha256)
+        try:
+            if os.path.getsize(path) != size:
+                return f'часть {sha256}: размер {os.path.getsize(path)} вместо {size}'
+            if full and sha256_файла(path) != sha256:
+                return f'часть {sha256}: содержимое повреждено'
+        except FileNotFoundError:
+            return f'часть {sha256}: отсутствует'
+        return None
+
+    with ThreadPoolExecutor(jobs) as pool:
+        проблемы.extend(p for p in pool.map(проверить_часть, части.items()) if p)
+
+    if манифест['база'] is not None:
+        db_path = os.path.join(хранилище.snapshots, name, 'db')
+        for filename, (sha256, size) in манифест['база'].items():
+            path = os.path.join(db_path, filename)
+            if not os.path.exists(path) or os.path.getsize(path) != size:
+                проблемы.append(f'дамп {filename}: отсутствует или другого размера')
+            elif full and sha256_файла(path) != sha256:
+                проблемы.append(f'дамп {filename}: содержимое повреждено')
+        # pg_restore -l читает оглавление дампа, не подключаясь к базе
+        if subprocess.run(['pg_restore', '-l', db_path], stdout=subprocess.DEVNULL).returncode != 0:
+            проблемы.append('дамп: pg_restore не читает оглавление')
+    return проблемы
+
+
+def восстановить_файл(хранилище, entry, path):
+    """Собрать файл из частей; файл с тем же размером и временем изменения не трогается"""
+    try:
+        st = os.stat(path)
+        if st.st_size == entry['размер'] and st.st_mtime_ns == entry['mtime_ns']:
+            return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.restore-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for sha256, _ in entry['части']:
+                with open(хранилище.путь_части(sha256), 'rb') as chunk:
+                    data = chunk.read()
+                if hashlib.sha256(data).hexdigest() != sha256:
+                    raise ОшибкаКопирования(f"Часть {sha256} файла {entry['путь']} повреждена")
+                f.write(data)
+        os.chmod(tmp_path, entry['режим'])
+        os.utime(tmp_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+def восстановить(хранилище, name, jobs, target=None, files=True, with_db=True):
+    """Восстановить файлы (в исходные каталоги или в target/<каталог>) и базу"""
+    started = time.perf_counter()
+    манифест = хранилище.манифест(name)
+    восстановлено = 0
+    if files:
+        пути = каталоги()
+
+        def записать(entry):
+            base = os.path.join(target, entry['каталог']) if target else пути[entry['каталог']]
+            return восстановить_файл(хранилище, entry, os.path.join(base, entry['путь']))
+
+        with ThreadPoolExecutor(jobs) as pool:
+            восстановлено = sum(pool.map(записать, манифест['файлы']))
+    if with_db and манифест['база'] is not None:
+        env = окружение_pg()
+        subprocess.run(
+            ['pg_restore', '-j', str(jobs), '--clean', '--if-exists', '--no-owner',
+             '-d', env['PGDATABASE'], os.path.join(хранилище.snapshots, name, 'db')],
+            env=env, check=True
+        )
+    return восстановлено, time.perf_counter() - started
+
+
+def удалить_старые(хранилище, keep_days):
+    """Удалить снимки старше keep_days (последний остаётся) и ненужные части"""
+    граница = datetime.now() - timedelta(days=keep_days)
+    снимки = хранилище.снимки()
+    удалить = [name for name in снимки[:-1] if datetime.strptime(name, NAME_FORMAT) < граница]
+    for name in удалить:
+        shutil.rmtree(os.path.join(хранилище.snapshots, name))
+    # Каталоги прерванных снимков
+    for name in os.listdir(хранилище.snapshots):
+        if name.endswith('.tmp'):
+            shutil.rmtree(os.path.join(хранилище.snapshots, name), ignore_errors=True)
+
+    нужные = set()
+    for name in хранилище.снимки():
+        for entry in хранилище.манифест(name)['файлы']:
+            нужные.update(sha256 for sha256, _ in entry['части'])
+    частей, байт = 0, 0
+    for dirpath, _, filenames in os.walk(хранилище.chunks):
+        for filename in filenames:
+            if filename not in нужные:
+                path = os.path.join(dirpath, filename)
+                байт += os.path.getsize(path)
+                os.unlink(path)
+                частей += 1
+    return удалить, частей, байт
+
+
+def мб(n):
+    return f'{n / 1024 ** 2:.1f} МБ'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', default=Config.BACKUP_DIR, help='Каталог хранилища (BACKUP_DIR)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('create', help='Создать снимок')
+    create.add_argument('--jobs', type=int, default=Config.BACKUP_JOBS)
+    create.add_argument('--no-db', action='store_true', help='Без дампа базы')
+
+    verify = commands.add_parser('verify', help='Проверить снимок без восстановления')
+    verify.add_argument('snapshot', nargs='?', help='По умолчанию последний')
+    verify.add_argument('--full', action='store_true', help='Перечитать части и сверить хеши')
+    verify.add_argument('--jobs', type=int, default=Config.BACKUP_JOBS)
+
+    restore = commands.add_parser('restore', help='Восстановить снимок')
+    restore.add_argument('snapshot')
+    restore.add_argument('--target', help='Каталог для файлов вместо исходных')
+    restore.add_argument('--no-files', action='store_true')
+    restore.add_argument('--no-db', action='store_true')
+    restore.add_argument('--jobs', type=int, default=Config.BACKUP_JOBS)
+
+    commands.add_parser('list', help='Список снимков')
+
+    prune = commands.add_parser('prune', help='Удалить старые снимки и ненужные части')
+    prune.add_argument('--keep-days', type=int, default=Config.BACKUP_KEEP_DAYS)
+    args = parser.parse_args()
+
+    хранилище = Хранилище(args.dir)
+    lock = хранилище.заблокировать()
+    try:
+        if args.command == 'create':
+            отчёт = создать(хранилище, args.jobs, with_db=not args.no_db)
+            print(f"Снимок {отчёт['снимок']}: {отчёт['секунд']} с, файлов {отчёт['файлов']} "
+                  f"(перечитано {отчёт['перечитано_файлов']}), прочитано {мб(отчёт['прочитано_байт'])}, "
+                  f"записано {мб(отчёт['записано_байт'])} (из них база {мб(отчёт['база_байт'])})")
+        elif args.command == 'verify':
+            снимки = хранилище.снимки()
+            name = args.snapshot or (снимки[-1] if снимки else None)
+            if name is None:
+                raise ОшибкаКопирования('Снимков нет')
+            проблемы = проверить(хранилище, name, args.jobs, full=args.full)
+            for проблема in проблемы:
+                print(проблема)
+            print(f'Снимок {name}: ' + (f'проблем {len(проблемы)}' if проблемы else 'в порядке'))
+            if проблемы:
+                sys.exit(1)
+        elif args.command == 'restore':
+            восстановлено, секунд = восстановить(
+                хранилище, args.snapshot, args.jobs, target=args.target,
+                files=not args.no_files, with_db=not args.no_db
+            )
+            print(f'Снимок {args.snapshot} восстановлен за {секунд:.1f} с, записано файлов {восстановлено}')
+        elif args.command == 'list':
+            for name in хранилище.снимки():
+                отчёт = хранилище.манифест(name)['отчёт']
+                print(f"{name}  файлов {отчёт['файлов']}  записано {мб(отчёт['записано_байт'])}  "
+                      f"{отчёт['секунд']} с")
+        elif args.command == 'prune':
+            удалены, частей, байт = удалить_старые(хранилище, args.keep_days)
+            print(f'Удалено снимков {len(удалены)}, частей {частей} ({мб(байт)})')
+    except (ОшибкаКопирования, subprocess.CalledProcessError) as e:
+        print(f'Ошибка: {e}', file=sys.stderr)
+        sys.exit(1)
+    finally:
+        lock.close()
+
+
+if __name__ == '__main__':
+    main()
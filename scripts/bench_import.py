@@ -0,0 +1,94 @@
+"""Замер скорости массового импорта сотрудников.
+
+Запуск из корня проекта (нужна база из .env с применёнными миграциями):
+    python scripts/bench_import.py [--rows 3000] [--format csv|xlsx] [--workers 1 4]
+
+Создаёт файл с rows синтетическими сотрудниками и импортирует его
+(employee_import.импортировать) при каждом числе процессов хеширования
+паролей, выводя строк/с по этапам: чтение, проверка, хеширование, вставка.
+Каждый прогон идёт в транзакции, которая откатывается, база не меняется.
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Отдел, Организация  # noqa: E402
+from employee_import import импортировать  # noqa: E402
+
+HEADERS = ['Фамилия', 'Имя', 'Отчество', 'Табельный номер', 'Должность', 'Email', 'Пароль', 'Отдел']
+
+
+def строки(count, отдел):
+    # Префикс от времени запуска, чтобы номера и email не совпали с уже существующими
+    prefix = f'b{int(time.time()) % 100000}'
+    for n in range(count):
+        yield [f'Фамилия{n}', f'Имя{n}', f'Отчество{n}', f'{prefix}-{n}', 'Специалист',
+               f'{prefix}.{n}@example.com', f'Пароль-{n}-{prefix}', отдел]
+
+
+def записать_файл(path, fmt, count, отдел):
+    if fmt == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(HEADERS)
+            writer.writerows(строки(count, отдел))
+        return
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(HEADERS)
+    for row in строки(count, отдел):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def отдел_для_замера():
+    """Название существующего отдела или нового, созданного в транзакции замера"""
+    отдел = Отдел.query.first()
+    if отдел:
+        return str(отдел.id)
+    организация = Организация.query.first() or Организация(название='Замер импорта')
+    отдел = Отдел(название='Замер импорта', организация=организация)
+    db.session.add(отдел)
+    db.session.flush()
+    return str(отдел.id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=3000)
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()])
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context(), tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'employees.{args.format}')
+        for workers in args.workers:
+            try:
+                записать_файл(path, args.format, args.rows, отдел_для_замера())
+                started = time.perf_counter()
+                отчёт = импортировать(path, workers=workers)
+                elapsed = time.perf_counter() - started
+                if отчёт.get('ошибка') or отчёт['ошибки']:
+                    print(f"Ошибки импорта: {отчёт.get('ошибка') or отчёт['ошибки'][:5]}")
+                    sys.exit(1)
+                этапы = ', '.join(
+                    f'{этап} {args.rows / секунд:.0f}/с' for этап, секунд in отчёт['секунд'].items() if секунд
+                )
+                print(f"процессов {workers}: {отчёт['добавлено'] / elapsed:.0f} строк/с "
+                      f'({elapsed:.1f} с); {этапы}')
+            finally:
+                db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
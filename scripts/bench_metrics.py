@@ -0,0 +1,70 @@
+"""Замер накладных расходов метрик (metrics.py).
+
+Запуск из корня проекта (нужна база из .env):
+    python scripts/bench_metrics.py [--queries 20000] [--requests 2000] [--max-overhead 5]
+
+Выполняет SELECT 1 и GET /login тестовым клиентом сначала без метрик,
+затем с ними, и выводит время на операцию и разницу. С --max-overhead
+(процентов на запрос страницы) завершается с кодом 1 при превышении.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Каталог multiprocess не нужен: замер идёт в одном процессе
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+from sqlalchemy import text  # noqa: E402
+from app import create_app  # noqa: E402
+from config import Config  # noqa: E402
+from extensions import db  # noqa: E402
+
+
+def замер(enabled, queries, requests):
+    """(мкс на SELECT 1, мкс на GET /login)"""
+    class BenchConfig(Config):
+        METRICS_ENABLED = enabled
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.session.execute(text('SELECT 1'))
+        started = time.perf_counter()
+        for _ in range(queries):
+            db.session.execute(text('SELECT 1'))
+        sql = (time.perf_counter() - started) / queries * 1e6
+        db.session.rollback()
+
+    client = app.test_client()
+    client.get('/login')
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get('/login')
+    page = (time.perf_counter() - started) / requests * 1e6
+    return sql, page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--max-overhead', type=float)
+    args = parser.parse_args()
+    # Журнал медленных запросов с EXPLAIN не должен влиять на замер
+    Config.SLOW_QUERY_MS = 0
+
+    # Сначала без метрик: обработчики событий SQLAlchemy после подключения не снимаются
+    sql_off, page_off = замер(False, args.queries, args.requests)
+    sql_on, page_on = замер(True, args.queries, args.requests)
+    overhead = (page_on - page_off) / page_off * 100
+    print(f'SELECT 1: {sql_off:.1f} мкс без метрик, {sql_on:.1f} мкс с метриками (+{sql_on - sql_off:.1f})')
+    print(f'GET /login: {page_off:.0f} мкс без метрик, {page_on:.0f} мкс с метриками ({overhead:+.1f}%)')
+    if args.max_overhead is not None and overhead > args.max_overhead:
+        print(f'Накладные расходы больше {args.max_overhead}%')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
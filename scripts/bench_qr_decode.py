@@ -0,0 +1,63 @@
+"""Замер распознавания QR-кодов на наборе фотографий.
+
+Запуск из корня проекта:
+    python scripts/bench_qr_decode.py <папка с фото> [--workers 1 2 4]
+
+Для каждого числа процессов выводит скорость (фото/с), долю распознанных
+и на каком этапе предобработки QR-код был найден.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qr_decode import decode_qr  # noqa: E402
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+
+def load_corpus(path):
+    images = []
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(path, name), 'rb') as f:
+                images.append(f.read())
+    return images
+
+
+def run(images, workers):
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(decode_qr, images))
+    elapsed = time.perf_counter() - started
+    stages = Counter(stage or 'не распознан' for _, stage in results)
+    return elapsed, stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('corpus', help='Папка с фотографиями QR-кодов')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()])
+    args = parser.parse_args()
+
+    images = load_corpus(args.corpus)
+    if not images:
+        sys.exit(f'В папке {args.corpus} нет изображений')
+
+    print(f'Фотографий: {len(images)}')
+    for workers in args.workers:
+        elapsed, stages = run(images, workers)
+        распознано = len(images) - stages.get('не распознан', 0)
+        print(f'\nПроцессов: {workers}')
+        print(f'  скорость: {len(images) / elapsed:.1f} фото/с ({elapsed:.2f} с)')
+        print(f'  распознано: {распознано / len(images):.1%}')
+        for stage, count in stages.most_common():
+            print(f'  {stage}: {count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+"""Замер маршрутов веб-приложения и обработчиков бота с бюджетами.
+
+Запуск из корня проекта на базе с синтетической организацией
+(python init_db.py --synthetic):
+    python scripts/bench_routes.py [--runs 5] [--only documents /unread]
+        [--no-bot] [--admin-email synthetic-admin@example.com]
+
+Каждый маршрут Flask запрашивается тестовым клиентом от имени
+пользователя нужной роли; каждый обработчик бота получает поддельный
+Update, а ответы бота принимает поддельный Bot API (fake_telegram.py).
+Для каждого случая считается наибольшее число SQL-запросов (событие
+before_cursor_execute) и медиана времени по --runs прогонам после
+прогревочного. Бюджеты заданы в ROUTES и BOT_HANDLERS рядом с URL:
+при превышении хотя бы одного скрипт завершается с кодом 1, поэтому
+изменение, добавившее запрос в цикле или медленный запрос, видно сразу.
+Бюджеты рассчитаны на масштаб init_db.py --synthetic по умолчанию.
+
+Изменяющие данные запросы (POST, подтверждение прочтения) не замеряются:
+фото QR-кода отправляется для документа, который сотрудник уже подтвердил,
+и обработчик только сообщает дату прежнего подтверждения.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_telegram import make_handler, Сообщения  # noqa: E402
+
+# (название, URL, роль, запросов не больше, мс не больше);
+# в URL подставляются id из данные_для_замера()
+ROUTES = [
+    ('login', '/login', None, 0, 50),
+    ('index', '/', 'сотрудник', 1, 50),
+    ('documents', '/documents', 'администратор', 6, 400),
+    ('documents по прогрессу', '/documents?sort=progress', 'администратор', 6, 800),
+    ('documents по отделу', '/documents?отдел_id={отдел_id}&отдел_сотрудников_id={отдел_id}',
+     'администратор', 6, 300),
+    ('documents сотрудника', '/documents', 'сотрудник', 6, 300),
+    ('search', '/search?q=пожарная+безопасность', 'администратор', 4, 300),
+    ('search сотрудника', '/search?q=охрана+труда', 'сотрудник', 4, 300),
+    ('statistics', '/statistics', 'администратор', 4, 800),
+    ('statistics по отделу', '/statistics?department_id={отдел_id}', 'администратор', 4, 300),
+    ('export_statistics', '/export_statistics?format=csv&department_id={отдел_id}', 'администратор', 3, 3000),
+    ('export_statistics/employees',
+     '/export_statistics/employees?format=csv&department_id={отдел_id}&start_date={месяц_назад}',
+     'администратор', 3, 5000),
+    ('qr_sheets', '/qr_sheets?department_id={отдел_id}&start_date={неделя_назад}', 'администратор', 3, 10000),
+    ('get_qr_code', '/get_qr_code/{документ_id}', 'сотрудник', 3, 100),
+    ('preview', '{превью}', 'сотрудник', 3, 2000),
+    ('download', '/download/{документ_id}', 'сотрудник', 3, 100),
+    ('upload', '/upload', 'администратор', 1, 50),
+    ('users', '/users', 'администратор', 2, 200),
+    ('departments', '/departments', 'администратор', 1, 50),
+    ('add_department', '/add_department', 'администратор', 1, 50),
+    ('add_employee', '/add_employee', 'администратор', 1, 50),
+    ('edit_department', '/edit_department/{отдел_id}', 'администратор', 2, 50),
+    ('edit_position', '/edit_position/{сотрудник_id}', 'администратор', 2, 50),
+    ('import_employees', '/import_employees', 'администратор', 1, 50),
+    ('archive', '/archive', 'администратор', 3, 300),
+]
+
+# (название, текст сообщения или callback_data, чей чат, запросов не больше, мс не больше,
+#  подготовка, уборка); подготовка и уборка - сообщения, которые не замеряются.
+# photo:<file_id> - фото, которое отдаёт поддельный Bot API (см. файлы_для_замера)
+BOT_HANDLERS = [
+    ('/help', '/help', 'зарегистрированный', 0, 50, [], []),
+    ('/start', '/start', 'зарегистрированный', 5, 150, [], []),
+    ('/stats', '/stats', 'зарегистрированный', 3, 200, [], []),
+    ('/unread', '/unread', 'зарегистрированный', 3, 300, ['сбросить кэш'], []),
+    ('unread: листание', 'callback:unread:1', 'зарегистрированный', 1, 50, ['/unread'], []),
+    ('регистрация: табельный номер', '{табельный_номер}', 'новый', 4, 150, ['/start'], ['/cancel']),
+    ('process_qr: уже подтверждён', 'photo:qr-{прочитанный_id}', 'зарегистрированный', 4, 500, [], []),
+]
+
+
+class СчётчикЗапросов:
+    """Число SQL-запросов, выполненных движком с момента сброса"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+def _процентиль(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def замерить(выполнить, счётчик, runs):
+    """(наибольшее число запросов, медиана мс, p95 мс); первый прогон - прогревочный"""
+    выполнить()
+    запросов, timings = 0, []
+    for _ in range(runs):
+        счётчик.count = 0
+        started = time.perf_counter()
+        выполнить()
+        timings.append((time.perf_counter() - started) * 1000)
+        запросов = max(запросов, счётчик.count)
+    return запросов, statistics.median(timings), _процентиль(timings, 0.95)
+
+
+def вывести(название, запросов, p50, p95, бюджет_запросов, бюджет_мс):
+    превышено = запросов > бюджет_запросов or p50 > бюджет_мс
+    print(f"{'!!' if превышено else '  '} {название:<40} запросов {запросов:>3}/{бюджет_запросов:<3} "
+          f"p50 {p50:7.1f}/{бюджет_мс} мс  p95 {p95:7.1f} мс")
+    return not превышено
+
+
+def данные_для_замера(admin_email):
+    """Пользователи и id для подстановки в URL: отдел с наибольшим числом документов"""
+    from extensions import db
+    from models import Сотрудник, Документ, ДокументОтдела, ПрочтениеДокумента
+
+    admin = Сотрудник.query.filter_by(email=admin_email).first()
+    if admin is None:
+        sys.exit(f'Нет администратора {admin_email}; заполните базу: python init_db.py --synthetic')
+    отдел_id = db.session.scalar(
+        db.select(ДокументОтдела.отдел_id).group_by(ДокументОтдела.отдел_id)
+        .order_by(db.func.count().desc()).limit(1)
+    )
+    сотрудник = Сотрудник.query.filter_by(
+        отдел_id=отдел_id, роль='сотрудник', статус_регистрации=True
+    ).order_by(Сотрудник.id).first()
+    новый = Сотрудник.query.filter_by(статус_регистрации=False, роль='сотрудник').order_by(Сотрудник.id).first()
+    документ = Документ.query.join(ДокументОтдела).filter(
+        ДокументОтдела.отдел_id == отдел_id
+    ).order_by(Документ.id.desc()).first()
+    прочитанный_id = сотрудник and db.session.scalar(
+        db.select(ПрочтениеДокумента.документ_id).where(ПрочтениеДокумента.сотрудник_id == сотрудник.id)
+        .order_by(ПрочтениеДокумента.документ_id.desc()).limit(1)
+    )
+    if not (отдел_id and сотрудник and новый and документ and прочитанный_id):
+        sys.exit('В базе мало данных для замера; заполните её: python init_db.py --synthetic')
+    return {
+        'admin': admin, 'сотрудник': сотрудник, 'новый': новый, 'документ': документ,
+        'подстановки': {
+            'отдел_id': отдел_id,
+            'документ_id': документ.id,
+            'сотрудник_id': сотрудник.id,
+            'прочитанный_id': прочитанный_id,
+            'табельный_номер': новый.табельный_номер,
+            'месяц_назад': (date.today() - timedelta(days=30)).isoformat(),
+            'неделя_назад': (date.today() - timedelta(days=7)).isoformat(),
+        },
+    }
+
+
+def файлы_для_замера(данные):
+    """Файлы поддельного Bot API: QR-код документа, уже подтверждённого сотрудником"""
+    from qr_service import рендер_qr
+
+    прочитанный_id = данные['подстановки']['прочитанный_id']
+    return {f'qr-{прочитанный_id}': рендер_qr(прочитанный_id, 'png')}
+
+
+def замерить_маршруты(app, данные, runs, only):
+    from sqlalchemy import event
+    from extensions import db
+    from previews import preview_url
+
+    # Каждый запрос - в своём контексте приложения и своей сессии, как под gunicorn
+    with app.app_context():
+        engine = db.engine
+    счётчик = СчётчикЗапросов()
+    event.listen(engine, 'before_cursor_execute', счётчик)
+    with app.test_request_context():
+        подстановки = dict(данные['подстановки'], превью=preview_url(данные['документ'], 'png'))
+
+    клиенты = {}
+    for роль, пользователь in ((None, None), ('администратор', данные['admin']),
+                               ('сотрудник', данные['сотрудник'])):
+        client = app.test_client()
+        if пользователь is not None:
+            with client.session_transaction() as session:
+                session['_user_id'] = str(пользователь.id)
+                session['_fresh'] = True
+        клиенты[роль] = client
+
+    print('Маршруты веб-приложения:')
+    ok = True
+    for название, url, роль, бюджет_запросов, бюджет_мс in ROUTES:
+        if only and название not in only:
+            continue
+        url = url.format(**подстановки)
+        client = клиенты[роль]
+
+        def запрос():
+            response = client.get(url)
+            response.get_data()
+            if response.status_code >= 400:
+                raise RuntimeError(f'{url}: HTTP {response.status_code}')
+
+        try:
+            запросов, p50, p95 = замерить(запрос, счётчик, runs)
+        except RuntimeError as e:
+            print(f'!! {название:<40} {e}')
+            ok = False
+            continue
+        ok &= вывести(название, запросов, p50, p95, бюджет_запросов, бюджет_мс)
+    event.remove(engine, 'before_cursor_execute', счётчик)
+    return ok
+
+
+def _update(update_id, chat_id, text):
+    """Update в формате Bot API: сообщение, нажатие кнопки (callback:<data>) или фото (photo:<file_id>)"""
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'Замер'}
+    chat = {'id': chat_id, 'type': 'private'}
+    if text.startswith('callback:'):
+        return {'update_id': update_id, 'callback_query': {
+            'id': str(update_id), 'from': user, 'chat_instance': str(chat_id),
+            'data': text.split(':', 1)[1],
+            'message': {'message_id': 1, 'date': int(time.time()), 'chat': chat, 'text': '…'},
+        }}
+    message = {'message_id': update_id, 'date': int(time.time()), 'chat': chat, 'from': user}
+    if text.startswith('photo:'):
+        file_id = text.split(':', 1)[1]
+        message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 640, 'height': 640}]
+        return {'update_id': update_id, 'message': message}
+    message['text'] = text
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+async def замерить_бота(данные, runs, only):
+    from sqlalchemy import event
+    from telegram import Update
+    import async_db
+    import bot
+    from qr_decode import QRDecoder
+    from unread_cache import UnreadCache
+
+    application = bot.build_application()
+    await application.initialize()
+    application.bot_data['unread_cache'] = UnreadCache()
+    application.bot_data['qr_decoder'] = QRDecoder()
+    счётчик = СчётчикЗапросов()
+    event.listen(async_db.engine.sync_engine, 'before_cursor_execute', счётчик)
+    чаты = {
+        'зарегистрированный': данные['сотрудник'].telegram_id,
+        # Чат, не привязанный ни к одному сотруднику
+        'новый': 3 * 10 ** 9 + os.getpid(),
+    }
+    update_id = int(time.time())
+
+    async def отправить(chat_id, text):
+        nonlocal update_id
+        if text == 'сбросить кэш':
+            application.bot_data['unread_cache'].invalidate(chat_id)
+            return
+        update_id += 1
+        await application.process_update(Update.de_json(_update(update_id, chat_id, text), application.bot))
+
+    print('Обработчики бота:')
+    ok = True
+    for название, text, чат, бюджет_запросов, бюджет_мс, подготовка, уборка in BOT_HANDLERS:
+        if only and название not in only:
+            continue
+        chat_id = чаты[чат]
+        text = text.format(**данные['подстановки'])
+        запросов, timings = 0, []
+        for run in range(runs + 1):
+            for шаг in подготовка:
+                await отправить(chat_id, шаг)
+            счётчик.count = 0
+            started = time.perf_counter()
+            await отправить(chat_id, text)
+            elapsed = (time.perf_counter() - started) * 1000
+            for шаг in уборка:
+                await отправить(chat_id, шаг)
+            if run:  # первый прогон - прогревочный
+                timings.append(elapsed)
+                запросов = max(запросов, счётчик.count)
+        ok &= вывести(название, запросов, statistics.median(timings), _процентиль(timings, 0.95),
+                      бюджет_запросов, бюджет_мс)
+    event.remove(async_db.engine.sync_engine, 'before_cursor_execute', счётчик)
+    application.bot_data['qr_decoder'].shutdown()
+    await application.shutdown()
+    await async_db.закрыть()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--only', nargs='+', help='Замерить только случаи с этими названиями')
+    parser.add_argument('--no-bot', action='store_true', help='Не замерять обработчики бота')
+    parser.add_argument('--admin-email', default='synthetic-admin@example.com')
+    parser.add_argument('--port', type=int, default=8082, help='Порт поддельного Bot API')
+    args = parser.parse_args()
+
+    # Config читает окружение при импорте, поэтому модули проекта импортируются после настройки
+    os.environ['TELEGRAM_API_URL'] = f'http://127.0.0.1:{args.port}/bot'
+    os.environ['TELEGRAM_FILE_URL'] = f'http://127.0.0.1:{args.port}/file/bot'
+    os.environ['TELEGRAM_BOT_TOKEN'] = '1:bench'
+    os.environ['BOT_MODE'] = 'webhook'
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        данные = данные_для_замера(args.admin_email)
+    ok = замерить_маршруты(app, данные, args.runs, args.only)
+
+    if not args.no_bot:
+        server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(Сообщения(), файлы_для_замера(данные)))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            ok &= asyncio.run(замерить_бота(данные, args.runs, args.only))
+        finally:
+            server.shutdown()
+
+    print('Бюджеты соблюдены' if ok else 'Бюджеты превышены')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
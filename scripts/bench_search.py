@@ -0,0 +1,135 @@
+"""Замер индексации и полнотекстового поиска на синтетическом объёме.
+
+Запуск из корня проекта (нужна база из .env с применёнными миграциями):
+    python scripts/bench_search.py [--documents 100000] [--queries 200]
+        [--corpus <папка с файлами>] [--workers 1 4]
+
+В одной транзакции добавляет документы с синтетическим текстом файлов,
+пересчитывает их поисковые векторы (скорость индексации, включая GIN-индекс)
+и выполняет поисковые запросы как администратор (p50/p99 задержки первой
+страницы с подсветкой). В конце транзакция откатывается, база не меняется.
+
+С --corpus дополнительно замеряет скорость извлечения текста из реальных
+файлов (pdf, docx, xlsx, txt) при разном числе процессов.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Документ, Файл  # noqa: E402
+from search import найти_документы, обновить_поисковые_векторы  # noqa: E402
+from text_extraction import extract_text  # noqa: E402
+
+WORDS = (
+    'приказ распоряжение положение инструкция регламент порядок пожарный безопасность '
+    'охрана труд отпуск график командировка премия оплата договор поставка склад учёт '
+    'инвентаризация обучение аттестация персонал информационный защита данные доступ '
+    'пропуск режим смена дежурство эвакуация проверка комиссия отчёт квартал бюджет '
+    'закупка оборудование ремонт техника электрический медицинский осмотр стажировка'
+).split()
+
+QUERIES = [
+    'пожарная безопасность', 'приказ об отпуске', '"охрана труда"', 'инструкция -ремонт',
+    'график дежурств', 'инвентаризация склада', 'защита данных OR доступ', 'премия квартал',
+]
+
+BATCH = 5000
+
+
+def текст(rng, слов):
+    return ' '.join(rng.choice(WORDS) for _ in range(слов))
+
+
+def наполнить(count, слов, seed):
+    """Добавить count файлов и документов; возвращает id первого документа"""
+    rng = random.Random(seed)
+    первый = None
+    for start in range(0, count, BATCH):
+        n = min(BATCH, count - start)
+        файлы = db.session.execute(
+            db.insert(Файл).returning(Файл.id),
+            [{'sha256': f'{rng.getrandbits(256):064x}', 'размер': слов * 8, 'число_ссылок': 1,
+              'текст': текст(rng, слов), 'версия_извлечения': 1} for _ in range(n)]
+        ).scalars().all()
+        ids = db.session.execute(
+            db.insert(Документ).returning(Документ.id),
+            [{'название': текст(rng, 6).capitalize(), 'файл_id': файл_id,
+              'тип_документа': rng.choice(['Приказ', 'Распоряжение', 'Инструкция']),
+              'срок_ознакомления': date(2025, 12, 31), 'дата_создания': datetime.utcnow()}
+             for файл_id in файлы]
+        ).scalars().all()
+        первый = первый or min(ids)
+    return первый
+
+
+def bench_corpus(path, workers_list):
+    files = [os.path.join(path, name) for name in sorted(os.listdir(path))
+             if os.path.isfile(os.path.join(path, name))]
+    if not files:
+        sys.exit(f'В папке {path} нет файлов')
+    size = sum(os.path.getsize(f) for f in files)
+    print(f'\nФайлов: {len(files)}, {size / 1024 ** 2:.1f} МБ')
+    for workers in workers_list:
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chars = sum(len(t) for t in executor.map(extract_text, files))
+        elapsed = time.perf_counter() - started
+        print(f'  процессов {workers}: {len(files) / elapsed:.1f} файлов/с, '
+              f'{size / 1024 ** 2 / elapsed:.1f} МБ/с, символов {chars}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=300, help='Слов в тексте файла')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--corpus', help='Папка с файлами для замера извлечения текста')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()])
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        try:
+            started = time.perf_counter()
+            первый = наполнить(args.documents, args.words, args.seed)
+            print(f'Вставка {args.documents} документов: {time.perf_counter() - started:.1f} с')
+
+            started = time.perf_counter()
+            обновить_поисковые_векторы(Документ.id >= первый)
+            elapsed = time.perf_counter() - started
+            print(f'Индексация: {args.documents / elapsed:.0f} документов/с ({elapsed:.1f} с)')
+            db.session.execute(db.text('ANALYZE документы'))
+
+            администратор = SimpleNamespace(роль='администратор', отдел_id=None)
+            timings = []
+            for i in range(args.queries):
+                q = QUERIES[i % len(QUERIES)]
+                started = time.perf_counter()
+                page = найти_документы(q, администратор, per_page=20)
+                timings.append((time.perf_counter() - started) * 1000)
+                if i < len(QUERIES):
+                    print(f'  {q!r}: {len(page)} на первой странице')
+            timings.sort()
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            print(f'Поиск: p50 {statistics.median(timings):.1f} мс, p99 {p99:.1f} мс, '
+                  f'запросов {len(timings)}')
+        finally:
+            db.session.rollback()
+
+    if args.corpus:
+        bench_corpus(args.corpus, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Замер запуска веб-приложения и памяти воркеров gunicorn.
+
+Запуск из корня проекта (нужна настроенная база из .env):
+    python scripts/bench_startup.py [--runs 5] [--workers 4]
+        [--max-startup 1.5] [--max-rss 80]
+
+Выводит медиану времени импорта и create_app() в отдельном процессе,
+тяжёлые модули, попавшие в веб-процесс, и RSS/PSS каждого воркера после
+первых запросов. С --max-startup (секунд) и --max-rss (МБ на воркер)
+завершается с кодом 1 при превышении.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули, которым не место в веб-процессе при старте
+HEAVY_MODULES = ['telegram', 'bot', 'dispatcher', 'pyzbar', 'PIL', 'qrcode', 'openpyxl', 'pypdf']
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+print(json.dumps({{
+    'seconds': time.perf_counter() - started,
+    'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure_startup(runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE], cwd=ROOT, check=True,
+            capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return statistics.median(r['seconds'] for r in results), results[-1]['heavy']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def memory_mb(pid):
+    """(RSS, PSS) процесса в МБ; PSS честнее делит общие после fork страницы"""
+    values = {}
+    for name in ('status', 'smaps_rollup'):
+        try:
+            with open(f'/proc/{pid}/{name}') as f:
+                for line in f:
+                    key, _, rest = line.partition(':')
+                    if key in ('VmRSS', 'Pss'):
+                        values[key] = int(rest.split()[0]) / 1024
+        except FileNotFoundError:
+            pass
+    return values.get('VmRSS', 0.0), values.get('Pss', 0.0)
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+
+def measure_workers(workers, requests_per_worker=20):
+    port = free_port()
+    env = dict(os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKERS=str(workers))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        url = f'http://127.0.0.1:{port}/login'
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(url, timeout=2).read()
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise SystemExit('gunicorn не запустился')
+                time.sleep(0.2)
+        for _ in range(workers * requests_per_worker):
+            urllib.request.urlopen(url, timeout=5).read()
+        return memory_mb(server.pid), [memory_mb(pid) for pid in children(server.pid)]
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-startup', type=float, help='Предел времени запуска, секунд')
+    parser.add_argument('--max-rss', type=float, help='Предел RSS воркера, МБ')
+    args = parser.parse_args()
+
+    failed = False
+    seconds, heavy = measure_startup(args.runs)
+    print(f'Импорт и create_app(): {seconds:.3f} с (медиана из {args.runs})')
+    print(f'Тяжёлые модули при старте: {", ".join(heavy) or "нет"}')
+    if heavy:
+        failed = True
+    if args.max_startup and seconds > args.max_startup:
+        print(f'  превышен предел {args.max_startup} с')
+        failed = True
+
+    (master_rss, master_pss), workers = measure_workers(args.workers)
+    print(f'\nМастер: RSS {master_rss:.1f} МБ, PSS {master_pss:.1f} МБ')
+    for n, (rss, pss) in enumerate(workers, 1):
+        print(f'Воркер {n}: RSS {rss:.1f} МБ, PSS {pss:.1f} МБ')
+        if args.max_rss and rss > args.max_rss:
+            print(f'  превышен предел {args.max_rss} МБ')
+            failed = True
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
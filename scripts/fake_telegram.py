@@ -0,0 +1,252 @@
+"""Поддельный Telegram Bot API для проверки бота в режиме webhook.
+
+Запуск из корня проекта (веб-приложение и процессы бота уже запущены):
+    python scripts/fake_telegram.py --webhook http://127.0.0.1:8000/telegram/webhook
+        --secret <TELEGRAM_WEBHOOK_SECRET> [--port 8081] [--chats 50] [--messages 10]
+        [--register <табельный номер> <отдел> <телефон>]
+
+Бот запускается с BOT_MODE=webhook, любым токеном и
+TELEGRAM_API_URL=http://127.0.0.1:8081/bot: на вызовы Bot API (getMe,
+sendMessage, setWebhook и др.) отвечает этот скрипт и записывает сообщения
+бота. Скрипт проверяет, что обновление с неверным секретом отклоняется,
+отправляет на webhook команды /help от нескольких чатов и ждёт ответ на
+каждую, проверяя порядок ответов в каждом чате; выводит задержку p50/p99
+от отправки обновления до ответа бота. С --register проходит регистрацию
+сотрудника по шагам (изменяет базу: сотруднику записывается тестовый
+telegram_id), что проверяет продолжение диалога любым процессом бота.
+Завершается с кодом 1 при ошибке.
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+
+
+class Сообщения:
+    """Сообщения, отправленные ботом, по чатам"""
+
+    def __init__(self):
+        self.by_chat = {}
+        self.condition = threading.Condition()
+        self.message_id = 0
+
+    def add(self, chat_id, text):
+        with self.condition:
+            self.message_id += 1
+            self.by_chat.setdefault(chat_id, []).append((time.perf_counter(), text))
+            self.condition.notify_all()
+            return self.message_id
+
+    def wait(self, chat_id, count, timeout):
+        """Дождаться count сообщений в чате; возвращает их список"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while len(self.by_chat.get(chat_id, [])) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return list(self.by_chat.get(chat_id, []))
+
+
+def _params(handler):
+    length = int(handler.headers.get('Content-Length') or 0)
+    body = handler.rfile.read(length).decode('utf-8') if length else ''
+    if handler.headers.get('Content-Type', '').startswith('application/json'):
+        return json.loads(body or '{}')
+    params = {}
+    for key, value in urllib.parse.parse_qsl(body):
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+
+def make_handler(сообщения, файлы=None):
+    """Обработчик Bot API; файлы - {file_id: содержимое} для getFile и скачивания"""
+    файлы = файлы or {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def _ответить(self, data, content_type):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path.startswith('/file/'):
+                # Скачивание файла: /file/bot<токен>/<file_path>, file_path равен file_id
+                file_id = urllib.parse.unquote(self.path.rsplit('/', 1)[-1])
+                if file_id not in файлы:
+                    self.send_error(404)
+                    return
+                self._ответить(файлы[file_id], 'application/octet-stream')
+                return
+            method = self.path.rstrip('/').rsplit('/', 1)[-1]
+            params = _params(self)
+            if method == 'getMe':
+                result = BOT_USER
+            elif method in ('sendMessage', 'editMessageText'):
+                chat_id = int(params['chat_id'])
+                result = {
+                    'message_id': сообщения.add(chat_id, params.get('text', '')),
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'from': BOT_USER,
+                    'text': params.get('text', ''),
+                }
+            elif method == 'getWebhookInfo':
+                result = {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
+            elif method == 'getFile':
+                file_id = params['file_id']
+                result = {'file_id': file_id, 'file_unique_id': file_id,
+                          'file_size': len(файлы.get(file_id, b'')), 'file_path': file_id}
+            else:
+                result = True
+            self._ответить(json.dumps({'ok': True, 'result': result}).encode('utf-8'), 'application/json')
+
+        do_GET = do_POST
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class Клиент:
+    """Отправка обновлений на webhook от имени Telegram"""
+
+    def __init__(self, webhook, secret):
+        self.webhook = webhook
+        self.secret = secret
+        self.update_id = int(time.time())
+        self.lock = threading.Lock()
+
+    def _next_id(self):
+        with self.lock:
+            self.update_id += 1
+            return self.update_id
+
+    def post(self, update, secret=None):
+        request = urllib.request.Request(
+            self.webhook, data=json.dumps(update).encode('utf-8'), method='POST',
+            headers={'Content-Type': 'application/json',
+                     'X-Telegram-Bot-Api-Secret-Token': secret or self.secret}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def message(self, chat_id, text):
+        update_id = self._next_id()
+        message = {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Тест'},
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return self.post({'update_id': update_id, 'message': message})
+
+
+def проверить_нагрузку(клиент, сообщения, chats, messages, timeout):
+    """Команды /help от chats чатов по messages в каждом; возвращает задержки, мс"""
+    chat_ids = [10 ** 9 + n for n in range(chats)]
+    sent = {chat_id: [] for chat_id in chat_ids}
+
+    def send_chat(chat_id):
+        for _ in range(messages):
+            sent[chat_id].append(time.perf_counter())
+            status = клиент.message(chat_id, '/help')
+            if status != 200:
+                raise RuntimeError(f'webhook ответил {status}')
+
+    with ThreadPoolExecutor(max_workers=min(32, chats)) as executor:
+        list(executor.map(send_chat, chat_ids))
+
+    timings, missing = [], 0
+    for chat_id in chat_ids:
+        replies = сообщения.wait(chat_id, messages, timeout)
+        missing += max(0, messages - len(replies))
+        # Ответы в чате приходят в порядке команд, поэтому i-й ответ относится к i-й команде
+        for sent_at, (replied_at, _) in zip(sent[chat_id], replies):
+            timings.append((replied_at - sent_at) * 1000)
+    return timings, missing
+
+
+def проверить_регистрацию(клиент, сообщения, шаги, timeout):
+    chat_id = 2 * 10 ** 9
+    ответы = []
+    for n, text in enumerate(['/start'] + шаги, 1):
+        клиент.message(chat_id, text)
+        replies = сообщения.wait(chat_id, n, timeout)
+        if len(replies) < n:
+            return False, ответы
+        ответы.append(replies[-1][1])
+    return 'Регистрация завершена' in ответы[-1], ответы
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--webhook', required=True, help='URL /telegram/webhook веб-приложения')
+    parser.add_argument('--secret', required=True, help='TELEGRAM_WEBHOOK_SECRET')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=10, help='Команд от каждого чата')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--register', nargs=3, metavar=('НОМЕР', 'ОТДЕЛ', 'ТЕЛЕФОН'))
+    args = parser.parse_args()
+
+    сообщения = Сообщения()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(сообщения))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f'Поддельный Bot API: http://127.0.0.1:{args.port}/bot')
+
+    клиент = Клиент(args.webhook, args.secret)
+    ok = True
+
+    status = клиент.post({'update_id': 1, 'message': {}}, secret='wrong')
+    print(f'Неверный секрет: HTTP {status}')
+    ok &= status == 403
+
+    started = time.perf_counter()
+    timings, missing = проверить_нагрузку(клиент, сообщения, args.chats, args.messages, args.timeout)
+    elapsed = time.perf_counter() - started
+    всего = args.chats * args.messages
+    if timings:
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f'Команд: {всего} за {elapsed:.1f} с ({всего / elapsed:.0f}/с), '
+              f'ответ p50 {statistics.median(timings):.0f} мс, p99 {p99:.0f} мс')
+    if missing:
+        print(f'Нет ответа на {missing} команд')
+        ok = False
+
+    if args.register:
+        завершена, ответы = проверить_регистрацию(клиент, сообщения, list(args.register), args.timeout)
+        for ответ in ответы:
+            print(f'  бот: {ответ.splitlines()[0]}')
+        print(f'Регистрация: {"OK" if завершена else "не завершена"}')
+        ok &= завершена
+
+    server.shutdown()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,24 @@
 #!/bin/bash
+# Восстановление файлов и базы из снимка (список: scripts/backup.py list)
+set -e
 
-# Проверяем, что переданы параметры
-if [ $# -ne 2 ]; then
-    echo "Usage: $0 <database_backup_file> <uploads_backup_file>"
+if [ $# -ne 1 ]; then
+    echo "Usage: $0 <snapshot>"
     exit 1
 fi
 
-DB_BACKUP=$1
-UPLOADS_BACKUP=$2
-DB_NAME="doc_management"
-DB_USER="doc_user"
+cd "$(dirname "$0")/.."
+PYTHON=${PYTHON:-venv/bin/python}
 
-# Проверяем существование файлов
-if [ ! -f "$DB_BACKUP" ]; then
-    echo "Database backup file not found: $DB_BACKUP"
-    exit 1
-fi
-
-if [ ! -f "$UPLOADS_BACKUP" ]; then
-    echo "Uploads backup file not found: $UPLOADS_BACKUP"
-    exit 1
-fi
+# Проверяем снимок до остановки сервисов
+$PYTHON scripts/backup.py verify "$1"
 
 # Останавливаем сервисы
 systemctl stop docmanagement
 systemctl stop docmanagement-bot
 
-# Восстанавливаем базу данных
-psql -U $DB_USER -d $DB_NAME < $DB_BACKUP
-
-# Восстанавливаем файлы
-tar -xzf $UPLOADS_BACKUP -C /
+# Восстанавливаем файлы и базу (pg_restore -j)
+$PYTHON scripts/backup.py restore "$1"
 
 # Запускаем сервисы
 systemctl start docmanagement
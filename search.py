@@ -0,0 +1,94 @@
+"""Полнотекстовый поиск по названиям и содержимому документов.
+
+У каждого документа хранится tsvector (конфигурация russian): название
+с весом A и текст файла с весом B. Вектор пересчитывается при создании
+документа и после извлечения текста файла (text_extraction.py) и
+проиндексирован GIN-индексом ix_документы_поиск.
+"""
+from markupsafe import Markup, escape
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from extensions import db
+from models import Документ, ДокументОтдела, Файл
+from pagination import paginate_keyset
+
+RUSSIAN = db.literal_column("'russian'::regconfig")
+
+СОРТИРОВКИ_ПОИСКА = {
+    'rank': ('Релевантность', True),
+    'created': ('Дата создания', True),
+}
+
+# Маркеры подсветки из символов частной области Unicode: фрагмент сначала
+# экранируется целиком, и только потом маркеры заменяются на <mark>
+START_SEL, STOP_SEL = '\ue000', '\ue001'
+HEADLINE_OPTIONS = f'StartSel={START_SEL}, StopSel={STOP_SEL}, MaxFragments=2, MinWords=10, MaxWords=25'
+TITLE_OPTIONS = f'StartSel={START_SEL}, StopSel={STOP_SEL}, HighlightAll=true'
+
+
+def поисковый_вектор():
+    """SQL-выражение вектора документа из названия и текста его файла"""
+    текст = db.select(
+        db.func.setweight(db.func.to_tsvector(RUSSIAN, Файл.текст), 'B')
+    ).where(Файл.id == Документ.файл_id).correlate(Документ).scalar_subquery()
+    название = db.func.setweight(
+        db.func.to_tsvector(RUSSIAN, db.func.coalesce(Документ.название, '')), 'A'
+    )
+    return название.op('||')(db.func.coalesce(текст, db.cast('', TSVECTOR)))
+
+
+def обновить_поисковые_векторы(*criteria, session=None):
+    """Пересчитать векторы документов, подходящих под условия, одним UPDATE"""
+    session = session or db.session
+    session.execute(
+        db.update(Документ).where(*criteria).values(поисковый_вектор=поисковый_вектор()),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def _подсветить(fragment):
+    if not fragment:
+        return None
+    return Markup(str(escape(fragment)).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>'))
+
+
+def найти_документы(запрос, сотрудник, sort='rank', cursor=None, direction='next', per_page=None):
+    """Страница документов по поисковому запросу.
+
+    Запрос разбирается websearch_to_tsquery: поддерживаются "фразы",
+    OR и -исключение. Сотрудник, кроме администратора, находит только
+    документы своего отдела. Элементы страницы - словари с ключами
+    документ, название и фрагмент (подсвеченные Markup).
+    """
+    tsquery = db.func.websearch_to_tsquery(RUSSIAN, запрос)
+    query = db.session.query(Документ).filter(Документ.поисковый_вектор.op('@@')(tsquery))
+    if сотрудник.роль != 'администратор':
+        query = query.filter(db.exists().where(
+            ДокументОтдела.документ_id == Документ.id,
+            ДокументОтдела.отдел_id == сотрудник.отдел_id
+        ))
+
+    sort_expr = {
+        # Нормализация 1 - деление на логарифм длины, чтобы длинные файлы не вытесняли остальные
+        'rank': db.cast(db.func.ts_rank_cd(Документ.поисковый_вектор, tsquery, 1), db.Float),
+        'created': Документ.дата_создания,
+    }[sort]
+    page = paginate_keyset(query, sort, sort_expr, Документ.id,
+                           СОРТИРОВКИ_ПОИСКА[sort][1], cursor, direction, per_page)
+
+    # Фрагменты строятся только для строк страницы: ts_headline разбирает весь текст заново
+    фрагменты = {}
+    if page.items:
+        фрагменты = {row.id: row for row in db.session.query(
+            Документ.id,
+            db.func.ts_headline(RUSSIAN, Документ.название, tsquery, TITLE_OPTIONS).label('название'),
+            db.func.ts_headline(RUSSIAN, Файл.текст, tsquery, HEADLINE_OPTIONS).label('фрагмент')
+        ).outerjoin(
+            Файл, Файл.id == Документ.файл_id
+        ).filter(Документ.id.in_([док.id for док in page.items]))}
+
+    page.items = [{
+        'документ': док,
+        'название': _подсветить(фрагменты[док.id].название) or док.название,
+        'фрагмент': _подсветить(фрагменты[док.id].фрагмент),
+    } for док in page.items]
+    return page
@@ -0,0 +1,172 @@
+"""Хранилище загруженных файлов с адресацией по содержимому.
+
+Файл хранится один раз под именем objects/<первые 2 символа sha256>/<sha256>
+внутри UPLOAD_FOLDER, а таблица файлы считает ссылки на него из документов.
+Одинаковые загрузки не занимают место повторно, а файл удаляется с диска
+только когда на него не остаётся ни одной ссылки.
+
+Размещение объекта и его удаление с диска сериализуются рекомендательной
+блокировкой по sha256: удаление после коммита ждёт транзакцию, которая
+как раз размещает то же содержимое, и не трогает объект, если на него
+снова сослались. Объект, размещённый транзакцией, которая затем
+откатилась, остаётся без строки в таблице файлы; такие объекты удаляет
+flask clean-uploads.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from sqlalchemy.exc import IntegrityError
+from flask import current_app
+from extensions import db
+from models import Документ, Файл
+
+# Размер блока при чтении загружаемого файла
+CHUNK_SIZE = 1024 * 1024
+
+
+def путь_объекта(sha256):
+    """Путь к объекту относительно UPLOAD_FOLDER"""
+    return os.path.join('objects', sha256[:2], sha256)
+
+
+def полный_путь(путь_к_файлу):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], путь_к_файлу)
+
+
+def заблокировать_объект(sha256):
+    """Рекомендательная блокировка объекта хранилища до конца транзакции"""
+    db.session.execute(db.select(db.func.pg_advisory_xact_lock(db.func.hashtext(sha256))))
+
+
+def временный_файл():
+    """Открыть временный файл внутри UPLOAD_FOLDER, чтобы перенос в хранилище был атомарным"""
+    tmp_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=tmp_dir)
+    return os.fdopen(fd, 'wb'), path
+
+
+def записать_поток(stream):
+    """Записать поток во временный файл, считая SHA-256 и размер на лету.
+
+    Возвращает (путь к временному файлу, sha256, размер).
+    """
+    sha = hashlib.sha256()
+    размер = 0
+    f, tmp_path = временный_файл()
+    try:
+        with f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                размер += len(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, sha.hexdigest(), размер
+
+
+def поместить_в_хранилище(tmp_path, sha256, размер):
+    """Перенести готовый временный файл в хранилище и добавить ссылку на него.
+
+    Если такое содержимое уже есть, временный файл удаляется.
+    Строка файла и блокировка объекта держатся до конца транзакции, чтобы
+    параллельное освобождение не удалило файл, на который только что сослались.
+    """
+    заблокировать_объект(sha256)
+    файл = Файл.query.filter_by(sha256=sha256).with_for_update().first()
+    if файл is None:
+        try:
+            with db.session.begin_nested():
+                файл = Файл(sha256=sha256, размер=размер, число_ссылок=0)
+                db.session.add(файл)
+        except IntegrityError:
+            # Тот же файл одновременно загрузили в другом запросе
+            файл = Файл.query.filter_by(sha256=sha256).with_for_update().one()
+    файл.число_ссылок += 1
+
+    target = полный_путь(путь_объекта(sha256))
+    if os.path.exists(target):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+    return файл
+
+
+def сохранить_файл(file):
+    """Сохранить загруженный файл (werkzeug FileStorage) в хранилище"""
+    tmp_path, sha256, размер = записать_поток(file.stream)
+    return поместить_в_хранилище(tmp_path, sha256, размер)
+
+
+def освободить_файл(документ):
+    """Снять ссылку документа на файл.
+
+    Возвращает путь, который нужно удалить с диска после коммита,
+    если на файл больше никто не ссылается, иначе None.
+    """
+    if документ.файл_id:
+        файл = Файл.query.filter_by(id=документ.файл_id).with_for_update().one()
+        файл.число_ссылок -= 1
+        if файл.число_ссылок > 0:
+            return None
+        документ.файл = None
+        db.session.delete(файл)
+        return полный_путь(путь_объекта(файл.sha256))
+
+    # Файлы, загруженные до появления хранилища, могли делить несколько документов
+    if документ.путь_к_файлу:
+        другие = Документ.query.filter(
+            Документ.путь_к_файлу == документ.путь_к_файлу,
+            Документ.id != документ.id
+        ).count()
+        if not другие:
+            return полный_путь(документ.путь_к_файлу)
+    return None
+
+
+def удалить_с_диска(path):
+    """Удалить файл, освобождённый уже закоммиченной транзакцией.
+
+    Объект хранилища удаляется под блокировкой и только если за это время
+    никто не загрузил то же содержимое заново.
+    """
+    if not path or not os.path.exists(path):
+        return
+    if os.path.dirname(os.path.dirname(path)) != полный_путь('objects'):
+        os.remove(path)
+        return
+    sha256 = os.path.basename(path)
+    заблокировать_объект(sha256)
+    if not Файл.query.filter_by(sha256=sha256).count() and os.path.exists(path):
+        os.remove(path)
+    db.session.commit()
+
+
+def удалить_потерянные_объекты(старше):
+    """Удалить объекты хранилища без строки в таблице файлы старше старше секунд.
+
+    Такие объекты остаются после отката транзакции, которая их разместила.
+    Возвращает количество удалённых объектов.
+    """
+    root = полный_путь('objects')
+    if not os.path.isdir(root):
+        return 0
+    граница = time.time() - старше
+    удалено = 0
+    for dirpath, _, names in os.walk(root):
+        for sha256 in names:
+            path = os.path.join(dirpath, sha256)
+            if os.path.getmtime(path) >= граница:
+                continue
+            заблокировать_объект(sha256)
+            if not Файл.query.filter_by(sha256=sha256).count() and os.path.exists(path):
+                os.remove(path)
+                удалено += 1
+            db.session.commit()
+    return удалено
@@ -0,0 +1,225 @@
+"""Фоновое извлечение текста файлов для полнотекстового поиска.
+
+`flask extract-text` забирает из таблицы файлы, текст которых ещё не
+извлекался текущей версией извлекателя, разбирает их в пуле процессов
+и пересчитывает поисковые векторы документов, ссылающихся на эти файлы.
+Содержимое файла неизменно (хранилище адресуется по SHA-256), поэтому
+новая загрузка - это новая строка файлы, а уже обработанные файлы
+повторно не читаются. После изменения правил извлечения достаточно
+увеличить EXTRACTOR_VERSION, чтобы все файлы обработались заново.
+
+Пачка забирается короткой транзакцией: файлы получают аренду
+(извлечение_до) и блокировки сразу снимаются, поэтому загрузка того же
+содержимого или удаление документа не ждут разбора. Команду можно
+запускать в нескольких экземплярах; файлы остановленного обработчика
+забираются снова, когда истечёт аренда. Разбор одного файла ограничен
+EXTRACT_TIMEOUT секундами. После записи текста в том же пуле рисуются
+превью файлов пачки (previews.py).
+"""
+import logging
+import os
+import signal
+import time
+import zipfile
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from extensions import db
+from models import Документ, Файл
+from previews import создать_превью, настройки_превью
+from search import обновить_поисковые_векторы, START_SEL, STOP_SEL
+from storage import полный_путь, путь_объекта
+
+logger = logging.getLogger(__name__)
+
+EXTRACTOR_VERSION = 1
+
+# Позиции лексем в tsvector ограничены 16383, а размер вектора - 1 МБ,
+# поэтому дальше этого предела текст для поиска бесполезен
+MAX_TEXT_CHARS = 200000
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def _pdf(path):
+    from pypdf import PdfReader
+
+    parts, size = [], 0
+    for page in PdfReader(path).pages:
+        text = page.extract_text() or ''
+        parts.append(text)
+        size += len(text)
+        if size >= MAX_TEXT_CHARS:
+            break
+    return '\n'.join(parts)
+
+
+def _docx(archive):
+    with archive.open('word/document.xml') as f:
+        root = ElementTree.parse(f).getroot()
+    paragraphs = []
+    for paragraph in root.iter(f'{WORD_NS}p'):
+        paragraphs.append(''.join(node.text or '' for node in paragraph.iter(f'{WORD_NS}t')))
+    return '\n'.join(paragraphs)
+
+
+def _xlsx(path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    parts, size = [], 0
+    try:
+        for sheet in workbook.worksheets:
+            parts.append(sheet.title)
+            for row in sheet.iter_rows(values_only=True):
+                line = ' '.join(str(value) for value in row if value is not None)
+                if line:
+                    parts.append(line)
+                    size += len(line)
+                if size >= MAX_TEXT_CHARS:
+                    return '\n'.join(parts)
+    finally:
+        workbook.close()
+    return '\n'.join(parts)
+
+
+def _plain(path):
+    with open(path, 'rb') as f:
+        data = f.read(MAX_TEXT_CHARS * 2)
+    if b'\0' in data[:4096]:
+        return ''  # Двоичный файл неизвестного формата
+    for encoding in ('utf-8', 'cp1251'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='ignore')
+
+
+def extract_text(path):
+    """Текст файла по его содержимому (расширения в хранилище нет); выполняется в процессе пула"""
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    if head.startswith(b'%PDF'):
+        text = _pdf(path)
+    elif head.startswith(b'PK'):
+        with zipfile.ZipFile(path) as archive:
+            names = set(archive.namelist())
+            text = _docx(archive) if 'word/document.xml' in names else ''
+        if 'xl/workbook.xml' in names:
+            text = _xlsx(path)
+    else:
+        text = _plain(path)
+    # NUL недопустим в text PostgreSQL, маркеры подсветки - в исходном тексте
+    for char in ('\0', START_SEL, STOP_SEL):
+        text = text.replace(char, '')
+    return text[:MAX_TEXT_CHARS]
+
+
+class _Таймаут(Exception):
+    pass
+
+
+def _прервать(signum, frame):
+    raise _Таймаут()
+
+
+def _извлечь(path, timeout):
+    """(текст, ошибка) - ошибка разбора одного файла не должна останавливать пачку.
+
+    Выполняется в главном потоке процесса пула, поэтому предел времени - SIGALRM.
+    """
+    signal.signal(signal.SIGALRM, _прервать)
+    signal.alarm(timeout)
+    try:
+        return extract_text(path), None
+    except _Таймаут:
+        return None, f'Разбор дольше {timeout} с'
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'[:1000]
+    finally:
+        signal.alarm(0)
+
+
+def забрать_пачку(batch_size, timeout):
+    """Забрать файлы для извлечения арендой на время обработки пачки; [(id, sha256)]"""
+    now = datetime.utcnow()
+    файлы = db.session.execute(
+        select(Файл.id, Файл.sha256).where(
+            Файл.версия_извлечения < EXTRACTOR_VERSION,
+            db.or_(Файл.извлечение_до == None, Файл.извлечение_до < now)
+        ).order_by(Файл.id).limit(batch_size).with_for_update(skip_locked=True)
+    ).all()
+    if файлы:
+        # Даже при одном процессе в пуле пачка укладывается в аренду
+        аренда = timedelta(seconds=timeout * len(файлы) + 60)
+        db.session.execute(
+            db.update(Файл).where(Файл.id.in_([файл_id for файл_id, _ in файлы])).values(
+                извлечение_до=now + аренда
+            ),
+            execution_options={'synchronize_session': False}
+        )
+    db.session.commit()
+    return файлы
+
+
+def обработать_пачку(executor, batch_size, timeout=None):
+    """Извлечь текст одной пачки файлов; возвращает число обработанных файлов"""
+    timeout = timeout or current_app.config['EXTRACT_TIMEOUT']
+    файлы = забрать_пачку(batch_size, timeout)
+    if not файлы:
+        return 0
+
+    # Разбор идёт без транзакции и блокировок строк
+    пути = [путь_объекта(sha256) for _, sha256 in файлы]
+    paths = [полный_путь(путь) for путь in пути]
+    результаты = list(executor.map(_извлечь, paths, [timeout] * len(paths)))
+
+    тексты = []
+    for (файл_id, _), (текст, ошибка) in zip(файлы, результаты):
+        тексты.append(текст)
+        if ошибка:
+            logger.warning(f'Файл {файл_id}: текст не извлечён: {ошибка}')
+        db.session.execute(
+            db.update(Файл).where(Файл.id == файл_id).values(
+                текст=текст, ошибка_извлечения=ошибка, версия_извлечения=EXTRACTOR_VERSION,
+                извлечение_до=None
+            ),
+            execution_options={'synchronize_session': False}
+        )
+    обновить_поисковые_векторы(Документ.файл_id.in_([файл_id for файл_id, _ in файлы]))
+    db.session.commit()
+
+    настройки = [настройки_превью()] * len(файлы)
+    for (файл_id, _), ошибка in zip(файлы, executor.map(создать_превью, пути, paths, тексты, настройки)):
+        if ошибка:
+            logger.warning(f'Файл {файл_id}: превью не создано: {ошибка}')
+    return len(файлы)
+
+
+@click.command('extract-text')
+@with_appcontext
+@click.option('--once', is_flag=True, help='Обработать накопившиеся файлы и выйти')
+@click.option('--workers', type=int, help='Процессов извлечения')
+@click.option('--batch-size', type=int, help='Файлов, забираемых за раз')
+def extract_text_command(once, workers, batch_size):
+    """Извлекать текст новых файлов для полнотекстового поиска"""
+    workers = workers or current_app.config['EXTRACT_WORKERS'] or os.cpu_count()
+    batch_size = batch_size or current_app.config['EXTRACT_BATCH_SIZE']
+    всего = 0
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            обработано = обработать_пачку(executor, batch_size)
+            всего += обработано
+            if обработано:
+                continue
+            if once:
+                break
+            time.sleep(current_app.config['EXTRACT_POLL_INTERVAL'])
+    elapsed = time.monotonic() - started
+    click.echo(f'Обработано файлов: {всего} за {elapsed:.1f} с')
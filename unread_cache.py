@@ -0,0 +1,38 @@
+"""Кэш списков непрочитанных документов в процессе бота.
+
+Листание /unread не повторяет запрос к базе: список сотрудника живёт
+UNREAD_CACHE_TTL секунд и сбрасывается сразу после подтверждения
+ознакомления. Новые документы появляются в списке не позже истечения TTL.
+"""
+import time
+from collections import OrderedDict
+from config import Config
+
+
+class UnreadCache:
+    """LRU-кэш с ограниченным временем жизни записей, ключ - telegram_id"""
+
+    def __init__(self, ttl=None, max_size=None):
+        self.ttl = ttl if ttl is not None else Config.UNREAD_CACHE_TTL
+        self.max_size = max_size or Config.UNREAD_CACHE_SIZE
+        self._items = OrderedDict()
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, key):
+        self._items.pop(key, None)
@@ -0,0 +1,104 @@
+"""Разбор очереди обновлений Telegram в режиме webhook.
+
+Webhook веб-приложения (webhook.py) только проверяет секрет и записывает
+обновление в таблицу обновления_бота, а процессы бота забирают их пачками
+с FOR UPDATE SKIP LOCKED, поэтому процессов может быть несколько.
+Из обновлений одного чата забирается только самое раннее: следующее
+становится доступно после обработки предыдущего, и шаги диалога
+не перепутаются. Забранное обновление скрыто от других процессов на LEASE;
+если процесс упал, его обновления обработает другой.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, exists
+from sqlalchemy.orm import aliased
+from telegram import Update
+from config import Config
+from async_db import Session
+from models import ОбновлениеБота
+
+logger = logging.getLogger(__name__)
+
+# Пауза между опросами пустой очереди, секунд
+POLL_INTERVAL = 0.2
+# На сколько забранное обновление скрывается от других процессов
+LEASE = timedelta(minutes=2)
+# Обновление, на котором процесс падал столько раз, пропускается
+MAX_ATTEMPTS = 3
+
+
+class UpdateQueue:
+    """Обработка обновлений из таблицы обновления_бота приложением PTB"""
+
+    def __init__(self, application, batch_size=None):
+        self.application = application
+        self.batch_size = batch_size or Config.BOT_CONCURRENT_UPDATES
+        self._stopping = asyncio.Event()
+
+    async def claim(self):
+        """Забрать пачку обновлений: не больше одного, самого раннего, на чат"""
+        async with Session() as session, session.begin():
+            now = datetime.utcnow()
+            ранее = aliased(ОбновлениеБота)
+            batch = (await session.execute(
+                select(
+                    ОбновлениеБота.update_id, ОбновлениеБота.данные, ОбновлениеБота.попыток
+                ).where(
+                    ОбновлениеБота.занято_до <= now,
+                    ~exists().where(
+                        ранее.chat_id == ОбновлениеБота.chat_id,
+                        ранее.update_id < ОбновлениеБота.update_id
+                    )
+                ).order_by(
+                    ОбновлениеБота.update_id
+                ).limit(self.batch_size).with_for_update(skip_locked=True)
+            )).all()
+            if batch:
+                await session.execute(
+                    update(ОбновлениеБота).where(
+                        ОбновлениеБота.update_id.in_([row.update_id for row in batch])
+                    ).values(занято_до=now + LEASE, попыток=ОбновлениеБота.попыток + 1)
+                )
+            return [tuple(row) for row in batch]
+
+    async def _process(self, item):
+        update_id, данные, попыток = item
+        if попыток >= MAX_ATTEMPTS:
+            logger.error(f"Обновление {update_id} пропущено после {попыток} попыток")
+            return
+        try:
+            await self.application.process_update(Update.de_json(данные, self.application.bot))
+        except Exception as e:
+            logger.error(f"Ошибка при обработке обновления {update_id}: {str(e)}")
+
+    async def finish(self, update_ids):
+        async with Session() as session, session.begin():
+            await session.execute(
+                delete(ОбновлениеБота).where(ОбновлениеБота.update_id.in_(update_ids))
+            )
+
+    async def run_once(self):
+        """Обработать одну пачку; возвращает количество обновлений"""
+        batch = await self.claim()
+        if batch:
+            # В пачке обновления разных чатов, поэтому их можно обрабатывать параллельно
+            await asyncio.gather(*(self._process(item) for item in batch))
+            await self.finish([item[0] for item in batch])
+        return len(batch)
+
+    async def run(self):
+        logger.info("Запуск обработки очереди обновлений")
+        while not self._stopping.is_set():
+            try:
+                if await self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Ошибка в очереди обновлений: {str(e)}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self._stopping.set()
@@ -0,0 +1,48 @@
+"""Приём обновлений Telegram в режиме webhook.
+
+Telegram отправляет обновления на /telegram/webhook веб-приложения
+с заголовком X-Telegram-Bot-Api-Secret-Token. Обработчик сверяет секрет
+и только записывает обновление в очередь обновления_бота, откуда его
+забирает один из процессов бота (update_queue.py), поэтому ответ
+Telegram не ждёт обработки. Повторная доставка того же update_id
+игнорируется.
+"""
+import hmac
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+from extensions import db
+from models import ОбновлениеБота
+
+# Типы обновлений, которые обрабатывает бот; остальные Telegram не присылает
+ALLOWED_UPDATES = ['message', 'callback_query']
+
+
+def секрет_верен(заголовок):
+    секрет = current_app.config['TELEGRAM_WEBHOOK_SECRET']
+    return bool(секрет) and hmac.compare_digest((заголовок or '').encode(), секрет.encode())
+
+
+def _chat_id(data):
+    if 'message' in data:
+        return data['message']['chat']['id']
+    query = data['callback_query']
+    message = query.get('message')
+    return message['chat']['id'] if message else query['from']['id']
+
+
+def поставить_обновление(data):
+    """Записать обновление в очередь; False, если бот такие обновления не обрабатывает"""
+    if not isinstance(data, dict) or 'update_id' not in data:
+        return False
+    if not any(kind in data for kind in ALLOWED_UPDATES):
+        return False
+    try:
+        chat_id = _chat_id(data)
+    except (KeyError, TypeError):
+        return False
+    db.session.execute(
+        insert(ОбновлениеБота).values(
+            update_id=data['update_id'], chat_id=chat_id, данные=data
+        ).on_conflict_do_nothing(index_elements=['update_id'])
+    )
+    return True
@@ -0,0 +1,4 @@
+"""Точка входа WSGI: gunicorn -c gunicorn.conf.py wsgi:app"""
+from app import create_app
+
+app = create_app()